@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+"""Compares the core converters' output and throughput on a corpus of markdown files.
+
+The html every converter produces for every file is compared to what GitHub's REST API produces for it (which is the
+reference gh-md-to-html tries to imitate), after normalizing away differences that don't matter for the result (like
+whitespace, attribute order and syntax highlighting markup). GitHub's responses are cached as usual (see README), so
+only the first run needs to talk to GitHub.
+
+Usage (with gh-md-to-html installed, e.g. via `pip3 install -e .[offline_conversion,cmarkgfm,markdown_it]`):
+
+    python3 benchmarks/compare_core_converters.py [markdown files or directories ...]
+
+Defaults to the markdown files in this repository."""
+
+import argparse
+import difflib
+import glob
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+import gh_md_to_html
+from gh_md_to_html import converter_registry
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CORPUS = [os.path.join(REPO_ROOT, "README-raw.md"), os.path.join(REPO_ROOT, "docs")]
+REFERENCE = "api"
+
+# attributes that carry meaning; all others (classes, styles, rel etc.) are ignored when comparing:
+COMPARED_ATTRIBUTES = ("href", "src", "alt", "title", "id", "colspan", "rowspan", "align", "type", "checked")
+
+
+def find_markdown_files(paths):
+    markdown_files = list()
+    for path in paths:
+        if os.path.isdir(path):
+            markdown_files += sorted(glob.glob(os.path.join(path, "**", "*.md"), recursive=True))
+        else:
+            markdown_files.append(path)
+    return markdown_files
+
+
+def normalize_html(html_content: str) -> list:
+    """Turns html into a list of tokens (tags with their relevant attributes, and words) that is comparable between
+    converters."""
+    html_soup = BeautifulSoup(html_content, "html.parser")
+    for anchor_soup_representation in html_soup.select("a.anchor"):
+        anchor_soup_representation.decompose()  # <- not every converter adds anchors to headings itself.
+    for highlight_soup_representation in html_soup.select("div.highlight"):
+        highlight_soup_representation.unwrap()
+    tokens = list()
+    for element in html_soup.descendants:
+        if isinstance(element, str):
+            tokens += element.split()
+        elif element.name not in ("span", "div"):  # <- these mostly carry syntax highlighting
+            tokens.append("<" + element.name + "".join(
+                " " + attribute + "=" + str(element[attribute]).replace("user-content-", "")
+                for attribute in COMPARED_ATTRIBUTES if element.has_attr(attribute)
+            ) + ">")
+    return tokens
+
+
+def convert(md_content: str, converter: str) -> str:
+    if converter == REFERENCE:
+        converter = gh_md_to_html.markdown_to_html_via_github_api
+    return gh_md_to_html.convert_with_core_converter(md_content, converter)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", nargs="*", default=DEFAULT_CORPUS,
+                        help="markdown files, or directories to search for markdown files.")
+    parser.add_argument("-c", "--converters", nargs="+",
+                        default=["OFFLINE"] + sorted(converter_registry.CORE_CONVERTERS),
+                        help="the core converters to compare.")
+    parser.add_argument("-r", "--repeat", type=int, default=5,
+                        help="how often to convert the corpus with every converter when measuring throughput.")
+    parser.add_argument("--no-reference", action="store_true",
+                        help="only measure throughput, without comparing to GitHub's REST API.")
+    args = parser.parse_args()
+
+    documents = [(path, open(path, "r", encoding="utf-8").read()) for path in find_markdown_files(args.corpus)]
+    corpus_size = sum(len(md_content.encode("utf-8")) for _, md_content in documents)
+    print("corpus:", len(documents), "files,", round(corpus_size / 1024, 1), "KiB\n")
+
+    reference_tokens = None
+    if not args.no_reference:
+        reference_tokens = [normalize_html(convert(md_content, REFERENCE)) for _, md_content in documents]
+
+    print("{:<14}{:>12}{:>12}{:>14}{:>12}".format("converter", "docs/s", "MiB/s", "similarity", "identical"))
+    for converter in args.converters:
+        try:
+            outputs = [convert(md_content, converter) for _, md_content in documents]  # <- also warms caches up
+        except Exception as e:
+            print("{:<14}failed: {}".format(converter, str(e).strip().splitlines()[-1]))
+            continue
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for _, md_content in documents:
+                convert(md_content, converter)
+        seconds = (time.perf_counter() - start) / args.repeat
+
+        similarity = identical = ""
+        if reference_tokens is not None:
+            similarities = [
+                difflib.SequenceMatcher(None, tokens, normalize_html(html_content), autojunk=False).ratio()
+                for tokens, html_content in zip(reference_tokens, outputs)
+            ]
+            similarity = "{:.1%}".format(sum(similarities) / len(similarities))
+            identical = "{}/{}".format(sum(1 for s in similarities if s == 1), len(similarities))
+
+        print("{:<14}{:>12.1f}{:>12.2f}{:>14}{:>12}".format(
+            converter, len(documents) / seconds, corpus_size / seconds / 1024 ** 2, similarity, identical))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+
+"""Benchmarks gh-md-to-html on a generated corpus, and compares the results to a stored baseline.
+
+Every case of the corpus stresses one hot path of the conversion: very long lines, thousands of emojis and formulas,
+CJK text in code blocks, many (partly downloaded) images, large images, srcset compression, deep heading trees in a
+table of contents, and a document of several MiB. The corpus is generated from a fixed seed, so it is the same on
+every run. Everything runs offline: documents are converted with the OFFLINE core converter, formulas are rendered as
+MathML, and "web" images are served by a local http server.
+
+Every case is converted --repeat times (after one conversion to warm caches up, whose result is discarded) into a
+fresh output directory, and the median time is compared to the baseline. A case regresses if it takes more than its
+threshold (a fraction, e.g. 0.25 for 25%) longer than in the baseline, and at least --min-difference seconds longer.
+Thresholds are taken from the baseline file (under "thresholds", per case name or as "default"), or from --threshold.
+
+Usage (with gh-md-to-html installed, e.g. via `pip3 install -e .[offline_conversion,mathml_formulas]`):
+
+    python3 benchmarks/run_benchmarks.py [cases ...] [--save-baseline]
+
+Exits with 1 if any case regressed, so it can be used as a gate in CI. Baselines depend on the machine they were
+measured on, so measure one with --save-baseline on the machine that compares against it."""
+
+import argparse
+import functools
+import http.server
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import emoji
+from PIL import Image
+
+import gh_md_to_html
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, "benchmarks", "baseline.json")
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_MIN_DIFFERENCE = 0.05  # <- in seconds; smaller differences are noise
+SEED = 1234
+
+WORDS = ("markdown html convert image formula emoji heading table list code block link quote render cache github "
+         "offline chunk style paragraph document").split()
+CJK_TEXT = "漢字かなカナ한국어中文測試文字列ひらがな카타카나"
+
+
+def words(rng: random.Random, count: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+def make_image(path: str, width: int, height: int, rng: random.Random):
+    """Saves a noisy gradient (which compresses like a photo rather than like a flat color) as an image."""
+    noise = Image.frombytes("L", (width, height), rng.getrandbits(8 * width * height).to_bytes(width * height, "little"))
+    gradient = Image.linear_gradient("L").resize((width, height))
+    image = Image.merge("RGB", (noise, gradient, Image.new("L", (width, height), rng.randrange(256))))
+    image.save(path)
+
+
+# The cases of the corpus; every one of them writes its markdown (and the local files it needs) to a directory and
+# returns the markdown file's name and the options to convert it with:
+
+def case_long_lines(directory, rng, scale, image_url):
+    paragraphs = ["**" + words(rng, 5) + "** `" + words(rng, 3) + "` [" + words(rng, 2) + "](https://example.com/"
+                  + str(i) + ") " + words(rng, 4000) for i in range(int(40 * scale) or 1)]
+    return "\n\n".join(paragraphs), dict()
+
+
+def case_emojis(directory, rng, scale, image_url):
+    shortcodes = sorted(shortcode for shortcode in emoji.EMOJI_ALIAS_UNICODE_ENGLISH
+                        if ":" not in shortcode[1:-1] and "." not in shortcode)  # <- (dots make custom emojis)
+    os.makedirs(os.path.join(directory, "emojis"), exist_ok=True)
+    for i in range(20):
+        make_image(os.path.join(directory, "emojis", "custom-" + str(i) + ".png"), 64, 64, rng)
+    lines = list()
+    for i in range(int(500 * scale) or 1):
+        lines.append(words(rng, 4) + " " + " ".join(rng.choice(shortcodes) for _ in range(10))
+                     + " :emojis/custom-" + str(i % 20) + ".png:")
+    return "\n\n".join(lines), dict(emoji_support=2, emoji_sprite_sheet=True)
+
+
+def case_formulas(directory, rng, scale, image_url):
+    paragraphs = list()
+    for i in range(int(300 * scale) or 1):
+        inline_formulas = " ".join("$x_{%d}^{%d} + \\frac{a_%d}{b}$" % (i, j, j) for j in range(10))
+        paragraphs.append(words(rng, 6) + " " + inline_formulas + "\n\n$$\\sum_{k=0}^{%d} \\sqrt{k^2 + %d}$$" % (i, i))
+    return "\n\n".join(paragraphs), dict(formula_renderer="mathml")
+
+
+def case_cjk_code_blocks(directory, rng, scale, image_url):
+    blocks = list()
+    for i in range(int(500 * scale) or 1):
+        code = "\n".join("def f_%d(x):  # %s\n    return \"%s\" * x" % (j, CJK_TEXT[j:], CJK_TEXT[:j + 1])
+                         for j in range(8))
+        blocks.append(CJK_TEXT + " " + words(rng, 5) + "\n\n```python\n" + code + "\n```")
+    return "\n\n".join(blocks), dict()
+
+
+def case_many_images(directory, rng, scale, image_url):
+    os.makedirs(os.path.join(directory, "pictures"), exist_ok=True)
+    references = list()
+    for i in range(int(60 * scale) or 1):
+        make_image(os.path.join(directory, "pictures", "local-" + str(i) + ".png"), 200, 150, rng)
+        references.append("![local image %d](pictures/local-%d.png)" % (i, i))
+        references.append("![web image %d](%s)" % (i, image_url("pictures/local-" + str(i) + ".png")))
+    return "\n\n".join(words(rng, 8) + "\n\n" + reference for reference in references * 3), dict(
+        optimize_image_loading=True)
+
+
+def case_large_images(directory, rng, scale, image_url):
+    os.makedirs(os.path.join(directory, "pictures"), exist_ok=True)
+    references = list()
+    for i in range(max(int(8 * scale), 1)):
+        make_image(os.path.join(directory, "pictures", "large-" + str(i) + ".png"), 3000, 2000, rng)
+        references.append("![large image %d](pictures/large-%d.png)" % (i, i))
+    return "\n\n".join(references), dict()
+
+
+def case_srcset_compression(directory, rng, scale, image_url):
+    os.makedirs(os.path.join(directory, "pictures"), exist_ok=True)
+    references = list()
+    for i in range(max(int(6 * scale), 1)):
+        make_image(os.path.join(directory, "pictures", "photo-" + str(i) + ".png"), 2400, 1600, rng)
+        references.append("![photo %d](pictures/photo-%d.png)" % (i, i))
+    return "\n\n".join(references), dict(compress_images={"srcset": True, "placeholder": True, "progressive": True})
+
+
+def case_deep_toc(directory, rng, scale, image_url):
+    lines = ["[[_TOC_]]"]
+    for i in range(int(3000 * scale) or 1):
+        level = 1 + (i % 6)
+        lines.append("#" * level + " " + words(rng, 2) + (" " + str(i) if i % 3 else ""))  # <- (some are duplicates)
+        lines.append(words(rng, 10))
+    return "\n\n".join(lines), dict(toc=True)
+
+
+def case_huge_document(directory, rng, scale, image_url):
+    sections = list()
+    size = 0
+    while size < 4 * 1024 ** 2 * scale:
+        section = "\n\n".join([
+            "## " + words(rng, 4),
+            words(rng, 60) + " *" + words(rng, 3) + "* [" + words(rng, 2) + "](#" + words(rng, 1) + ")",
+            "\n".join("* " + words(rng, 6) + "\n  * " + words(rng, 4) for _ in range(5)),
+            "| a | b | c |\n| --- | :-: | --: |\n" + "\n".join("| " + words(rng, 2) + " | " + words(rng, 1) + " | "
+                                                              + str(rng.randrange(1000)) + " |" for _ in range(8)),
+            "```js\nconst x = " + str(rng.randrange(1000)) + "; // " + words(rng, 5) + "\n```",
+            "> " + words(rng, 30),
+        ])
+        sections.append(section)
+        size += len(section.encode("utf-8"))
+    return "\n\n".join(sections), dict()
+
+
+CASES = {name[len("case_"):]: case for name, case in globals().items() if name.startswith("case_")}
+
+
+def generate_corpus(directory: str, scale: float, image_url) -> dict:
+    """Writes every case to its own subdirectory of directory, and maps the name of every case to its markdown file
+    and the options to convert it with."""
+    corpus = dict()
+    for name, case in CASES.items():
+        case_directory = os.path.join(directory, name)
+        os.makedirs(case_directory, exist_ok=True)
+        md_content, options = case(case_directory, random.Random(SEED), scale, image_url)
+        md_path = os.path.join(case_directory, name + ".md")
+        with open(md_path, "w", encoding="utf-8") as md_file:
+            md_file.write(md_content)
+        corpus[name] = (md_path, options)
+    return corpus
+
+
+def serve_directory(directory: str):
+    """Serves the given directory via http on localhost in a background thread (as a stand-in for image hosts), and
+    returns a function that turns paths within it into urls."""
+    handler = functools.partial(QuietRequestHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return lambda path: "http://127.0.0.1:" + str(server.server_address[1]) + "/" + path
+
+
+class QuietRequestHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def convert(md_path: str, options: dict, output_directory: str) -> tuple:
+    """Converts a case once into a fresh output directory, and returns how many seconds it took, together with the
+    statistics of the conversion."""
+    shutil.rmtree(output_directory, ignore_errors=True)
+    os.makedirs(output_directory)
+    stats = gh_md_to_html.ConversionStats()
+    start = time.perf_counter()
+    # (the output directory is the website root, so the css and the images are saved in it as well)
+    gh_md_to_html.main(md_path, core_converter="OFFLINE", website_root=output_directory, stats=stats, **options)
+    return time.perf_counter() - start, stats
+
+
+def run_case(md_path: str, options: dict, output_directory: str, repeat: int) -> dict:
+    convert(md_path, options, output_directory)  # <- warm caches up (and import everything the case needs)
+    runs = sorted((convert(md_path, options, output_directory) for _ in range(repeat)), key=lambda run: run[0])
+    _, median_stats = runs[len(runs) // 2]
+    return {
+        "seconds": statistics.median(seconds for seconds, _ in runs),
+        "min_seconds": runs[0][0],
+        "markdown_bytes": os.path.getsize(md_path),
+        "stages": {name: round(stage_stats.wall_time, 4) for name, stage_stats in median_stats.stages.items()},
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_difference: float) -> list:
+    """Prints how every case compares to the baseline, and returns the names of the cases that regressed."""
+    thresholds = baseline.get("thresholds", dict())
+    regressions = list()
+    print("{:<22}{:>12}{:>12}{:>10}{:>11}  {}".format("case", "seconds", "baseline", "change", "threshold", ""))
+    for name, result in results.items():
+        baseline_result = baseline.get("cases", dict()).get(name)
+        case_threshold = thresholds.get(name, thresholds.get("default", threshold))
+        if not baseline_result:
+            print("{:<22}{:>12.3f}{:>12}{:>10}{:>11}  {}".format(name, result["seconds"], "-", "-", "-", "new"))
+            continue
+        change = result["seconds"] / baseline_result["seconds"] - 1
+        regressed = (change > case_threshold
+                     and result["seconds"] - baseline_result["seconds"] >= min_difference)
+        if regressed:
+            regressions.append(name)
+        print("{:<22}{:>12.3f}{:>12.3f}{:>+10.1%}{:>11.0%}  {}".format(
+            name, result["seconds"], baseline_result["seconds"], change, case_threshold,
+            "REGRESSED" if regressed else ("faster" if change < -case_threshold else "ok")))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("cases", nargs="*",
+                        help="the cases to run (" + ", ".join(CASES) + "). Defaults to all of them.")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="how often to convert every case (the median time counts).")
+    parser.add_argument("-s", "--scale", type=float, default=1.0,
+                        help="scales the size of the corpus, e.g. 0.1 for a quick run (only comparable to baselines"
+                             " measured with the same scale).")
+    parser.add_argument("-b", "--baseline", default=DEFAULT_BASELINE,
+                        help="the baseline file to compare to (and to save to, with --save-baseline).")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="saves the results as the new baseline (keeping the baseline's thresholds).")
+    parser.add_argument("-t", "--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="how much slower (as a fraction) cases may become than in the baseline, unless the"
+                             " baseline file sets a threshold for them.")
+    parser.add_argument("--min-difference", type=float, default=DEFAULT_MIN_DIFFERENCE,
+                        help="how many seconds slower a case needs to become at least to count as a regression.")
+    parser.add_argument("-o", "--output", help="saves the results (including the time of every stage) as json.")
+    parser.add_argument("--corpus-dir", help="where to generate the corpus (and keep it). Defaults to a temporary"
+                                             " directory.")
+    args = parser.parse_args()
+    for name in args.cases:
+        if name not in CASES:
+            parser.error("unknown case " + name + " (choose from " + ", ".join(CASES) + ")")
+
+    temporary_directory = tempfile.TemporaryDirectory(prefix="gh-md-to-html-benchmarks-")
+    corpus_directory = args.corpus_dir or os.path.join(temporary_directory.name, "corpus")
+    image_url = serve_directory(os.path.join(corpus_directory, "many_images"))
+    corpus = generate_corpus(corpus_directory, args.scale, image_url)
+
+    results = dict()
+    for name in args.cases or CASES:
+        md_path, options = corpus[name]
+        results[name] = run_case(md_path, options, os.path.join(temporary_directory.name, "out", name), args.repeat)
+        print(name + ":", "%.3f" % results[name]["seconds"], "seconds", file=sys.stderr)
+    temporary_directory.cleanup()
+
+    run = {
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "machine": platform.machine(), "scale": args.scale, "repeat": args.repeat},
+        "cases": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(run, output_file, indent=1)
+
+    baseline = dict()
+    if os.path.isfile(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("environment", dict()).get("scale", args.scale) != args.scale:
+            print("warning: the baseline was measured with --scale", baseline["environment"]["scale"], file=sys.stderr)
+    print()
+    regressions = compare(results, baseline, args.threshold, args.min_difference)
+
+    if args.save_baseline:
+        run["thresholds"] = baseline.get("thresholds", {"default": args.threshold})
+        run["cases"] = dict(baseline.get("cases", dict()), **results)  # <- (cases that weren't run are kept)
+        with open(args.baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump(run, baseline_file, indent=1)
+        print("\nsaved the baseline to", args.baseline)
+        return 0
+
+    if regressions:
+        print("\n" + str(len(regressions)), "of", len(results), "cases regressed:", ", ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
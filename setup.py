@@ -9,7 +9,7 @@ setup(
     description='Feature-rich Github-flavored Markdown to html python and command line interface.',
     long_description=open('README.md').read(),
     long_description_content_type="text/markdown",
-    scripts=['./scripts/gh-md-to-html'],
+    scripts=['./scripts/gh-md-to-html', './scripts/gh-md-to-html-server'],
     author='phseiff',
     author_email='phseiff@phseiff.com',
     url='https://github.com/phseiff/github-flavored-markdown-to-html/',
@@ -24,7 +24,10 @@ setup(
     license="LICENSE.txt",
     extras_require={
         'pdf_export': ["pdfkit"],
-        'offline_conversion': ["mistune==2.0.0rc1", "pygments"]
+        'offline_conversion': ["mistune==2.0.0rc1", "pygments"],
+        'mathml_formulas': ["latex2mathml"],
+        'cmarkgfm': ["cmarkgfm"],
+        'markdown_it': ["markdown-it-py", "linkify-it-py"]
     },
     classifiers=[
         "Programming Language :: Python :: 3",
@@ -8,10 +8,11 @@ import string
 import random
 import re
 import argparse
+import asyncio
 import sys
 import os
 import shellescape
-from PIL import Image, ImageSequence
+from PIL import Image, ImageSequence, ImageFilter
 import PIL
 from io import BytesIO
 from urllib.parse import quote
@@ -24,11 +25,30 @@ from ast import literal_eval as make_tuple
 import bs4
 from bs4 import BeautifulSoup
 import hashlib
+import base64
+import mimetypes
 import math as math_module
 import shutil
 import typing
+import functools
+import inspect
+import threading
+import time
+import concurrent.futures
 import html
+import collections
 from . import windows_shellescape
+from . import github_api
+from . import converter_registry
+from . import coprocess
+from .limits import Limits, StageTimeoutError, NEW_PROCESS_GROUP_ARGUMENTS, kill_process_group
+from . import result_cache
+from .result_cache import ResultCache, get_result_cache
+from . import dependencies
+from .dependencies import DependencyManifest
+from . import watch
+from .block_cache import BlockCache, default_block_cache
+from .stats import ConversionStats, NO_STATS
 import uuid
 import warnings
 from .latex2svg import latex2svg
@@ -47,7 +67,7 @@ except (ImportError, ModuleNotFoundError):
 MODULE_PATH = os.path.join(*os.path.split(__file__)[:-1])
 DEBUG = False  # whether to print debug information
 DEBUG_HASHES = False
-HASH_FUNCTION_TO_USE_ON_IMAGES = lambda x: hashlib.md5(x.encode() if type(x) is str else x)
+HASH_FUNCTION_TO_USE_ON_IMAGES = lambda x: hashlib.md5(x.encode() if type(x) is str else x).hexdigest()
 
 
 def open_local(path, *args, **kwargs):
@@ -80,9 +100,12 @@ def get_fitting_replacement(thing_to_replace: str, table_of_replacement: dict, t
     """Takes a thing for which a replacement is searched, a table mapping replacements to the things they stand for,
     and a string in which the replacement should be done. Returns a string to replace with, which is either the key
     of thing_to_replace_with in table_of_replacements, if it already exists in there, or a completely newly generated
-    random string if not. s is a string with which every replacement has to start."""
+    random string if not. s is a string with which every replacement has to start.
+    Newly generated strings are derived from thing_to_replace where possible, so the same document always results in
+    the same replacements (which allows caching what the core converter makes of it)."""
     replacement = get_key_of_item(table_of_replacement, thing_to_replace)
     if not replacement:
+        replacement = s + hashlib.sha1(thing_to_replace.encode("utf-8")).hexdigest()[:20].upper()
         while replacement in table_of_replacement or replacement in text_to_replace_in:
             replacement = get_random_string(s)
     return replacement
@@ -283,6 +306,24 @@ def find_and_replace_formulas_in_markdown(md: str, support_formulas=True, suppor
     return "\n".join(md_lines), formulas, special_characters_in_code, headings, emoji_replacements
 
 
+def find_headings_in_markdown(md: str) -> typing.List[typing.Tuple[int, str]]:
+    """Returns a list of the headings in md in order of appearance, each one as a depth-name-tuple (like the fourth
+    return value of find_and_replace_formulas_in_markdown, but without replacing anything in md).
+
+    >>> find_headings_in_markdown("# Title\\n\\n```\\n# not a heading\\n```\\n\\n## Sub :smile:\\n#no heading")
+    [(1, 'Title'), (2, 'Sub :smile:')]
+    """
+    headings = list()
+    inside_multiline_code = False
+    for line in md.splitlines():
+        if line.strip().startswith("```"):
+            inside_multiline_code = not inside_multiline_code
+        elif not inside_multiline_code and line.strip().startswith("#") and " " in line \
+                and line.split(" ")[0] == "#" * len(line.split(" ")[0]):
+            headings.append((len(line.split(" ")[0]), line.split(" ", 1)[1]))
+    return headings
+
+
 def header_name_to_link_to_header(header_name: str) -> str:
     """Takes the name of a header and creates a link to said header in markdown format."""
     id_from_title = heading_name_to_id_value(header_name)
@@ -358,16 +399,24 @@ def render_toc_in_md_file_stand_alone(md_content: str, support_custom_emojis=Fal
 # Decide which function to convert latex formulas to svg is preferable:
 
 
-formula2svg_client = None
+# every thread re-uses its own session to the online renderer, so its connections are pooled:
+_formula2svg_sessions = threading.local()
+
 
+def get_formula2svg_client() -> requests.Session:
+    if not hasattr(_formula2svg_sessions, "client"):
+        _formula2svg_sessions.client = requests.session()
+    return _formula2svg_sessions.client
 
-def raw_formula2svg_offline(formula):
-    return latex2svg(formula)["svg"]
 
+def raw_formula2svg_offline(formula, limits=None):
+    return latex2svg(formula, limits=limits)["svg"]
 
-def raw_formula2svg_online(formula):
-    return formula2svg_client.get(
-        url="https://latex.codecogs.com/svg.latex?" + quote(formula)
+
+def raw_formula2svg_online(formula, limits=None):
+    return (limits or Limits()).get(
+        "https://latex.codecogs.com/svg.latex?" + quote(formula), "rendering formula $" + formula + "$ online",
+        session=get_formula2svg_client()
     ).text
 
 
@@ -375,19 +424,27 @@ if shutil.which("latex") and shutil.which("dvisvgm"):
     try:
         raw_formula2svg_offline("w")
         raw_formula2svg = raw_formula2svg_offline
-    except (RuntimeError, subprocess.CalledProcessError):
+    except (RuntimeError, subprocess.CalledProcessError, StageTimeoutError):
         raw_formula2svg = raw_formula2svg_online
 else:
     raw_formula2svg = raw_formula2svg_online
 
+# The functions that can be explicitly chosen to render formulas to svg, instead of picking the preferable one:
+
+RAW_FORMULA2SVG_RENDERERS = {
+    "latex": raw_formula2svg_offline,
+    "online": raw_formula2svg_online,
+}
+
 # Function to convert latex formulas to svg:
 
 
-def formula2svg(formula, amount_of_svg_formulas):
-    """Takes a LaTeX-Formula and converts it to a svg."""
-    global formula2svg_client
-    formula2svg_client = requests.session()
-    formula_rendered = raw_formula2svg(formula)
+def formula2svg(formula, amount_of_svg_formulas, shared_glyphs=None, precision=None, raw_renderer=None):
+    """Takes a LaTeX-Formula and converts it to a svg, using raw_renderer or (if it is None) raw_formula2svg.
+    If shared_glyphs is a dict, the glyphs defined in the svg are moved out of it and into shared_glyphs (which maps the
+    glyph's path data to an id), so they can be defined once for all formulas using them. If precision is given, all
+    numbers in the glyph's path data are rounded to precision decimal places."""
+    formula_rendered = (raw_renderer or raw_formula2svg)(formula)
     formula_rendered_soup = BeautifulSoup(formula_rendered, 'html.parser')
 
     # Remove xml declaration:
@@ -409,31 +466,183 @@ def formula2svg(formula, amount_of_svg_formulas):
             lambda tag: tag.has_attr("xlink:href")):
         element_referencing_id_soup_representation["xlink:href"] += "n" + str(amount_of_svg_formulas)
 
+    # Reduce the precision of the path data:
+    if precision is not None:
+        for path_soup_representation in formula_rendered_soup.find_all("path"):
+            if path_soup_representation.has_attr("d"):
+                path_soup_representation["d"] = reduce_svg_path_precision(path_soup_representation["d"], precision)
+
+    # Move glyph definitions out of the svg and replace them with references to the shared ones:
+    if shared_glyphs is not None:
+        new_ids_of_glyphs = dict()
+        for defs_soup_representation in formula_rendered_soup.find_all("defs"):
+            for glyph_soup_representation in defs_soup_representation.find_all("path"):
+                if glyph_soup_representation.has_attr("id") and glyph_soup_representation.has_attr("d"):
+                    if glyph_soup_representation["d"] not in shared_glyphs:
+                        shared_glyphs[glyph_soup_representation["d"]] = "gh-md-to-html-glyph-" + str(len(shared_glyphs))
+                    new_ids_of_glyphs[glyph_soup_representation["id"]] = shared_glyphs[glyph_soup_representation["d"]]
+                    glyph_soup_representation.extract()
+            if not defs_soup_representation.find(True):
+                defs_soup_representation.extract()
+        for element_referencing_id_soup_representation in formula_rendered_soup.find_all(
+                lambda tag: tag.has_attr("xlink:href")):
+            referenced_id = element_referencing_id_soup_representation["xlink:href"][1:]
+            if referenced_id in new_ids_of_glyphs:
+                element_referencing_id_soup_representation["xlink:href"] = "#" + new_ids_of_glyphs[referenced_id]
+
     if DEBUG:
         print(" ---    FORMULA:", formula, " --- quoted:", quote(formula), " --- url:",
               "https://latex.codecogs.com/svg.latex?" + quote(formula))
 
     return formula_rendered_soup.__str__()
 
+
+def reduce_svg_path_precision(path_data: str, precision: int) -> str:
+    """Rounds every number in the given svg path data to precision decimal places, and removes unnecessary zeros.
+
+    >>> reduce_svg_path_precision("M4.473116-1.733499H4.23213C4.184309-1.470486 4.124533-.980324Z", 2)
+    'M4.47-1.73H4.23C4.18-1.47 4.12-.98Z'
+
+    Numbers that were only separated by their decimal point keep being separated:
+
+    >>> reduce_svg_path_precision("M1.5.5L0.25.75", 0)
+    'M2 0L0 1'
+
+    """
+    def reduce_number_precision(number_match):
+        number = format(float(number_match.group(0)), "." + str(precision) + "f")
+        if "." in number:
+            number = number.rstrip("0").rstrip(".")
+        if number in ("-0", ""):
+            number = "0"
+        if number.startswith("0.") or number.startswith("-0."):
+            number = number.replace("0.", ".", 1)
+        separator = " " if number_match.start() > 0 and path_data[number_match.start() - 1] in string.digits + "." \
+            and not number.startswith("-") else ""
+        return separator + number
+    return re.sub(r"-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?", reduce_number_precision, path_data)
+
+
+def make_shared_glyph_definitions(shared_glyphs: dict) -> str:
+    """Takes a dict mapping path data to ids (as filled by formula2svg), and returns a hidden svg defining all of them,
+    so every formula in the same document can reference them."""
+    return (
+        '<svg aria-hidden="true" style="position: absolute; width: 0; height: 0; overflow: hidden;" '
+        + 'xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink"><defs>'
+        + "".join('<path d="' + html.escape(path_data) + '" id="' + glyph_id + '"></path>'
+                  for path_data, glyph_id in shared_glyphs.items())
+        + "</defs></svg>"
+    )
+
+
+def formula2svg_file(formula, abs_image_paths, image_src_prefix, precision=None, raw_renderer=None):
+    """Takes a LaTeX-Formula, converts it to a svg and saves it in abs_image_paths (under a name derived from its
+    content, so every distinct formula is only stored once, no matter how many documents use it). Returns an img-tag
+    referencing it, with image_src_prefix used as the path to abs_image_paths."""
+    formula_rendered_soup = BeautifulSoup((raw_renderer or raw_formula2svg)(formula), 'html.parser')
+
+    # Remove comments (but not the xml declaration, since this will be a stand-alone file):
+    for e in formula_rendered_soup:
+        if isinstance(e, bs4.Comment):
+            e.extract()
+
+    # Reduce the precision of the path data:
+    if precision is not None:
+        for path_soup_representation in formula_rendered_soup.find_all("path"):
+            if path_soup_representation.has_attr("d"):
+                path_soup_representation["d"] = reduce_svg_path_precision(path_soup_representation["d"], precision)
+
+    # html.parser lowercases attribute names, but stand-alone svg files are case-sensitive:
+    svg_element_soup_representation = formula_rendered_soup.find("svg")
+    if svg_element_soup_representation.has_attr("viewbox"):
+        svg_element_soup_representation["viewBox"] = svg_element_soup_representation["viewbox"]
+        del svg_element_soup_representation["viewbox"]
+
+    formula_svg = formula_rendered_soup.__str__()
+    formula_file_name = "formula-" + hashlib.md5(formula_svg.encode()).hexdigest() + ".svg"
+    with lock_of_image_directory(abs_image_paths):
+        if not os.path.isfile(os.path.join(abs_image_paths, formula_file_name)):
+            with open(os.path.join(abs_image_paths, formula_file_name), "w", encoding="utf-8") as formula_file:
+                formula_file.write(formula_svg)
+
+    return ('<img alt="' + html.escape(formula) + '" class="gh-md-to-html-formula" src="' + image_src_prefix
+            + formula_file_name + '" style="vertical-align: middle;">')
+
+
+def formula2mathml(formula):
+    """Takes a LaTeX-Formula and converts it to MathML, which browsers render natively; this happens in-process, so
+    it is a lot faster than rendering svgs, and requires neither LaTeX nor internet."""
+    try:
+        from latex2mathml.converter import convert as latex_to_mathml
+    except ImportError:
+        raise ImportError("Rendering formulas as MathML requires the 'latex2mathml' package!\n"
+                          + "\ttry running: pip3 install latex2mathml")
+    return latex_to_mathml(formula).replace("<math ", '<math class="gh-md-to-html-formula" ', 1)
+
+
+def formula_without_necessary_dependencies(formula=None):
+    """Raises the exception for documents with formulas that can't be rendered because the necessary dependencies
+    aren't installed and online fallbacks are suppressed."""
+    raise Exception("You are trying to convert a document with formulas in it, but you don't have the necessary\n"
+                    + "dependencies installed and you have disabled the use of online fallbacks.")
+
+
+def make_formula_renderer(shared_glyphs=None, formula_precision=None, formula_files_location=None,
+                          formula_renderer="auto", limits=None) -> typing.Callable[[str], str]:
+    """Returns a function that renders a formula to html according to the given options (see
+    find_and_render_formulas_in_html), numbering the svg formulas so the ids within them don't collide. If
+    shared_glyphs is a dict, the glyphs used by the formulas are collected in it rather than defined in every formula.
+    The svgs are rendered within the given Limits.
+    The returned function can safely be called from several threads at once."""
+    amount_of_svg_formulas = 0
+    lock = threading.Lock()
+    raw_renderer = functools.partial(RAW_FORMULA2SVG_RENDERERS.get(formula_renderer, raw_formula2svg), limits=limits)
+
+    def render_formula(formula: str) -> str:
+        nonlocal amount_of_svg_formulas
+        if formula_renderer == "mathml":
+            return formula2mathml(formula)
+        if formula_files_location:
+            return formula2svg_file(formula, *formula_files_location, precision=formula_precision,
+                                    raw_renderer=raw_renderer)
+        with lock:
+            number_of_this_formula = amount_of_svg_formulas
+            amount_of_svg_formulas += 1
+            if shared_glyphs is not None:  # <- the shared glyphs must be filled in one formula at a time.
+                return formula2svg(formula, number_of_this_formula, shared_glyphs, formula_precision, raw_renderer)
+        return formula2svg(formula, number_of_this_formula, None, formula_precision, raw_renderer)
+
+    return render_formula
+
+
 # Find and render formulas in the html code, and replace them correctly:
 
 
 def find_and_render_formulas_in_html(html_text: str, formulas: dict, special_characters_in_code: dict,
-                                     emoji_replacements: dict, emoji_support: int):
+                                     emoji_replacements: dict, emoji_support: int, share_formula_glyphs=False,
+                                     formula_precision=None, formula_files_location=None, formula_renderer="auto",
+                                     limits=None):
     """Takes some html (generated from markdown by the online github API) and a dictionary which maps a number of
     sequences to a number of formulas, and replaces each sequence with a LaTeX-rendering of the corresponding formula.
     The third parameter is a dictionary mapping replacements to special characters for use in code blocks.
+    If share_formula_glyphs is True, every glyph used by the formulas is defined only once at the beginning of the html.
+    If formula_files_location is given, it must be a tuple of a directory and the path under which said directory is
+    accessible from the html, and the formulas are saved as files in there and referenced rather than inlined.
+    formula_renderer is one of "auto" (use whichever svg renderer is available), "latex", "online" and "mathml"; the
+    options regarding svgs are ignored if it is "mathml". The formulas are rendered within the given Limits.
     """
 
     # replace formulas:
-    amount_of_svg_formulas = 0
+    shared_glyphs = dict() if share_formula_glyphs else None
+    render_formula = make_formula_renderer(shared_glyphs, formula_precision, formula_files_location, formula_renderer,
+                                           limits)
     for sequence, formula in formulas.items():
-        formula_rendered = formula2svg(formula, amount_of_svg_formulas)
         html_text = html_text.replace(
             sequence,
-            formula_rendered
+            render_formula(formula)
         )
-        amount_of_svg_formulas += 1
+    if shared_glyphs:
+        html_text = make_shared_glyph_definitions(shared_glyphs) + "\n" + html_text
 
     # replace special characters:
     for sequence, special_character in special_characters_in_code.items():
@@ -470,15 +679,303 @@ def str2bool(v):
         raise argparse.ArgumentTypeError('Boolean value expected.')
 
 
-def markdown_to_html_via_github_api(markdown):
-    """Converts markdown to html, using the github api and nothing else."""
-    headers = {"Content-Type": "text/plain", "charset": "utf-8"}
-    return str(
-        requests.post("https://api.github.com/markdown/raw", headers=headers, data=markdown.encode("utf-8")).content,
-        encoding="utf-8"
+def markdown_to_html_via_github_api(markdown, limits=None):
+    """Converts markdown to html, using the github api and nothing else (within the given Limits, if any)."""
+    return github_api.get_default_converter()(markdown, limits)
+
+
+def convert_with_core_converter(md_content: str, core_converter, limits=None, **offline_options) -> str:
+    """Converts md_content to html using the given core converter (see the help text of --core-converter).
+    Commands are run within the given Limits (or the default ones).
+    offline_options are passed on to core_converter.convert if one of the OFFLINE converters is used; they are
+    ignored otherwise."""
+    if core_converter in ("OFFLINE", "OFFLINE+"):
+        from . import core_converter as cc
+        html_content = cc.convert(md_content, internal_use=(core_converter == "OFFLINE+"), **offline_options)
+    elif core_converter is markdown_to_html_via_github_api or isinstance(
+            core_converter, github_api.GitHubMarkdownAPIConverter):
+        # (these keep to the limits themselves, including while they wait for GitHub's rate limit:)
+        html_content = core_converter(md_content, limits)
+    elif type(core_converter) is str and converter_registry.get_core_converter(core_converter):
+        # use the registered in-process converter of this name:
+        try:
+            html_content = (limits or Limits()).call(converter_registry.get_core_converter(core_converter),
+                                                     "converting with the core converter", md_content)
+        except StageTimeoutError:
+            raise
+        except Exception as e:
+            e.args = ("An exception with the core converter occurred:\n\n" + str(e.args[0] if e.args else e),) \
+                + e.args[1:]
+            raise e
+    elif type(core_converter) is str:  # execute the command:
+        # find out how to run the command:
+        how_to_run_this = coprocess.how_to_run_commands()
+
+        # commands without {md} get the md content via stdin, which also works for documents that are too large to be
+        # passed as a command line argument:
+        pass_md_content_via_stdin = "{md}" not in core_converter
+
+        # escape the ms content in the right way:
+        if pass_md_content_via_stdin:
+            md_content_shellescaped = None
+        elif how_to_run_this == "cmd.exe":
+            md_content_shellescaped = windows_shellescape.escape_argument(md_content)
+        elif how_to_run_this == "bash":
+            md_content_shellescaped = shellescape.quote(md_content)
+        else:
+            raise
+
+        # finally convert:
+        returncode, stdout, stderr = (limits or Limits()).run(
+            stage="converting with the core converter",
+            input=(md_content.encode("utf-8") if pass_md_content_via_stdin else None),
+            stderr=subprocess.STDOUT,
+            **coprocess.command_to_popen_arguments(
+                core_converter if pass_md_content_via_stdin
+                else core_converter.replace("{md}", md_content_shellescaped),
+                how_to_run_this
+            )
+        )
+        if returncode != 0:
+            # Create a simplified version of the md content to put into the error message:
+            md_content_split_into_lines = md_content.split("\n")
+            if len(md_content_split_into_lines) == 1 and len(md_content_split_into_lines[0]) <= 40:
+                md_content_simplified = md_content_split_into_lines[0]
+            elif len(md_content_split_into_lines) > 1 and len(md_content_split_into_lines[0]) <= 37:
+                md_content_simplified = md_content_split_into_lines[0] + "..."
+            elif len(md_content_split_into_lines) > 1 and len(md_content_split_into_lines[0]) > 37:
+                md_content_simplified = md_content_split_into_lines[0][:36] + "..."
+            else:
+                raise
+            # escape the simplified ms content in the right way:
+            if how_to_run_this == "cmd.exe":
+                md_content_simplified_shellescaped = windows_shellescape.escape_argument(md_content_simplified)
+            elif how_to_run_this == "bash":
+                md_content_simplified_shellescaped = shellescape.quote(md_content_simplified)
+            else:
+                raise
+            print("md_content_simplified_shellescaped:", md_content_simplified_shellescaped)
+            print("end")
+            # raise exception:
+            raise Exception("An exception with the core converter occurred:\n\n"
+                            + (("STDERR:\n" + stderr.decode(encoding=sys.stdout.encoding) + "\n\n") if stderr else "")
+                            + (("STDOUT:\n" + stdout.decode(encoding=sys.stdout.encoding) + "\n\n") if stdout else "")
+                            + "with your command (displayed slightly shortened here):\n\n"
+                            + core_converter.replace("{md}", md_content_simplified_shellescaped))
+        else:
+            html_content = stdout.decode(encoding=sys.stdout.encoding)
+    else:
+        # call the core converter as a function in case it is one:
+        try:
+            html_content = (limits or Limits()).call(core_converter, "converting with the core converter", md_content)
+        except StageTimeoutError:
+            raise
+        except Exception as e:
+            # raise exception:
+            e.args = ("An exception with the core converter occurred:\n\n" + e.args[0],) + e.args[1:]
+            raise e
+            # raise type(e)("An exception with the core converter occurred:\n\n" + str(e))
+
+    return html_content
+
+
+# The event loop of the running coroutine (asyncio.get_running_loop() is new in python 3.7; before it, get_event_loop()
+# returns the running loop when it is called from a coroutine):
+_get_running_loop = getattr(asyncio, "get_running_loop", asyncio.get_event_loop)
+
+
+async def convert_with_core_converter_async(md_content: str, core_converter, convert_chunk=None, limits=None) -> str:
+    """Like convert_with_core_converter(), but as a coroutine: core converters that are coroutine functions are
+    awaited, commands are run as asyncio subprocesses (which are killed if the conversion is cancelled or exceeds the
+    given Limits), and all other core converters run in the event loop's default executor. convert_chunk is used
+    instead of convert_with_core_converter() in the executor if it is given (e.g. to pass options on to the OFFLINE
+    converters)."""
+    if inspect.iscoroutinefunction(core_converter) \
+            or inspect.iscoroutinefunction(getattr(core_converter, "__call__", None)):
+        try:
+            return await core_converter(md_content)
+        except Exception as e:
+            e.args = ("An exception with the core converter occurred:\n\n" + str(e.args[0] if e.args else e),) \
+                + e.args[1:]
+            raise e
+
+    if type(core_converter) is str and core_converter not in ("OFFLINE", "OFFLINE+") \
+            and not converter_registry.get_core_converter(core_converter):
+        # execute the command (like convert_with_core_converter does):
+        how_to_run_this = coprocess.how_to_run_commands()
+        pass_md_content_via_stdin = "{md}" not in core_converter
+        if pass_md_content_via_stdin:
+            command = core_converter
+        elif how_to_run_this == "cmd.exe":
+            command = core_converter.replace("{md}", windows_shellescape.escape_argument(md_content))
+        else:
+            command = core_converter.replace("{md}", shellescape.quote(md_content))
+        popen_arguments = coprocess.command_to_popen_arguments(command, how_to_run_this)
+        subprocess_arguments = dict(stdin=(asyncio.subprocess.PIPE if pass_md_content_via_stdin else None),
+                                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+                                    **NEW_PROCESS_GROUP_ARGUMENTS)
+        if popen_arguments["shell"]:
+            process = await asyncio.create_subprocess_shell(popen_arguments["args"], **subprocess_arguments)
+        else:
+            process = await asyncio.create_subprocess_exec(*popen_arguments["args"], **subprocess_arguments)
+        limits = limits or Limits()
+        command_timeout, command_limit = limits.limit(limits.command_timeout, "--command-timeout",
+                                                      "converting with the core converter")
+        try:
+            stdout, _ = await asyncio.wait_for(
+                process.communicate(md_content.encode("utf-8") if pass_md_content_via_stdin else None), command_timeout)
+        except asyncio.TimeoutError:
+            kill_process_group(process)
+            raise StageTimeoutError("converting with the core converter", command_timeout, command_limit)
+        except asyncio.CancelledError:
+            kill_process_group(process)
+            raise
+        if process.returncode != 0:
+            raise Exception("An exception with the core converter occurred:\n\n"
+                            + (("STDOUT:\n" + stdout.decode(encoding=sys.stdout.encoding) + "\n\n") if stdout else "")
+                            + "with your command:\n\n" + core_converter)
+        return stdout.decode(encoding=sys.stdout.encoding)
+
+    return await _get_running_loop().run_in_executor(
+        None, convert_chunk or functools.partial(convert_with_core_converter, core_converter=core_converter), md_content
     )
 
 
+# Converting many documents (or chunks of documents) at once:
+
+def batch_core_converter(convert_batch: typing.Callable[[typing.List[str]], typing.List[str]]):
+    """Turns a function that converts a list of markdown strings into a list of html strings into a core converter.
+    Whenever gh-md-to-html converts several documents or chunks at once (see convert_documents() and --chunk-size),
+    it passes all of them to convert_batch together; otherwise, convert_batch gets a list with only one document.
+    Can be used as a decorator. Any other callable core converter can support batches, too, by having a convert_batch
+    attribute.
+
+    >>> upper = batch_core_converter(lambda md_contents: [md_content.upper() for md_content in md_contents])
+    >>> upper("a")
+    'A'
+    >>> convert_batch_with_core_converter(["a", "b", "c"], upper, batch_size=2)
+    ['A', 'B', 'C']
+    """
+    def core_converter(md_content: str) -> str:
+        return convert_batch([md_content])[0]
+    core_converter.convert_batch = convert_batch
+    return core_converter
+
+
+def get_batch_interface(core_converter):
+    """Returns the function the given core converter converts lists of markdown strings with, or None if it can only
+    convert one document at a time."""
+    if type(core_converter) is str:
+        core_converter = converter_registry.get_core_converter(core_converter)
+    return getattr(core_converter, "convert_batch", None)
+
+
+def convert_batch_with_core_converter(md_contents: typing.List[str], core_converter, batch_size=None,
+                                      limits=None) -> typing.List[str]:
+    """Converts a list of markdown strings to a list of html strings, passing up to batch_size of them (or all of them,
+    if batch_size is None) to the batch interface of the given core converter at once. The documents of a batch that
+    fails as a whole are converted one at a time instead (with a warning), so a broken document only fails its own
+    conversion, and core converters without a batch interface convert every document on its own, within the given
+    Limits (or the default ones)."""
+    convert_batch = get_batch_interface(core_converter)
+    batch_size = batch_size or len(md_contents) or 1
+    html_contents = list()
+    for start in range(0, len(md_contents), batch_size):
+        batch = md_contents[start:start + batch_size]
+        html_batch = None
+        if convert_batch is not None and len(batch) > 1:
+            try:
+                html_batch = list(convert_batch(batch))
+            except Exception as e:
+                warnings.warn("Converting a batch of " + str(len(batch)) + " markdown documents with the core "
+                              + "converter failed, so they are converted one by one instead:\n" + repr(e))
+            if html_batch is not None and len(html_batch) != len(batch):
+                warnings.warn("The core converter returned " + str(len(html_batch)) + " html documents for a batch of "
+                              + str(len(batch)) + " markdown documents, so they are converted one by one instead.")
+                html_batch = None
+        if html_batch is None:
+            html_batch = [convert_with_core_converter(md_content, core_converter, limits) for md_content in batch]
+        html_contents += html_batch
+    return html_contents
+
+
+# Splitting large documents into chunks that can be converted independently:
+
+LINK_REFERENCE_DEFINITION = re.compile(r"^ {0,3}\[[^\]^][^\]]*\]:\s*\S")
+FOOTNOTE_DEFINITION = re.compile(r"^ {0,3}\[\^[^\]]+\]:")
+LIST_ITEM_START = re.compile(r"^(?:[-+*]|\d{1,9}[.)])(?:\s|$)")
+CODE_FENCE = re.compile(r"^(?:`{3,}|~{3,})")
+HTML_BLOCKS_THAT_CAN_CONTAIN_BLANK_LINES = (
+    ("<!--", "-->"), ("<pre", "</pre>"), ("<script", "</script>"), ("<style", "</style>"), ("<textarea", "</textarea>")
+)
+
+
+def split_markdown_into_chunks(md: str, max_chunk_size: int) -> typing.List[str]:
+    """Splits md into chunks of roughly max_chunk_size characters each, which can be converted to html independently
+    of each other. Chunks are only split right before a top-level block that follows a blank line, and never within
+    code blocks, lists, tables, block quotes or html blocks. Link reference definitions are appended to every chunk so
+    links using them work in every chunk, and documents with footnotes aren't split at all (footnotes are numbered and
+    collected across the entire document).
+
+    >>> split_markdown_into_chunks("# a\\n\\ntext\\n\\n- list\\n\\n  more list\\n\\n```\\ncode\\n\\ncode\\n```\\n\\nend", 1)
+    ['# a', 'text\\n\\n- list\\n\\n  more list', '```\\ncode\\n\\ncode\\n```', 'end']
+    >>> split_markdown_into_chunks("# a\\n\\ntext\\n\\nend", 100)
+    ['# a\\n\\ntext\\n\\nend']
+    >>> split_markdown_into_chunks("[link][1]\\n\\n[1]: https://example.com", 1)
+    ['[link][1]\\n\\n[1]: https://example.com', '[1]: https://example.com']
+    >>> split_markdown_into_chunks("text[^1]\\n\\nmore text\\n\\n[^1]: footnote", 1)
+    ['text[^1]\\n\\nmore text\\n\\n[^1]: footnote']
+    >>> split_markdown_into_chunks("Intro\\n\\n````md\\n```\\ninner\\n\\n```\\n\\nafter inner\\n````\\n\\nend", 1)
+    ['Intro', '````md\\n```\\ninner\\n\\n```\\n\\nafter inner\\n````', 'end']
+    """
+    chunks = [[]]
+    chunk_size = 0
+    link_reference_definitions = []
+    fence = None  # <- the fence (like ``` or ~~~~) of the code block we are in, if any.
+    html_block_end = None  # <- the end tag of the html block we are in, if any.
+    previous_line_blank = False
+    for line in md.split("\n"):
+        stripped_line = line.strip()
+        if fence is None and html_block_end is None:
+            if FOOTNOTE_DEFINITION.match(line):
+                return [md]
+            if LINK_REFERENCE_DEFINITION.match(line):
+                link_reference_definitions.append(line)
+            # start a new chunk if this line starts a new top-level block and the current chunk is large enough:
+            if previous_line_blank and chunk_size >= max_chunk_size and line and not line[0].isspace() \
+                    and not LIST_ITEM_START.match(line) and not line.startswith(("|", ">")):
+                while chunks[-1] and not chunks[-1][-1].strip():
+                    chunks[-1].pop()
+                chunks.append([])
+                chunk_size = 0
+            # find out whether this line starts a code block or an html block that may contain blank lines:
+            fence_match = CODE_FENCE.match(stripped_line)
+            if fence_match:
+                fence = fence_match.group(0)
+            else:
+                for block_start, block_end in HTML_BLOCKS_THAT_CAN_CONTAIN_BLANK_LINES:
+                    if stripped_line.lower().startswith(block_start) and block_end not in stripped_line.lower():
+                        html_block_end = block_end
+                        break
+        elif fence is not None and stripped_line.startswith(fence) and not stripped_line.strip(fence[0]):
+            fence = None  # <- (only a line of at least as many of the same characters closes the code block)
+        elif html_block_end is not None and html_block_end in stripped_line.lower():
+            html_block_end = None
+        chunks[-1].append(line)
+        chunk_size += len(line) + 1
+        previous_line_blank = not stripped_line
+
+    if len(chunks) == 1:
+        return [md]
+    chunks_with_link_reference_definitions = []
+    for chunk in chunks:
+        missing_link_reference_definitions = [line for line in link_reference_definitions if line not in chunk]
+        chunks_with_link_reference_definitions.append("\n".join(chunk + (
+            [""] + missing_link_reference_definitions if missing_link_reference_definitions else []
+        )))
+    return chunks_with_link_reference_definitions
+
+
 def compress_images_input_to_dict(compress_images) -> dict:
     """Parse the input of the compress-images-parameter to a python dict (empty if we should not do compression at all)
     according to the specification in the help text.
@@ -497,33 +994,51 @@ def compress_images_input_to_dict(compress_images) -> dict:
 
     Entering Bools for True:
 
-    >>> compress_images_input_to_dict("True") == {'bg-color': (255, 255, 255), 'progressive': False, 'srcset': False, 'quality': 90}
+    >>> compress_images_input_to_dict("True") == {'bg-color': (255, 255, 255), 'progressive': False, 'srcset': False, 'quality': 90, 'placeholder': False}
     True
 
-    >>> compress_images_input_to_dict(True) == {'bg-color': (255, 255, 255), 'progressive': False, 'srcset': False, 'quality': 90}
+    >>> compress_images_input_to_dict(True) == {'bg-color': (255, 255, 255), 'progressive': False, 'srcset': False, 'quality': 90, 'placeholder': False}
     True
 
     Entering a dict (check if it is correctly extended with the omitted attributes, and no given ones are overwritten):
 
-    >>> compress_images_input_to_dict({'quality': 80}) == {'bg-color': (255, 255, 255), 'progressive': False, 'srcset': False, 'quality': 80}
+    >>> compress_images_input_to_dict({'quality': 80}) == {'bg-color': (255, 255, 255), 'progressive': False, 'srcset': False, 'quality': 80, 'placeholder': False}
     True
 
     Entering some json data (check if it is correctly converted to a dict, extended with the omitted attributes, and
     no given ones are overwritten):
 
-    >>> compress_images_input_to_dict("{\\"quality\\": 80, \\"progressive\\": \\"yes\\"}") == {'bg-color': (255, 255, 255), 'progressive': True, 'srcset': False, 'quality': 80}
+    >>> compress_images_input_to_dict("{\\"quality\\": 80, \\"progressive\\": \\"yes\\"}") == {'bg-color': (255, 255, 255), 'progressive': True, 'srcset': False, 'quality': 80, 'placeholder': False}
     True
 
     Setting the srcset-attribute to True and checking if the right default value is chosen:
 
-    >>> compress_images_input_to_dict("{\\"srcset\\": \\"y\\"}") == {'bg-color': (255, 255, 255), 'progressive': False, 'srcset': [500, 800, 1200, 1500, 1800, 2000], 'quality': 90}
+    >>> compress_images_input_to_dict("{\\"srcset\\": \\"y\\"}") == {'bg-color': (255, 255, 255), 'progressive': False, 'srcset': [500, 800, 1200, 1500, 1800, 2000], 'quality': 90, 'placeholder': False}
     True
 
     Specify some sizes for srcset to ensure they aren't overwritten:
 
-    >>> compress_images_input_to_dict("{\\"srcset\\": [80]}") == {'bg-color': (255, 255, 255), 'progressive': False, 'srcset': [80], 'quality': 90}
+    >>> compress_images_input_to_dict("{\\"srcset\\": [80]}") == {'bg-color': (255, 255, 255), 'progressive': False, 'srcset': [80], 'quality': 90, 'placeholder': False}
     True
 
+    Setting the placeholder-attribute to True and checking if the right default size is chosen:
+
+    >>> compress_images_input_to_dict("{\\"placeholder\\": true}")["placeholder"]
+    16
+
+    >>> compress_images_input_to_dict("{\\"placeholder\\": 24}")["placeholder"]
+    24
+
+    Like in other boolean values, 1 means True (a placeholder of 1px would be useless anyway), and negative sizes are
+    rejected:
+
+    >>> compress_images_input_to_dict("{\\"placeholder\\": 1}")["placeholder"]
+    16
+    >>> compress_images_input_to_dict("{\\"placeholder\\": -5}")["placeholder"]
+    Traceback (most recent call last):
+    ...
+    argparse.ArgumentTypeError: The 'placeholder'-value of the compress-images-input must be boolean or a positive size in pixels!
+
     """
     # Return an empty dict if nothing was specified:
     if not compress_images:
@@ -535,6 +1050,7 @@ def compress_images_input_to_dict(compress_images) -> dict:
         "progressive": "False",
         "srcset": "False",
         "quality": 90,
+        "placeholder": "False",
     }
     # Choose default dict if input is a True-string and return an empty dict if it is a False-string:
     try:
@@ -547,8 +1063,8 @@ def compress_images_input_to_dict(compress_images) -> dict:
 
     # Convert the compression-info-dict to an actual dict:
     try:
-        if type(compress_images) is dict:  # <-- Use the given input if its type is dict.
-            compression_information = compress_images
+        if type(compress_images) is dict:  # <-- Use (a copy of) the given input if its type is dict.
+            compression_information = dict(compress_images)
         else:
             compression_information = json.loads(compress_images)
     except (json.decoder.JSONDecodeError, TypeError) as e:
@@ -572,6 +1088,22 @@ def compress_images_input_to_dict(compress_images) -> dict:
     if compression_information["srcset"] is True:
         compression_information["srcset"] = [500, 800, 1200, 1500, 1800, 2000]
 
+    # Convert the placeholder-value to a size in pixels (or False), using 16px if it is True (or 1, like in str2bool):
+    placeholder = compression_information["placeholder"]
+    if type(placeholder) is str and placeholder.strip().lstrip("-").isnumeric():
+        placeholder = int(placeholder)
+    if type(placeholder) is int and placeholder < 0:
+        raise argparse.ArgumentTypeError(
+            "The 'placeholder'-value of the compress-images-input must be boolean or a positive size in pixels!")
+    if type(placeholder) is int and placeholder not in (0, 1):
+        compression_information["placeholder"] = placeholder
+    else:
+        try:
+            compression_information["placeholder"] = 16 if str2bool(placeholder) else False
+        except argparse.ArgumentTypeError:
+            raise argparse.ArgumentTypeError(
+                "The 'placeholder'-value of the compress-images-input must be boolean or a positive size in pixels!")
+
     # Convert the color given to bg-color to a three-tuple:
     compression_information["bg-color"] = compression_information["bg-color"].strip()  # <-- Remove whitespace
     if compression_information["bg-color"].startswith("rgb"):
@@ -599,18 +1131,20 @@ def compress_images_input_to_dict(compress_images) -> dict:
 
 
 def find_fitting_hash_function(amount_of_images):
-    global HASH_FUNCTION_TO_USE_ON_IMAGES
+    """Returns the hash function to pass to hash_image() when hashing the given amount of images."""
     if amount_of_images <= 1000:
-        HASH_FUNCTION_TO_USE_ON_IMAGES = hash
+        return hash
     else:
-        HASH_FUNCTION_TO_USE_ON_IMAGES = lambda x: hashlib.md5(x.encode() if type(x) is str else x)
+        return HASH_FUNCTION_TO_USE_ON_IMAGES
 
 # Hash an image:
 
 
-def hash_image(img, return_unhashed=False):
+def hash_image(img, return_unhashed=False, hash_function=None):
+    if hash_function is None:
+        hash_function = HASH_FUNCTION_TO_USE_ON_IMAGES
     if type(img) in (str, bytes):
-        return HASH_FUNCTION_TO_USE_ON_IMAGES(img)
+        return hash_function(img)
 
     pixel_data = list()
     frames_durations = list()
@@ -627,7 +1161,69 @@ def hash_image(img, return_unhashed=False):
 
     if return_unhashed:
         return pixel_data_string
-    return HASH_FUNCTION_TO_USE_ON_IMAGES(pixel_data_string)
+    return hash_function(pixel_data_string)
+
+
+# The hashes of the images that were already saved, so every conversion (e.g. of all documents of a website, or of the
+# same document in watch mode) doesn't need to hash all of them again, as long as they don't change. Every image only
+# has one entry (which is replaced when the image changes), and the least recently used ones are forgotten once there
+# are more than this many:
+SAVED_IMAGE_HASHES_CACHE_SIZE = 4096
+
+_hashes_of_saved_images = collections.OrderedDict()
+_hashes_of_saved_images_lock = threading.Lock()
+
+
+def hash_saved_image(path: str, hash_function):
+    """Returns the hash of the image saved at path, like hash_image() does."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), hash_function)
+    with _hashes_of_saved_images_lock:
+        if key in _hashes_of_saved_images and _hashes_of_saved_images[key][:2] == (stat.st_mtime_ns, stat.st_size):
+            _hashes_of_saved_images.move_to_end(key)
+            return _hashes_of_saved_images[key][2]
+    if path.endswith(".svg"):
+        with open(path, "rb") as image_file:
+            image_hash = hash_image(image_file.read(), hash_function=hash_function)
+    else:
+        with Image.open(path) as image:
+            image_hash = hash_image(image, hash_function=hash_function)
+    with _hashes_of_saved_images_lock:
+        _hashes_of_saved_images[key] = (stat.st_mtime_ns, stat.st_size, image_hash)
+        _hashes_of_saved_images.move_to_end(key)
+        while len(_hashes_of_saved_images) > SAVED_IMAGE_HASHES_CACHE_SIZE:
+            _hashes_of_saved_images.popitem(last=False)
+    return image_hash
+
+
+# One lock per image directory, so conversions that run in several threads at once (e.g. with the same Converter) and
+# save images into the same directory don't choose the same name for different images, and don't hash images that
+# are still being written:
+_image_directory_locks = dict()
+_image_directory_locks_lock = threading.Lock()
+
+
+def lock_of_image_directory(path: str) -> threading.Lock:
+    """Returns the lock that conversions hold whilst they look at and save images in the image directory at path.
+
+    >>> import tempfile
+    >>> directory = tempfile.mkdtemp()
+    >>> for i in range(16):  # <- 16 documents with a different image that is called img.png each
+    ...     os.makedirs(os.path.join(directory, str(i)))
+    ...     Image.new("RGB", (4, 4), (i * 16, 0, 0)).save(os.path.join(directory, str(i), "img.png"))
+    ...     with open(os.path.join(directory, str(i), "doc.md"), "w") as md_file:
+    ...         _ = md_file.write("![image](img.png)")
+    >>> converter = Converter(core_converter="OFFLINE", output_name="print", destination=directory, css_paths="")
+    >>> with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+    ...     html_contents = list(executor.map(converter.convert, [
+    ...         os.path.join(directory, str(i), "doc.md") for i in range(16)]))
+    >>> [Image.open(os.path.join(directory, "images", re.search('src="[^"]*/([^/"]+)"', html_content).group(1))
+    ...             ).getpixel((0, 0))[0] for html_content in html_contents] == [i * 16 for i in range(16)]
+    True
+    >>> shutil.rmtree(directory)
+    """
+    with _image_directory_locks_lock:
+        return _image_directory_locks.setdefault(os.path.abspath(path), threading.Lock())
 
 
 # def test_image_hashing():
@@ -637,6 +1233,45 @@ def hash_image(img, return_unhashed=False):
 #     print("t:", time.time() - t)
 # test_image_hashing()
 
+# Find out where to download images from:
+
+IMAGE_DOWNLOAD_WORKERS = 8  # <- how many images of a document to download at the same time
+
+
+def web_url_of_image(image_src: str, origin_type: str, md_origin: str):
+    """Returns the url to download the image referenced as image_src from, or None if it needs to be loaded from the
+    disk."""
+    if image_src.startswith("./"):
+        image_src = image_src[2:]
+    if image_src.startswith("https://") or image_src.startswith("http://"):
+        # it is clearly an absolute url:
+        return image_src
+    if origin_type in ("repo", "web"):
+        # create website domain name and specific path from md_origin depending on whether we pull from a repo or the
+        # web:
+        if origin_type == "repo":
+            user_name, repo_name, branch_name, *path = md_origin.split("/")
+            url_root = (
+                    "https://github.com/" + user_name
+                    + "/" + repo_name
+                    + "/raw/" + branch_name
+            )
+            url_full = url_root + "/" + "/".join(path[:-1]) + "/"
+        else:  # origin_type == "web":
+            url_root = "/".join(md_origin.split("/")[:3])
+            url_full = md_origin.rsplit("/", 1)[0] + "/"
+        # Create full web image path depending on weather we have an absolute relative link or just a regular relative
+        # link:
+        if image_src.startswith("/"):
+            return url_root + image_src
+        return url_full + image_src
+    return None
+
+
+def download_image(url: str, limits=None) -> bytes:
+    return (limits or Limits()).get(url, "downloading the image " + url).content
+
+
 # Find a filename from a name, a set of names that are already taken, and an appendix to add before the extension:
 
 
@@ -681,7 +1316,7 @@ def make_unused_name(base_file_name, file_name_addition, already_used_filenames,
 
 def compress_image(full_image, width, bg_color, quality, progressive,
                    base_file_name, file_name_addition, already_used_filenames, abs_image_paths,
-                   hashes_to_images) -> str:
+                   hashes_to_images, hash_function=None) -> str:
     thumbnail = full_image.copy()
     size = (width, int(thumbnail.size[1] * width/thumbnail.size[0]))
     thumbnail.thumbnail(size, Image.LANCZOS)
@@ -697,13 +1332,213 @@ def compress_image(full_image, width, bg_color, quality, progressive,
     final_thumb.paste(final_thumb_rgba, offset_tuple)
 
     base_file_name = make_unused_name(base_file_name, file_name_addition, already_used_filenames, hashes_to_images,
-                                      hash_image(final_thumb), ".jpeg")
+                                      hash_image(final_thumb, hash_function=hash_function), ".jpeg")
     final_thumb.save(os.path.join(abs_image_paths, base_file_name), 'JPEG',
                      quality=quality, optimize=True, progressive=progressive)
 
     return base_file_name
 
 
+# Pack custom emojis into a sprite sheet:
+
+
+def make_emoji_sprite_sheet(emoji_images, compression_information, cell_size=128):
+    """Takes a list of images and scales each of them to fit into a cell_size*cell_size square, and arranges these
+    squares in a grid that is as square as possible. Returns the resulting image, as well as the number of columns and
+    rows of the grid. If compression_information is given, transparent areas are filled with its bg-color."""
+    columns = math_module.ceil(math_module.sqrt(len(emoji_images)))
+    rows = math_module.ceil(len(emoji_images) / columns)
+    sprite_sheet = Image.new(mode='RGBA', size=(columns * cell_size, rows * cell_size), color=(0, 0, 0, 0))
+    for position, emoji_image in enumerate(emoji_images):
+        thumbnail = emoji_image.convert("RGBA")
+        thumbnail.thumbnail((cell_size, cell_size), Image.LANCZOS)
+        sprite_sheet.paste(thumbnail, (
+            (position % columns) * cell_size + (cell_size - thumbnail.width) // 2,
+            (position // columns) * cell_size + (cell_size - thumbnail.height) // 2,
+        ), thumbnail)
+    if compression_information:
+        flattened_sprite_sheet = Image.new(mode='RGB', size=sprite_sheet.size, color=compression_information["bg-color"])
+        flattened_sprite_sheet.paste(sprite_sheet, (0, 0), sprite_sheet)
+        sprite_sheet = flattened_sprite_sheet
+    return sprite_sheet, columns, rows
+
+
+# Create a tiny blurred preview of an image to show whilst it loads:
+
+PLACEHOLDER_QUALITY = 50  # <- the jpeg quality of the placeholders.
+
+
+def make_image_placeholder(full_image, size, bg_color, quality=PLACEHOLDER_QUALITY) -> bytes:
+    """Returns the bytes of a jpeg-version of full_image that is at most size pixels wide and high and blurred, to be
+    used as a low-quality placeholder (embedded as a data-URI) that is displayed whilst the actual image loads."""
+    thumbnail = full_image.convert("RGBA")
+    thumbnail.thumbnail((size, size), Image.LANCZOS)
+    placeholder = Image.new(mode='RGB', size=thumbnail.size, color=bg_color)
+    placeholder.paste(thumbnail, (0, 0), thumbnail)
+    placeholder = placeholder.filter(ImageFilter.GaussianBlur(radius=1))
+    placeholder_bytes = BytesIO()
+    placeholder.save(placeholder_bytes, 'JPEG', quality=quality, optimize=True)
+    return placeholder_bytes.getvalue()
+
+
+# Embed files into the html:
+
+
+def inline_images_input_to_max_size(inline_images):
+    """Parse the input of the inline-images-parameter to the maximum size (in bytes) of images to inline, which is 0
+    if no images should be inlined and infinite if all images should be inlined.
+
+    --------
+    Doctests:
+    --------
+
+    >>> inline_images_input_to_max_size(None)
+    0
+
+    >>> inline_images_input_to_max_size("false")
+    0
+
+    >>> inline_images_input_to_max_size("all")
+    inf
+
+    >>> inline_images_input_to_max_size(True)
+    inf
+
+    >>> inline_images_input_to_max_size("2048")
+    2048
+
+    """
+    if not inline_images:
+        return 0
+    if type(inline_images) is str and inline_images.strip().isnumeric():
+        return int(inline_images)
+    if type(inline_images) is int:
+        return inline_images
+    if type(inline_images) is str and inline_images.strip().lower() == "all":
+        return math_module.inf
+    try:
+        return math_module.inf if str2bool(inline_images) else 0
+    except argparse.ArgumentTypeError:
+        raise argparse.ArgumentTypeError("--inline-images must be a size in bytes, \"all\", true or false.")
+
+
+def find_assets_in_html(html_content: str) -> list:
+    """Returns the local files (as they are referenced) that the given html embeds or links to as stylesheets."""
+    html_soup = BeautifulSoup(html_content, "html.parser")
+    references = [img_soup_representation["src"] for img_soup_representation in html_soup.find_all("img", src=True)]
+    for element_soup_representation in html_soup.find_all(srcset=True):
+        references += [candidate.split()[0] for candidate in element_soup_representation["srcset"].split(",")
+                       if candidate.strip()]
+    references += [link_soup_representation["href"]
+                   for link_soup_representation in html_soup.find_all("link", href=True)]
+    return sorted(set(
+        reference for reference in references
+        if reference and not reference.startswith(("data:", "#", "//")) and "://" not in reference
+    ))
+
+
+def file_to_data_uri(path) -> str:
+    """Returns a base64-encoded data-URI containing the file at path."""
+    mime_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    with open(path, "rb") as f:
+        return "data:" + mime_type + ";base64," + str(base64.b64encode(f.read()), encoding="ascii")
+
+
+# Add loading-related attributes and styles to images:
+
+
+def add_to_style_attribute(tag_soup_representation, css_property, value):
+    """Adds `css_property: value;` to the style attribute of the given tag, unless the style attribute already sets
+    css_property."""
+    css_information = css_property + ": " + value + ";"
+    if tag_soup_representation.has_attr("style"):
+        if ";" + css_property + ":" not in ";" + tag_soup_representation["style"].replace(" ", ""):
+            tag_soup_representation["style"] = (
+                tag_soup_representation["style"].strip().rstrip(";") + "; " + css_information
+            )
+    else:
+        tag_soup_representation["style"] = css_information
+
+
+def add_loading_hints_to_images(html_soup, eager_images):
+    """Makes all images in html_soup decode asynchronously, and lazy-loads all of them except for the first
+    eager_images ones, which are likely to be visible on the first screen anyways."""
+    for image_number, img_soup_representation in enumerate(html_soup.find_all("img")):
+        if not img_soup_representation.has_attr("decoding"):
+            img_soup_representation["decoding"] = "async"
+        if image_number >= eager_images and not img_soup_representation.has_attr("loading"):
+            img_soup_representation["loading"] = "lazy"
+
+
+def add_user_content_prefixes(html_rendered: str) -> typing.Tuple[str, bool]:
+    """Prefixes all ids, names and internal links in html_rendered with "user-content-" like GitHub does, and gives
+    every heading the id of the anchor within it. The second return value tells whether the html contains links to
+    places within itself (other than the anchors of headings)."""
+    contains_file_internal_links = False
+    html_soup = BeautifulSoup(html_rendered, 'html.parser')
+    for element_soup_representation in html_soup.select("[id]"):
+        id_name = element_soup_representation.get("id")
+        if id_name and not id_name.startswith("user-content-"):
+            element_soup_representation["id"] = "user-content-" + id_name
+    for link_soup_representation in html_soup.find_all("a"):
+        # "user-content-"-ify the href-attributes
+        link_location = link_soup_representation.get("href")
+        if link_location and link_location.startswith("#"):
+            if not link_location.startswith("#user-content-"):
+                # ^ GitHub technically doesn't recognize this, but we derive from GitHub's behavior here.
+                link_location = "#user-content-" + link_location[1:]
+            if not (link_soup_representation.has_attr("class") and link_soup_representation["class"] == ["anchor"]):
+                contains_file_internal_links = True
+        link_soup_representation["href"] = link_location
+        # "user-content-"-ify the id-attribute; note that this has precedence over the name attributes.
+        link_id = link_soup_representation.get("id")
+        if link_id:
+            link_soup_representation["name"] = link_id
+            del link_id
+        # "user-content-"-ify the name-attributes
+        link_name = link_soup_representation.get("name")
+        if link_name and not link_name.startswith("user-content-"):
+            link_soup_representation["name"] = "user-content-" + link_name
+    for element_referencing_id_soup_representation in html_soup.find_all(lambda tag: tag.has_attr("xlink:href")):
+        # "user-content-"-ify references within svgs (e.g. formulas) to match the ids they reference
+        referenced_location = element_referencing_id_soup_representation["xlink:href"]
+        if referenced_location.startswith("#") and not referenced_location.startswith("#user-content-"):
+            element_referencing_id_soup_representation["xlink:href"] = "#user-content-" + referenced_location[1:]
+
+    # add correct id to all headings:
+    for h in ("h1", "h2", "h3", "h4", "h5"):
+        for header_soup_representation in html_soup.find_all(h):
+            if header_soup_representation.find('a'):
+                header_soup_representation['id'] = header_soup_representation.a['id']
+            # ToDo: Implement these nice anchor svg icons GitHub displays next to every heading
+    #       link_within_header = header_soup_representation.a
+    #       link_within_header.append(BeautifulSoup(GITHUB_LINK_ANCHOR, 'html.parser').find("svg"))
+
+    return html_soup.__str__(), contains_file_internal_links
+
+
+# The css (which only depends on a few options, so it is only put together once for every combination of them):
+
+@functools.lru_cache(maxsize=None)
+def make_github_css(highlight_code: bool, soft_wrap_in_code_boxes: bool, inline_css: bool) -> str:
+    with open_local("github-css.min.css", "r") as from_f:
+        github_min_css = from_f.read()
+    if highlight_code:
+        # add syntax highlighting css if we use OFFLINE or OFFLINE+ for conversion:
+        from pygments.formatters import html as pygments_html
+        github_min_css += pygments_html.HtmlFormatter().get_style_defs('.highlight') \
+            .replace("\n", "").replace(";", " !important;").replace(" }", " !important }")
+    if soft_wrap_in_code_boxes:
+        # add css to make code boxes soft wrap:
+        github_min_css += CSS_TO_MAKE_CODE_BOXES_WRAP.replace("\n", "").replace("    ", "").replace(": ", ":")
+    if inline_css:
+        # the css is inlined, so the image it references can't be found relative to it and needs to be inlined too:
+        github_min_css = github_min_css.replace(
+            "url(code-navigation-banner-illo.svg)",
+            "url(" + file_to_data_uri(os.path.join(MODULE_PATH, "code-navigation-banner-illo.svg")) + ")")
+    return github_min_css
+
+
 # a constant:
 
 CSS_TO_MAKE_CODE_BOXES_WRAP = """
@@ -726,20 +1561,70 @@ CSS_TO_MAKE_CODE_BOXES_WRAP = """
 
 # The main function:
 
-def main(md_origin, origin_type="file", website_root=None, destination=None, image_paths=None, css_paths=None,
+def _conversion_steps(md_origin, origin_type="file", website_root=None, destination=None, image_paths=None, css_paths=None,
          output_name="<name>.html", output_pdf=None, style_pdf="True", footer=None, math="True",
          formulas_supporting_darkreader=False, extra_css=None,
          core_converter: typing.Union[str, typing.Callable] = markdown_to_html_via_github_api,
          compress_images=False, enable_image_downloading=True, box_width=None, toc=False, dont_make_images_links=False,
          soft_wrap_in_code_boxes=False, suppress_online_fallbacks=False, validate_html=False, emoji_support=1,
-         enable_css_saving =True):
+         enable_css_saving =True, optimize_image_loading=False, eager_images=3, inline_images=False,
+         emoji_sprite_sheet=False, share_formula_glyphs=False, formula_precision=None, save_formulas_as_files=False,
+         formula_renderer="auto", chunk_size=None, persistent_core_converter=False, timeout=None,
+         connect_timeout=None, read_timeout=None, command_timeout=None, result_cache=None, no_cache=False, build=None,
+         incremental=False, local_images=True, stats=None):
+    """Converts a single document like main() does, as a generator that leaves the core conversion to its caller, so
+    the markdown of several documents can be converted together (see convert_documents()).
+    It yields a tuple (md_chunks, core_converter, convert_chunk) with the chunks of markdown to convert, the core
+    converter to convert them with and a function that converts a single chunk with all the options this document
+    needs, expects the list of resulting html chunks to be sent back, and then returns the finished html. If the
+    result is found in the result cache (or the outputs are up to date, in build mode), md_chunks is empty.
+    The time every other stage of the conversion takes is recorded in stats (a ConversionStats), if it is given; the
+    core conversion is recorded by the caller.
+
+    Converting a document incrementally (see --incremental) results in the same html as converting it at once (apart
+    from blank lines between its blocks), both when its blocks are converted and when they are taken from the cache:
+
+    >>> md = ("Intro with [a link][1].\\n\\n````md\\n```\\ninner\\n\\n```\\n\\nafter inner\\n````\\n\\n- item\\n\\n"
+    ...       "  more of the item\\n- [another][1]\\n\\n~~~\\ncode\\n\\n~~~~\\n\\n[1]: https://example.com")
+    >>> options = dict(origin_type="string", output_name="print", core_converter="OFFLINE", image_paths="",
+    ...                css_paths="")
+    >>> without_blank_lines = lambda html_content: [line for line in html_content.split("\\n") if line.strip()]
+    >>> html_content = main(md, **options)
+    >>> block_cache = BlockCache()
+    >>> converter = Converter(incremental=block_cache, **options)
+    >>> without_blank_lines(converter.convert(md)) == without_blank_lines(html_content)
+    True
+    >>> block_cache.size > 0
+    True
+    >>> without_blank_lines(converter.convert(md)) == without_blank_lines(html_content)
+    True
+    """
+    options_given = dict(locals())  # <- (to look the result up in the result cache with)
+    del options_given["md_origin"], options_given["stats"]
+    stats = stats or NO_STATS
     # check emoji_support parameter:
     if emoji_support not in (0, 1, 2):
         raise Exception("--emoji-support must be one of 0, 1 and 2.")
+    # check formula_renderer parameter:
+    if formula_renderer not in ("auto", "latex", "online", "mathml"):
+        raise Exception("--formula-renderer must be one of auto, latex, online and mathml.")
+    # everything this document waits for is limited from here on:
+    limits = Limits(connect_timeout, read_timeout, command_timeout, timeout)
     # set all to defaults:
     style_pdf = str2bool(style_pdf)
+    if str2bool(persistent_core_converter) and type(core_converter) is str and core_converter not in (
+            "OFFLINE", "OFFLINE+") and not converter_registry.get_core_converter(core_converter):
+        core_converter = coprocess.get_coprocess_converter(core_converter, limits.command_timeout)
     math = str2bool(math)
+    local_images = str2bool(local_images)
+    optimize_image_loading = str2bool(optimize_image_loading)
+    emoji_sprite_sheet = str2bool(emoji_sprite_sheet)
+    share_formula_glyphs = str2bool(share_formula_glyphs)
+    save_formulas_as_files = str2bool(save_formulas_as_files)
+    if formula_precision is not None:
+        formula_precision = int(formula_precision)
     compression_information = compress_images_input_to_dict(compress_images)
+    max_size_of_inlined_images = inline_images_input_to_max_size(inline_images)
     if output_pdf == "":
         output_pdf = "<name>.pdf"
     if website_root == "":
@@ -756,6 +1641,8 @@ def main(md_origin, origin_type="file", website_root=None, destination=None, ima
         if css_paths == "":
             enable_css_saving = False
         css_paths = "github-markdown-css"
+    if max_size_of_inlined_images:
+        enable_css_saving = False  # <- inlining images is meant to produce a single self-contained file.
 
     # set all to paths instead of paths relative to website_root:
     abs_website_root = ("/" if not website_root.startswith(".") else "") + website_root
@@ -770,33 +1657,93 @@ def main(md_origin, origin_type="file", website_root=None, destination=None, ima
             os.makedirs(path, exist_ok=True)
 
     # get the markdown file's content:
+    local_files_read = list()  # <- (for the dependency manifest in build mode)
+    stats.begin("reading")
     if origin_type == "file":
         with open(md_origin, "r") as f:
             md_content = f.read()
+        local_files_read.append(md_origin)
     elif origin_type == "web":
-        md_content = requests.get(md_origin).text
+        md_content = limits.get(md_origin, "downloading the markdown file " + md_origin).text
     elif origin_type == "repo":
-        md_content = requests.get("https://raw.githubusercontent.com/" + md_origin).text
+        md_content = limits.get("https://raw.githubusercontent.com/" + md_origin,
+                                "downloading the markdown file " + md_origin).text
     elif origin_type == "string":
         md_content = md_origin
     else:
         raise Exception("origin_type must be either file, web, repo or string.")
+    stats.end()
+
+    md_content_as_read = md_content
+    file_name_origin = md_origin.split("/")[-1].split(os.sep)[-1].rsplit(".", 1)[0]
+    options_given.update(md_origin=(md_origin if origin_type != "string" else None), working_directory=os.getcwd())
+
+    # skip the conversion if its result is cached:
+    if result_cache is None:
+        result_cache = os.environ.get("GH_MD_TO_HTML_RESULT_CACHE") or None
+    if result_cache and not str2bool(no_cache):
+        stats.begin("result cache")
+        if not isinstance(result_cache, ResultCache):
+            result_cache = get_result_cache(result_cache)
+        cache_key = result_cache.key(md_content, options_given)
+        cached_html = result_cache.get(cache_key)
+        stats.end()
+        if cached_html is not None:
+            yield [], core_converter, None
+            return cached_html
+    else:
+        result_cache = None
+
+    # skip the conversion if its outputs are up to date (in build mode):
+    dependency_manifest = None
+    if build and output_name != "print" and not ("<name>" in output_name and origin_type == "string"):
+        output_path = os.path.join(abs_destination, output_name.replace("<name>", file_name_origin))
+        dependency_manifest = DependencyManifest(build if type(build) is str else None, output_path)
+        stats.begin("dependency manifest")
+        output_is_up_to_date = dependency_manifest.is_up_to_date(md_content, options_given)
+        stats.end()
+        if output_is_up_to_date:
+            yield [], core_converter, None
+            with open(output_path, "r") as f:
+                return f.read()
 
     if DEBUG:
         print("\n------------\nOriginal content:\n------------\n\n", md_content)
 
-    # replace formulas with random sequences and get a dict to map them back:
+    # where formulas go if they are saved as files:
+    formula_files_location = (
+        (abs_image_paths, ("/" if website_root != "." else "") + image_paths + "/")
+        if save_formulas_as_files and not max_size_of_inlined_images
+        else None
+    )
+
+    # replace formulas with random sequences and get a dict to map them back (unless mistune parses them itself):
+    stats.begin("pre-pass")
     support_custom_emojis = (emoji_support >= 2)
-    md_content, formula_mapper, special_chars_in_code_blocks, headings, emoji_replacements = (
-        find_and_replace_formulas_in_markdown(md_content, math, support_custom_emojis))
+    formulas_cant_be_rendered = (suppress_online_fallbacks and formula_renderer == "auto"
+                                 and raw_formula2svg_online == raw_formula2svg)
+    render_formula = render_emoji = None
+    shared_glyphs = None
+    if core_converter in ("OFFLINE", "OFFLINE+"):
+        formula_mapper, special_chars_in_code_blocks, emoji_replacements = dict(), dict(), dict()
+        headings = find_headings_in_markdown(md_content)
+        if math:
+            shared_glyphs = dict() if share_formula_glyphs and formula_renderer != "mathml" else None
+            render_formula = make_formula_renderer(shared_glyphs, formula_precision, formula_files_location,
+                                                   formula_renderer, limits)
+            if formulas_cant_be_rendered:
+                render_formula = formula_without_necessary_dependencies
+        if emoji_support:
+            render_emoji = functools.partial(shortcode_to_emoji, emoji_support_level=emoji_support)
+    else:
+        md_content, formula_mapper, special_chars_in_code_blocks, headings, emoji_replacements = (
+            find_and_replace_formulas_in_markdown(md_content, math, support_custom_emojis))
+        if formulas_cant_be_rendered and formula_mapper:
+            formula_without_necessary_dependencies()
+    stats.end()
     if DEBUG:
         print("emoji replacements:", emoji_replacements)
 
-    # fail if we need to convert formulas, don't have the necessary dependencies and are suppressing online fallbacks:
-    if suppress_online_fallbacks and formula_mapper and raw_formula2svg_online == raw_formula2svg:
-        raise Exception("You are trying to convert a document with formulas in it, but you don't have the necessary\n"
-                        + "dependencies installed and you have disabled the use of online fallbacks.")
-
     if DEBUG:
         print("\n------------\nOriginal Content (Formulas replaced):\n------------\n\n", md_content)
         print("\n------------\nFormula Map:\n------------\n\n", formula_mapper)
@@ -804,104 +1751,70 @@ def main(md_origin, origin_type="file", website_root=None, destination=None, ima
 
     # render toc if that option is enabled:
     if toc:
-        md_content = render_toc(md_content, headings)
+        with stats.stage("toc"):
+            md_content = render_toc(md_content, headings)
 
     if DEBUG:
         print("\n------------\nHeadings in file:\n------------\n\n", headings)
         print("\n------------\nOriginal Content (TOCs rendered):\n------------\n\n", md_content)
 
-    # request markdown-to-html-conversion from our preferred method:
-
-    if core_converter in ("OFFLINE", "OFFLINE+"):
-        from . import core_converter as cc
-        if core_converter == "OFFLINE":
-            cc.INTERNAL_USE = False
-        else:
-            cc.INTERNAL_USE = True
-        html_content = cc.markdown(md_content)
-    elif type(core_converter) is str:  # execute the command:
-        # find out how to run the command:
-        if sys.platform.startswith('win'):
-            how_to_run_this = "cmd.exe"
-        elif shutil.which("bash") is not None:
-            how_to_run_this = "bash"
-        else:
-            raise Exception("You tried to use --core-converter (-o) with a custom command, but you are neither on"
-                            "Windows (cmd.exe), nor does your platform support bash.")
-
-        # escape the ms content in the right way:
-        if how_to_run_this == "cmd.exe":
-            md_content_shellescaped = windows_shellescape.escape_argument(md_content)
-        elif how_to_run_this == "bash":
-            md_content_shellescaped = shellescape.quote(md_content)
-        else:
-            raise
-
-        # finally convert:
-        out = subprocess.Popen(
-            (
-                core_converter.replace("{md}", md_content_shellescaped)
-                if how_to_run_this == "cmd.exe"
-                else [shutil.which("bash"), "-c", core_converter.replace("{md}", md_content_shellescaped)]
-            ),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            shell=(how_to_run_this == "cmd.exe"),
-        )
-        stdout, stderr = out.communicate()
-        if out.returncode != 0:
-            # Create a simplified version of the md content to put into the error message:
-            md_content_split_into_lines = md_content.split("\n")
-            if len(md_content_split_into_lines) == 1 and len(md_content_split_into_lines[0]) <= 40:
-                md_content_simplified = md_content_split_into_lines[0]
-            elif len(md_content_split_into_lines) > 1 and len(md_content_split_into_lines[0]) <= 37:
-                md_content_simplified = md_content_split_into_lines[0] + "..."
-            elif len(md_content_split_into_lines) > 1 and len(md_content_split_into_lines[0]) > 37:
-                md_content_simplified = md_content_split_into_lines[0][:36] + "..."
-            else:
-                raise
-            # escape the simplified ms content in the right way:
-            if how_to_run_this == "cmd.exe":
-                md_content_simplified_shellescaped = windows_shellescape.escape_argument(md_content_simplified)
-            elif how_to_run_this == "bash":
-                md_content_simplified_shellescaped = shellescape.quote(md_content_simplified)
-            else:
-                raise
-            print("md_content_simplified_shellescaped:", md_content_simplified_shellescaped)
-            print("end")
-            # raise exception:
-            raise Exception("An exception with the core converter occurred:\n\n"
-                            + (("STDERR:\n" + stderr.decode(encoding=sys.stdout.encoding) + "\n\n") if stderr else "")
-                            + (("STDOUT:\n" + stdout.decode(encoding=sys.stdout.encoding) + "\n\n") if stdout else "")
-                            + "with your command (displayed slightly shortened here):\n\n"
-                            + core_converter.replace("{md}", md_content_simplified_shellescaped))
-        else:
-            html_content = stdout.decode(encoding=sys.stdout.encoding)
+    # request markdown-to-html-conversion from our preferred method (in chunks, if the document is large):
+    offline_states = dict()  # <- what the OFFLINE converters found out about each chunk while converting it
+
+    def convert_chunk(md_chunk):
+        offline_state = dict()
+        offline_states[md_chunk] = offline_state
+        return convert_with_core_converter(md_chunk, core_converter, limits, render_formula=render_formula,
+                                           render_emoji=render_emoji, support_custom_emojis=support_custom_emojis,
+                                           make_images_links=not dont_make_images_links, state=offline_state)
+
+    if isinstance(incremental, BlockCache) or str2bool(incremental):
+        # only convert the blocks that weren't converted with the same options before:
+        block_cache = incremental if isinstance(incremental, BlockCache) else default_block_cache
+        md_chunks = split_markdown_into_chunks(md_content, chunk_size or 1)
+        block_keys = [block_cache.key(md_chunk, core_converter, dont_make_images_links, emoji_support, math)
+                      for md_chunk in md_chunks]
+        cached_html_chunks = [block_cache.get(block_key) for block_key in block_keys]
+        converted_html_chunks = iter((yield [md_chunk for md_chunk, html_chunk in zip(md_chunks, cached_html_chunks)
+                                             if html_chunk is None], core_converter, convert_chunk))
+        html_chunks = [html_chunk if html_chunk is not None else next(converted_html_chunks)
+                       for html_chunk in cached_html_chunks]
+        for md_chunk, block_key, html_chunk in zip(md_chunks, block_keys, html_chunks):
+            if not offline_states.get(md_chunk, dict()).get("contains_html_from_elsewhere"):
+                block_cache.put(block_key, html_chunk)
     else:
-        # call the core converter as a function in case it is one:
-        try:
-            html_content = core_converter(md_content)
-        except Exception as e:
-            # raise exception:
-            e.args = ("An exception with the core converter occurred:\n\n" + e.args[0],) + e.args[1:]
-            raise e
-            # raise type(e)("An exception with the core converter occurred:\n\n" + str(e))
+        md_chunks = split_markdown_into_chunks(md_content, chunk_size) if chunk_size else [md_content]
+        html_chunks = yield md_chunks, core_converter, convert_chunk
+    html_content = "\n".join(html_chunks)
+    limits.time_left("converting the markdown to html")
+    # the OFFLINE converters emit the final ids, internal links and image links themselves, so the html doesn't need to
+    # be fixed afterwards unless it contains html they didn't create themselves:
+    html_is_final = core_converter in ("OFFLINE", "OFFLINE+") and not footer and not extra_css and not any(
+        offline_state.get("contains_html_from_elsewhere") for offline_state in offline_states.values())
+    if shared_glyphs:
+        html_content = make_shared_glyph_definitions(shared_glyphs) + "\n" + html_content
 
     if DEBUG:
         print("\n------------\nHtml content:\n------------\n\n", html_content)
 
     # remove links around images if requested:
-    if dont_make_images_links:
+    if dont_make_images_links and not html_is_final:
+        stats.begin("link fixups")
         html_bs4 = BeautifulSoup(html_content, "html.parser")
         for img_bs4 in html_bs4.find_all("img"):
             if img_bs4.parent.name == "a":
                 if img_bs4.parent["href"] == img_bs4["src"]:
                     img_bs4.parent.unwrap()
         html_content = html_bs4.__str__()
+        stats.end()
 
     # re-insert formulas in html, this time as proper svg images:
+    stats.begin("formulas")
     html_content = find_and_render_formulas_in_html(html_content, formula_mapper, special_chars_in_code_blocks,
-                                                    emoji_replacements, emoji_support)
+                                                    emoji_replacements, emoji_support, share_formula_glyphs,
+                                                    formula_precision, formula_files_location, formula_renderer,
+                                                    limits)
+    stats.end()
 
     if DEBUG:
         print("\n------------\nHtml content (with properly rendered formulas):\n------------\n\n", html_content)
@@ -913,24 +1826,21 @@ def main(md_origin, origin_type="file", website_root=None, destination=None, ima
         footer = ""
 
     # ensure we have the css and the code navigation banner where we want it to be (anyone knows what this is for?):
-    with open_local("github-css.min.css", "r") as from_f:
-        github_min_css = from_f.read()
-        if core_converter in ("OFFLINE+", "OFFLINE"):
-            # add syntax highlighting css if we use OFFLINE or OFFLINE+ for conversion:
-            from pygments.formatters import html as pygments_html
-            github_min_css += pygments_html.HtmlFormatter().get_style_defs('.highlight') \
-                .replace("\n", "").replace(";", " !important;").replace(" }", " !important }")
-        if soft_wrap_in_code_boxes:
-            # add css to make code boxes soft wrap:
-            github_min_css += CSS_TO_MAKE_CODE_BOXES_WRAP.replace("\n", "").replace("    ", "").replace(": ", ":")
+    stats.begin("css")
+    github_min_css = make_github_css(core_converter in ("OFFLINE+", "OFFLINE"), bool(soft_wrap_in_code_boxes),
+                                     not enable_css_saving)
     if enable_css_saving:
         with open(os.path.join(abs_css_paths, "github-css.css"), "w") as to_f:
             to_f.write(github_min_css)
         with open_local("code-navigation-banner-illo.svg", "r") as from_f:
             with open(os.path.join(abs_css_paths, "code-navigation-banner-illo.svg"), "w") as to_f:
                 to_f.write(from_f.read())
+    stats.end()
 
     # fill everything into our template, to link the html to the .css-file etc.:
+    stats.begin("template")
+    if extra_css:
+        local_files_read.append(extra_css)
     with open_local("prototype.html", "r") as f:
         # get an id for the page we create:
         possible_id_for_essay = (
@@ -948,11 +1858,12 @@ def main(md_origin, origin_type="file", website_root=None, destination=None, ima
             extra_css=((open(extra_css, "r").read() if extra_css else "")
                        + (("<!-- ~~~~github-flavored css start~~~~ --><style>" + github_min_css
                            + "</style> <!-- ~~~~github-flavored css end~~~~ -->") if not enable_css_saving else "")),
-            id='id="article-' + (possible_id_for_essay if possible_id_for_essay else "") + '"'
+            id='id="user-content-article-' + (possible_id_for_essay if possible_id_for_essay else "") + '"'
         )
 
     if not enable_css_saving:  # <- do not link to css if we don't want to save it:
         html_rendered = "\n".join(html_rendered.split("\n")[2:])
+    stats.end()
 
     if DEBUG:
         print("\n------------\nHtml rendered:\n------------\n\n", html_rendered)
@@ -964,229 +1875,350 @@ def main(md_origin, origin_type="file", website_root=None, destination=None, ima
     # ]
 
     # ensure we have all the images in the images path:
+    stats.begin("images")
     if enable_image_downloading:
-        hashes_to_images = dict()
-        saved_image_names = set(  # <-- defines which images we already have within our image directory
-            image_name for image_name in os.listdir(abs_image_paths)
-            if os.path.isfile(os.path.join(abs_image_paths, image_name))
-        )
-        html_soup = BeautifulSoup(html_rendered, 'html.parser')
-        find_fitting_hash_function(len(saved_image_names) + len(html_soup.find_all("img")))
-        for image_name in saved_image_names:
-            hashes_to_images[hash_image(
-                Image.open(os.path.join(abs_image_paths, image_name))
-                if not image_name.endswith(".svg")
-                else open(os.path.join(abs_image_paths, image_name), "rb").read()
-            )] = image_name
-        if DEBUG:
-            print("already existent images:", saved_image_names)
-
-        for img_soup_representation in html_soup.find_all("img"):
-            # ^Iterate over all images referenced in the markdown file
-            image_src = original_markdown_image_src = img_soup_representation.get("src")
-            if image_src == "":
-                continue  # <-- In case some images with no source where injected for some reason
-            if img_soup_representation.has_attr("data-canonical-src"):
-                # work around for GitHub's image caching, which results in absurdly long image names.
-                save_image_as = img_soup_representation.get("data-canonical-src")
-            else:
-                save_image_as = image_src
-            if DEBUG:
-                print("new image_src:", save_image_as)
-            save_image_as = save_image_as.split("?")[0]  # <-- remove the extra url parts
-            save_image_as = re.split("[/\\\]", save_image_as)[-1]  # <--  take only the last element of the path
-            save_image_as = save_image_as.rsplit(".", 1)[0]  # <-- remove the extension
-            save_image_as = re.sub(r'(?u)[^-\w.]', '', save_image_as)  # <-- remove disallowed characters
+        with lock_of_image_directory(abs_image_paths):  # <- (see lock_of_image_directory())
+            hashes_to_images = dict()
+            data_uris_of_saved_images = dict()  # <-- so every image that is inlined more than once is only read once
+            saved_image_names = set(  # <-- defines which images we already have within our image directory
+                image_name for image_name in os.listdir(abs_image_paths)
+                if os.path.isfile(os.path.join(abs_image_paths, image_name))
+            )
+            html_soup = BeautifulSoup(html_rendered, 'html.parser')
+            hash_function = find_fitting_hash_function(len(saved_image_names) + len(html_soup.find_all("img")))
+            stats.begin("hashing")
+            for image_name in saved_image_names:
+                hash_of_saved_image = hash_saved_image(os.path.join(abs_image_paths, image_name), hash_function)
+                hashes_to_images[hash_of_saved_image] = image_name
+            stats.end()
             if DEBUG:
-                print("-> original_save_image_s:", save_image_as)
-            if image_src.startswith("./"):
-                image_src = image_src[2:]
-
-            # actually get the image:
-
-            load_from_web = False
-            if image_src.startswith("https://") or image_src.startswith("http://"):
-                # it is clearly an absolute url:
-                load_from_web = True
-            else:
-                if origin_type == "string":
-                    # This is a security risk since web content might get one to embed local images from one's disk
-                    # into one's website when automatically cloning .md-files found online.
-                    input("""press enter if you are sure you trust that string. Remove this line if this is always
-    the case when inputting strings.""")
-
-                if origin_type in ("repo", "web"):
-                    # create website domain name and specific path from md_origin depending on whether we pull from
-                    # a repo or the web:
-                    if origin_type == "repo":
-                        user_name, repo_name, branch_name, *path = md_origin.split("/")
-                        url_root = (
-                                "https://github.com/" + user_name
-                                + "/" + repo_name
-                                + "/raw/" + branch_name
-                        )
-                        url_full = url_root + "/" + "/".join(path[:-1]) + "/"
-                    else:  # origin_type == "web":
-                        url_root = "/".join(md_origin.split("/")[:3])
-                        url_full = md_origin.rsplit("/", 1)[0] + "/"
-                    # Create full web image path depending on weather we have an absolute relative link or just a
-                    # regular relative link:
-                    if image_src.startswith("/"):
-                        image_src = url_root + image_src
-                    else:
-                        image_src = url_full + image_src
-                    load_from_web = True
-
-                elif origin_type in ("file", "string"):
-                    # get an absolute path to the image in case the image path is relative to the file location:
-                    if not os.path.isabs(image_src):
-                        # get the current directory (for relative file paths) depending on the origin_type
-                        location = os.getcwd()
-                        if origin_type == "file" and os.sep in md_origin:
-                            location = md_origin.rsplit(os.sep, 1)[0]
-                            if not os.path.abspath(location):
-                                location = os.path.join(os.getcwd(), location)
-                        image_src = os.path.join(location, image_src.replace("/", os.sep))
-                    load_from_web = False
-
-            # load with a method appropriate for the type of source
-            if load_from_web:
-                try:
-                    img_object = Image.open(BytesIO(requests.get(image_src).content))
-                except (OSError, PIL.UnidentifiedImageError):
-                    img_object = requests.get(image_src).content
-            else:
-                try:
-                    img_object = Image.open(image_src)
-                except (OSError, PIL.UnidentifiedImageError):
-                    img_object = open(image_src, "rb").read()
+                print("already existent images:", saved_image_names)
 
-            # Utility to create a path from an image name:
+            # Utility to create a path (or a data-URI, if the image should be inlined) from an image name:
             def image_name_to_image_src(img_name):
+                if max_size_of_inlined_images:
+                    if img_name not in data_uris_of_saved_images:
+                        img_path = os.path.join(abs_image_paths, img_name)
+                        data_uris_of_saved_images[img_name] = (
+                            file_to_data_uri(img_path) if os.path.getsize(img_path) <= max_size_of_inlined_images
+                            else None
+                        )
+                    if data_uris_of_saved_images[img_name]:
+                        return data_uris_of_saved_images[img_name]
                 return ("/" if website_root != "." else "") + image_paths + "/" + img_name
 
-            # save the image:
-            try:  # determine extension:
-                extension = "." + img_object.format.lower()
-            except AttributeError:
-                extension = ".svg"
-            # ensure we use no image name twice & finally save the image:
-            save_image_as = make_unused_name(save_image_as + extension, "", saved_image_names, hashes_to_images,
-                                             hash_image(img_object))  # <-- file name to save as
-            if DEBUG:
-                print("-> save_image_as:", save_image_as)
-                print("")
-            cached_image_path = os.path.join(abs_image_paths, save_image_as)  # <-- path where we save it
-            location_of_full_sized_image = image_name_to_image_src(save_image_as)  # <-how we call that path in the html
-            if extension != ".svg":
-                # if extension == ".gif":
-                #     print(cached_image_path)
-                img_object.save(cached_image_path, save_all=(extension == ".gif"))
-            else:
-                with open(cached_image_path, "wb") as img_out_file:
-                    img_out_file.write(img_object)
+            custom_emojis_for_sprite_sheet = list()  # <-- (img_soup_representation, hash of image, image)-tuples
+
+            # start downloading all images from the web at the same time, rather than one after the other:
+            image_downloads = dict()  # <-- image urls mapped to futures of their content
+            download_executor = concurrent.futures.ThreadPoolExecutor(max_workers=IMAGE_DOWNLOAD_WORKERS)
+            for img_soup_representation in html_soup.find_all("img"):
+                if img_soup_representation.get("src") and "gh-md-to-html-formula" not in img_soup_representation.get(
+                        "class", []):
+                    image_url = web_url_of_image(img_soup_representation["src"], origin_type, md_origin)
+                    if image_url is not None and image_url not in image_downloads:
+                        image_downloads[image_url] = download_executor.submit(download_image, image_url, limits)
+            download_executor.shutdown(wait=False)
+
+            for img_soup_representation in html_soup.find_all("img"):
+                # ^Iterate over all images referenced in the markdown file
+                image_src = original_markdown_image_src = img_soup_representation.get("src")
+                limits.time_left("saving the images")
+                if image_src == "":
+                    continue  # <-- In case some images with no source where injected for some reason
+                if (img_soup_representation.has_attr("class")
+                        and "gh-md-to-html-formula" in img_soup_representation["class"]):
+                    continue  # <-- Formulas saved with --save-formulas-as-files are already where they belong
+                if img_soup_representation.has_attr("data-canonical-src"):
+                    # work around for GitHub's image caching, which results in absurdly long image names.
+                    save_image_as = img_soup_representation.get("data-canonical-src")
+                else:
+                    save_image_as = image_src
+                if DEBUG:
+                    print("new image_src:", save_image_as)
+                save_image_as = save_image_as.split("?")[0]  # <-- remove the extra url parts
+                save_image_as = re.split("[/\\\]", save_image_as)[-1]  # <--  take only the last element of the path
+                save_image_as = save_image_as.rsplit(".", 1)[0]  # <-- remove the extension
+                save_image_as = re.sub(r'(?u)[^-\w.]', '', save_image_as)  # <-- remove disallowed characters
+                if DEBUG:
+                    print("-> original_save_image_s:", save_image_as)
+                if image_src.startswith("./"):
+                    image_src = image_src[2:]
+
+                # actually get the image:
+
+                image_url = web_url_of_image(image_src, origin_type, md_origin)
+                load_from_web = image_url is not None
+                if load_from_web:
+                    image_src = image_url
+                else:
+                    if not local_images:
+                        continue  # <- (images from the disk are left as they are, see --local-images)
+                    if origin_type == "string":
+                        # This is a security risk since web content might get one to embed local images from one's disk
+                        # into one's website when automatically cloning .md-files found online.
+                        input("""press enter if you are sure you trust that string. Remove this line if this is always
+    the case when inputting strings.""")
 
-            # Check if hashing worked correctly:
-            if DEBUG_HASHES:
-                import time
-                t = time.time()
+                    if origin_type in ("file", "string"):
+                        # get an absolute path to the image in case the image path is relative to the file location:
+                        if not os.path.isabs(image_src):
+                            # get the current directory (for relative file paths) depending on the origin_type
+                            location = os.getcwd()
+                            if origin_type == "file" and os.sep in md_origin:
+                                location = md_origin.rsplit(os.sep, 1)[0]
+                                if not os.path.abspath(location):
+                                    location = os.path.join(os.getcwd(), location)
+                            image_src = os.path.join(location, image_src.replace("/", os.sep))
+                        load_from_web = False
+
+                # load with a method appropriate for the type of source
+                stats.begin("fetching")
+                if load_from_web:
+                    try:
+                        image_content = (
+                            image_downloads[image_src].result(
+                                timeout=limits.time_left("downloading the image " + image_src))
+                            if image_src in image_downloads else download_image(image_src, limits)
+                        )
+                    except StageTimeoutError:
+                        raise  # <- (the download itself took too long)
+                    except concurrent.futures.TimeoutError:  # <- (waiting for the download took too long)
+                        raise StageTimeoutError("downloading the image " + image_src, limits.timeout, "--timeout")
+                    try:
+                        img_object = Image.open(BytesIO(image_content))
+                    except (OSError, PIL.UnidentifiedImageError):
+                        img_object = image_content
+                else:
+                    local_files_read.append(image_src)
+                    try:
+                        img_object = Image.open(image_src)
+                    except (OSError, PIL.UnidentifiedImageError):
+                        img_object = open(image_src, "rb").read()
+                stats.end()
+
+                # save the image:
+                try:  # determine extension:
+                    extension = "." + img_object.format.lower()
+                except AttributeError:
+                    extension = ".svg"
+                # custom emojis that go into a sprite sheet are saved together once we know all of them:
+                if (emoji_sprite_sheet and extension not in (".svg", ".gif")
+                        and img_soup_representation.has_attr("is_emoji")
+                        and img_soup_representation["is_emoji"] == "true"):
+                    with stats.stage("hashing"):
+                        hash_of_emoji = hash_image(img_object, hash_function=hash_function)
+                    custom_emojis_for_sprite_sheet.append((img_soup_representation, hash_of_emoji, img_object))
+                    continue
+                # ensure we use no image name twice & finally save the image:
+                with stats.stage("hashing"):
+                    hash_of_image = hash_image(img_object, hash_function=hash_function)
+                save_image_as = make_unused_name(  # <-- file name to save as
+                    save_image_as + extension, "", saved_image_names, hashes_to_images, hash_of_image
+                )
+                if DEBUG:
+                    print("-> save_image_as:", save_image_as)
+                    print("")
+                cached_image_path = os.path.join(abs_image_paths, save_image_as)  # <-- path where we save it
                 if extension != ".svg":
-                    hash1 = hash_image(Image.open(cached_image_path), return_unhashed=True)
+                    # if extension == ".gif":
+                    #     print(cached_image_path)
+                    img_object.save(cached_image_path, save_all=(extension == ".gif"))
                 else:
-                    hash1 = hash_image(open(cached_image_path, "rb").read(), return_unhashed=True)
-                hash2 = hash_image(img_object, return_unhashed=True)
-                if hash1 != hash2:
-                    warnings.warn(
-                        "image " + cached_image_path + " hashed incorrectly (not dramatic, but you cans till raise an\
+                    with open(cached_image_path, "wb") as img_out_file:
+                        img_out_file.write(img_object)
+                # how we call that path in the html:
+                location_of_full_sized_image = image_name_to_image_src(save_image_as)
+
+                # Check if hashing worked correctly:
+                if DEBUG_HASHES:
+                    import time
+                    t = time.time()
+                    if extension != ".svg":
+                        hash1 = hash_image(Image.open(cached_image_path), return_unhashed=True)
+                    else:
+                        hash1 = hash_image(open(cached_image_path, "rb").read(), return_unhashed=True)
+                    hash2 = hash_image(img_object, return_unhashed=True)
+                    if hash1 != hash2:
+                        warnings.warn(
+                            "image " + cached_image_path + " hashed incorrectly (not dramatic, but you cans till raise an\
                         issue for this)."
-                        + (("hash difference:\n" + "".join(difflib.ndiff(hash1, hash2))) if imported_difflib else "")
-                        + "\n"
+                            + (("hash difference:\n" + "".join(difflib.ndiff(hash1, hash2)))
+                               if imported_difflib else "")
+                            + "\n"
+                        )
+                    print("time to compare hashes:", time.time() - t)
+
+                # Open the final image and do compression, if it was specified to do so:
+                height = None
+                displayed_size = img_object.size if extension != ".svg" else None
+                if compression_information and extension not in (".svg", ".gif"):
+                    stats.begin("compression")
+                    full_image = Image.open(cached_image_path)
+                    # Determine the images' width if any is specified:
+                    width = (
+                        int(img_soup_representation["width"].strip().replace("px", ""))
+                        if img_soup_representation.has_attr("width") and img_soup_representation["width"].endswith("px")
+                        else None
                     )
-                print("time to compare hashes:", time.time() - t)
-
-            # Open the final image and do compression, if it was specified to do so:
-            height = None
-            if compression_information and extension not in (".svg", ".gif"):
-                full_image = Image.open(cached_image_path)
-                # Determine the images' width if any is specified:
-                width = (
-                    int(img_soup_representation["width"].strip().replace("px", ""))
-                    if img_soup_representation.has_attr("width") and img_soup_representation["width"].endswith("px")
-                    else None
-                )
-                height = (
-                    int(img_soup_representation["height"].strip().replace("px", ""))
-                    if img_soup_representation.has_attr("height") and img_soup_representation["height"].endswith("px")
-                    else None
-                )
-                if img_soup_representation.has_attr("is_emoji") and img_soup_representation["is_emoji"] == "true":
-                    height = 128
-                    width = 128
-                if height and not width:
-                    width = math_module.ceil(height * full_image.width / full_image.height)
-                # If no size is specified and srcset is set, generate a set of resolutions:
-                if compression_information["srcset"] and not width:
-                    srcset = compression_information["srcset"]
-                    srcset.sort()
-                    srcset = [x for x in srcset if x < full_image.width]
-                    srcset.append(full_image.width)
-                    # Create all the compressed images and a srcset-attribute for them:
-                    srcset_attribute = str()
-                    for size in srcset:
-                        srcset_attribute += image_name_to_image_src(compress_image(
+                    height = (
+                        int(img_soup_representation["height"].strip().replace("px", ""))
+                        if img_soup_representation.has_attr("height")
+                        and img_soup_representation["height"].endswith("px")
+                        else None
+                    )
+                    if img_soup_representation.has_attr("is_emoji") and img_soup_representation["is_emoji"] == "true":
+                        height = 128
+                        width = 128
+                    if height and not width:
+                        width = math_module.ceil(height * full_image.width / full_image.height)
+                    # Create a placeholder to show whilst loading, or reuse the one we stored next to this image before:
+                    if compression_information["placeholder"] and not (
+                            img_soup_representation.has_attr("is_emoji")
+                            and img_soup_representation["is_emoji"] == "true"):
+                        # (named after everything it depends on, so a stored one is only reused if it still fits)
+                        placeholder_size = compression_information["placeholder"]
+                        bg_color = compression_information["bg-color"]
+                        placeholder_name = save_image_as.rsplit(".", 1)[0] + ".placeholder-%dpx-q%d-%02x%02x%02x.jpeg" \
+                            % ((placeholder_size, PLACEHOLDER_QUALITY) + tuple(bg_color))
+                        placeholder_path = os.path.join(abs_image_paths, placeholder_name)
+                        if placeholder_name in saved_image_names and os.path.isfile(placeholder_path):
+                            with open(placeholder_path, "rb") as placeholder_file:
+                                placeholder = placeholder_file.read()
+                        else:
+                            placeholder = make_image_placeholder(full_image, placeholder_size, bg_color,
+                                                                 PLACEHOLDER_QUALITY)
+                            with open(placeholder_path, "wb") as placeholder_file:
+                                placeholder_file.write(placeholder)
+                            saved_image_names.add(placeholder_name)
+                        add_to_style_attribute(img_soup_representation, "background-image",
+                                               "url(data:image/jpeg;base64,"
+                                               + str(base64.b64encode(placeholder), encoding="ascii") + ")")
+                        add_to_style_attribute(img_soup_representation, "background-size", "cover")
+                    # If no size is specified and srcset is set, generate a set of resolutions:
+                    if compression_information["srcset"] and not width:
+                        srcset = compression_information["srcset"]
+                        srcset.sort()
+                        srcset = [x for x in srcset if x < full_image.width]
+                        srcset.append(full_image.width)
+                        # Create all the compressed images and a srcset-attribute for them:
+                        srcset_attribute = str()
+                        for size in srcset:
+                            srcset_attribute += image_name_to_image_src(compress_image(
+                                full_image,
+                                width=size,
+                                bg_color=compression_information["bg-color"],
+                                quality=compression_information["quality"],
+                                progressive=compression_information["progressive"],
+                                base_file_name=save_image_as,
+                                file_name_addition="." + str(size) + "px",
+                                already_used_filenames=saved_image_names,
+                                abs_image_paths=abs_image_paths,
+                                hashes_to_images=hashes_to_images,
+                                hash_function=hash_function,
+                            )) + " " + str(size) + "w, "
+                        img_soup_representation["srcset"] = srcset_attribute  # .rsplit(" ", 2)[0] + " 3000w"
+                        displayed_size = full_image.size
+                    # If width is specified, or we just don't plan to use srcset, create only one image:
+                    else:
+                        if not width:
+                            width = full_image.width
+                        save_image_as = compress_image(
                             full_image,
-                            width=size,
+                            width=width,
                             bg_color=compression_information["bg-color"],
                             quality=compression_information["quality"],
                             progressive=compression_information["progressive"],
                             base_file_name=save_image_as,
-                            file_name_addition="." + str(size) + "px",
+                            file_name_addition=".min",
                             already_used_filenames=saved_image_names,
                             abs_image_paths=abs_image_paths,
                             hashes_to_images=hashes_to_images,
-                        )) + " " + str(size) + "w, "
-                    img_soup_representation["srcset"] = srcset_attribute  # .rsplit(" ", 2)[0] + " 3000w"
-                # If width is specified, or we just don't plan to use srcset, create only one image:
-                else:
-                    if not width:
-                        width = full_image.width
-                    save_image_as = compress_image(
-                        full_image,
-                        width=width,
-                        bg_color=compression_information["bg-color"],
-                        quality=compression_information["quality"],
-                        progressive=compression_information["progressive"],
-                        base_file_name=save_image_as,
-                        file_name_addition=".min",
-                        already_used_filenames=saved_image_names,
-                        abs_image_paths=abs_image_paths,
-                        hashes_to_images=hashes_to_images,
-                    )
-            # Calculate the images max height, and add it as an attribute if it can be determined:
-            if extension != ".svg":
-                if not height:
-                    height = img_object.height
-                max_height_css_information = "max-height: " + str(height) + "px;"
-                if img_soup_representation.has_attr("style"):
-                    if ";max-height:" not in ";" + img_soup_representation["style"].replace(" ", ""):
-                        img_soup_representation["style"] = (
-                            img_soup_representation["style"].strip().rstrip(";") + "; " + max_height_css_information
+                            hash_function=hash_function,
                         )
+                        displayed_size = (width, int(full_image.height * width / full_image.width))
+                    stats.end()
+                # Calculate the images max height, and add it as an attribute if it can be determined:
+                if extension != ".svg":
+                    if not height:
+                        height = img_object.height
+                    add_to_style_attribute(img_soup_representation, "max-height", str(height) + "px")
+                # Add the dimensions the image is displayed with to avoid layout shifts whilst it loads:
+                if (optimize_image_loading and displayed_size
+                        and not (img_soup_representation.has_attr("is_emoji")
+                                 and img_soup_representation["is_emoji"] == "true")
+                        and not img_soup_representation.has_attr("width")
+                        and not img_soup_representation.has_attr("height")):
+                    img_soup_representation["width"] = str(displayed_size[0])
+                    img_soup_representation["height"] = str(displayed_size[1])
+                    add_to_style_attribute(img_soup_representation, "height", "auto")
+                # Change src/href tags to ensure we reference the right image:
+                new_image_src = image_name_to_image_src(save_image_as)
+                img_soup_representation["src"] = new_image_src
+                if not location_of_full_sized_image.startswith("data:"):
+                    img_soup_representation["data-canonical-src"] = location_of_full_sized_image
+                    if img_soup_representation.parent.name == "a"\
+                            and img_soup_representation.parent["href"] == original_markdown_image_src:
+                        img_soup_representation.parent["href"] = location_of_full_sized_image
                 else:
-                    img_soup_representation["style"] = max_height_css_information
-            # Change src/href tags to ensure we reference the right image:
-            new_image_src = image_name_to_image_src(save_image_as)
-            img_soup_representation["src"] = new_image_src
-            img_soup_representation["data-canonical-src"] = location_of_full_sized_image
-            if img_soup_representation.parent.name == "a"\
-                    and img_soup_representation.parent["href"] == original_markdown_image_src:
-                img_soup_representation.parent["href"] = location_of_full_sized_image
-
-        html_rendered = html_soup.__str__()
+                    # don't repeat the inlined image in the link around it and in data-canonical-src:
+                    img_soup_representation["data-canonical-src"] = original_markdown_image_src
+                    if img_soup_representation.parent.name == "a"\
+                            and img_soup_representation.parent["href"] == original_markdown_image_src:
+                        img_soup_representation.parent.unwrap()
+
+            # Pack all custom emojis into one sprite sheet and replace them with references to it:
+            if custom_emojis_for_sprite_sheet:
+                emoji_images_by_hash = dict()
+                for _, hash_of_emoji, emoji_image in custom_emojis_for_sprite_sheet:
+                    emoji_images_by_hash.setdefault(hash_of_emoji, emoji_image)
+                sprite_sheet, columns, rows = make_emoji_sprite_sheet(list(emoji_images_by_hash.values()),
+                                                                      compression_information)
+                sprite_sheet_extension = ".jpeg" if compression_information else ".png"
+                sprite_sheet_name = make_unused_name(
+                    "emoji-sprite-sheet" + sprite_sheet_extension, "", saved_image_names, hashes_to_images,
+                    hash_image(sprite_sheet, hash_function=hash_function)
+                )
+                if compression_information:
+                    sprite_sheet.save(os.path.join(abs_image_paths, sprite_sheet_name), 'JPEG',
+                                      quality=compression_information["quality"], optimize=True,
+                                      progressive=compression_information["progressive"])
+                else:
+                    sprite_sheet.save(os.path.join(abs_image_paths, sprite_sheet_name), 'PNG', optimize=True)
+                sprite_sheet_css = (
+                        ".gh-md-to-html-emoji { display: inline-block; width: 1em; height: 1em; "
+                        + "background-image: url(" + image_name_to_image_src(sprite_sheet_name) + "); "
+                        + "background-size: " + str(columns * 100) + "% " + str(rows * 100) + "%; }\n"
+                )
+                for position, hash_of_emoji in enumerate(emoji_images_by_hash):
+                    column, row = position % columns, position // columns
+                    sprite_sheet_css += (
+                            ".gh-md-to-html-emoji-" + str(position) + " { background-position: "
+                            + str(column * 100 / (columns - 1) if columns > 1 else 0) + "% "
+                            + str(row * 100 / (rows - 1) if rows > 1 else 0) + "%; }\n"
+                    )
+                sprite_sheet_positions = {hash_of_emoji: position for position, hash_of_emoji in enumerate(
+                    emoji_images_by_hash)}
+                for img_soup_representation, hash_of_emoji, _ in custom_emojis_for_sprite_sheet:
+                    emoji_soup_representation = html_soup.new_tag("span", attrs={
+                        "class": ("gh-md-to-html-emoji gh-md-to-html-emoji-"
+                                  + str(sprite_sheet_positions[hash_of_emoji])),
+                        "role": "img",
+                        "aria-label": img_soup_representation.get("alt", ""),
+                        "title": img_soup_representation.get("title", ""),
+                    })
+                    img_soup_representation.replace_with(emoji_soup_representation)
+                sprite_sheet_style_soup_representation = html_soup.new_tag("style")
+                sprite_sheet_style_soup_representation.string = sprite_sheet_css
+                (html_soup.find("article") or html_soup).insert(0, sprite_sheet_style_soup_representation)
+
+            if optimize_image_loading:
+                add_loading_hints_to_images(html_soup, eager_images)
+            html_rendered = html_soup.__str__()
 
-        if DEBUG:
-            print("dict of image hashes:", hashes_to_images)
-    else:
+            if DEBUG:
+                print("dict of image hashes:", hashes_to_images)
+    elif not html_is_final or optimize_image_loading:
         # if image caching is disabled, change image's `src` to their `data-canonical-src` to revert GitHub's caching.
         html_soup = BeautifulSoup(html_rendered, 'html.parser')
         for img_soup_representation in html_soup.find_all("img"):
@@ -1195,56 +2227,29 @@ def main(md_origin, origin_type="file", website_root=None, destination=None, ima
                         and img_soup_representation.parent["href"] == img_soup_representation["src"]):
                     img_soup_representation.parent["href"] = img_soup_representation["data-canonical-src"]
                 img_soup_representation["src"] = img_soup_representation["data-canonical-src"]
+        if optimize_image_loading:
+            add_loading_hints_to_images(html_soup, eager_images)
         html_rendered = html_soup.__str__()
+    stats.end()
 
     if DEBUG:
         print("\n------------\nHtml with image links:\n------------\n\n", html_rendered)
 
     # Add "user-content-" to anchors and internal links.
 
-    contains_file_internal_links = False
-    html_soup = BeautifulSoup(html_rendered, 'html.parser')
-    for element_soup_representation in html_soup.select("[id]"):
-        id_name = element_soup_representation.get("id")
-        if id_name and not id_name.startswith("user-content-"):
-            element_soup_representation["id"] = "user-content-" + id_name
-    for link_soup_representation in html_soup.find_all("a"):
-        # "user-content-"-ify the href-attributes
-        link_location = link_soup_representation.get("href")
-        if link_location and link_location.startswith("#") and not link_location.startswith("#user-content-"):
-            # ^ GitHub technically doesn't recognize the last point, but we derive from GitHub's behavior here.
-            link_location = "#user-content-" + link_location[1:]
-            if not (link_soup_representation.has_attr("class") and link_soup_representation["class"] == ["anchor"]):
-                contains_file_internal_links = True
-        link_soup_representation["href"] = link_location
-        # "user-content-"-ify the id-attribute; note that this has precedence over the name attributes.
-        link_id = link_soup_representation.get("id")
-        if link_id:
-            link_soup_representation["name"] = link_id
-            del link_id
-        # "user-content-"-ify the name-attributes
-        link_name = link_soup_representation.get("name")
-        if link_name and not link_name.startswith("user-content-"):
-            link_soup_representation["name"] = "user-content-" + link_name
-    html_rendered = html_soup.__str__()
-
-    # add correct id to all headings:
-    html_soup = BeautifulSoup(html_rendered, 'html.parser')
-    for h in ("h1", "h2", "h3", "h4", "h5"):
-        for header_soup_representation in html_soup.find_all(h):
-            if header_soup_representation.find('a'):
-                header_soup_representation['id'] = header_soup_representation.a['id']
-            # ToDo: Implement these nice anchor svg icons GitHub displays next to every heading
-    #       link_within_header = header_soup_representation.a
-    #       link_within_header.append(BeautifulSoup(GITHUB_LINK_ANCHOR, 'html.parser').find("svg"))
-    html_rendered = html_soup.__str__()
+    if html_is_final:
+        contains_file_internal_links = '<a href="#' in html_rendered
+    else:
+        with stats.stage("link fixups"):
+            html_rendered, contains_file_internal_links = add_user_content_prefixes(html_rendered)
 
     if DEBUG:
         print("\n------------\nHtml with fixed internal links:\n------------\n\n", html_rendered)
 
     # check whether html is valid if we have the necessary dependency installed.
     if imported_tidylib and validate_html:
-        _, errors = tidylib.tidy_document(html_rendered, options={'numeric-entities': 1})
+        with stats.stage("validation"):
+            _, errors = tidylib.tidy_document(html_rendered, options={'numeric-entities': 1})
         if errors:
             warnings.warn("The generated HTML is not entirely valid. This should not be an issue, but you ca still\n"
                           + "raise an issue on GitHub for it"
@@ -1252,17 +2257,23 @@ def main(md_origin, origin_type="file", website_root=None, destination=None, ima
                           + str(errors))
 
     # save html where we want it to be:
-    file_name_origin = md_origin.split("/")[-1].split(os.sep)[-1].rsplit(".", 1)[0]
     if "<name>" in output_name and origin_type == "string":
         raise Exception("You can't use <name> in your output name if you enter the input with the '-t string option'.")
     else:
         output_name = output_name.replace("<name>", file_name_origin)
     if output_name != "print":
-        with open(os.path.join(abs_destination, output_name), "w+") as f:
+        with stats.stage("writing"), open(os.path.join(abs_destination, output_name), "w+") as f:
             f.write(html_rendered)
+    if result_cache or dependency_manifest:
+        # the files the result needs (referenced by the html relative to the website root, or produced):
+        assets = [os.path.join(website_root, reference.lstrip("/")) for reference in find_assets_in_html(html_rendered)]
+        if output_name != "print":
+            assets.append(os.path.join(abs_destination, output_name))
 
     # save it as pdf if we want to do so:
     if output_pdf:
+        stats.begin("pdf")
+        limits.time_left("saving the pdf")
         try:
             import pdfkit
         except ImportError:
@@ -1274,7 +2285,7 @@ https://pypi.org/project/pdfkit/.""")
         for filter, attr in (((lambda tag: tag.has_attr("src")), "src"), ("link", "href")):
             for tag_with_link in html_soup_representation.find_all(filter):
                 link = tag_with_link[attr]
-                if "://" in link:
+                if "://" in link or link.startswith("data:"):
                     pass
                 else:
                     directory_to_link_to = abs_website_root if link.startswith("/") else abs_destination
@@ -1318,7 +2329,8 @@ https://pypi.org/project/pdfkit/.""")
             output_pdf = output_pdf.replace("<name>", file_name_origin)
 
         # check which version of wkhtmltopdf we have installed
-        version_str = str(subprocess.check_output(["wkhtmltopdf", "-V"]), encoding="UTF-8").strip()
+        version_str = str(limits.run(["wkhtmltopdf", "-V"], "checking the version of wkhtmltopdf")[1],
+                          encoding="UTF-8").strip()
         if version_str.startswith("wkhtmltopdf "):
             version_str = version_str.split(" ", 1)[1]
         version_number = [int(i) for i in version_str.split()[0].split(".")]
@@ -1344,13 +2356,11 @@ https://pypi.org/project/pdfkit/.""")
         # absolute_path_to_file_location/https://foo)
         with open(os.path.join(abs_destination, output_pdf + ".html"), "w+") as f:
             f.write(html_rendered)
-        try:
-            pdfkit.from_file(
-                os.path.join(abs_destination, output_pdf + ".html"),
-                os.path.join(destination, output_pdf),
-                options=dict() if DEBUG else options,
-            )
-        except OSError:
+        pdf_maker = pdfkit.PDFKit(os.path.join(abs_destination, output_pdf + ".html"), "file",
+                                  options=dict() if DEBUG else options)
+        returncode, _, _ = limits.run(pdf_maker.command(os.path.join(destination, output_pdf)),
+                                      "saving the pdf with wkhtmltopdf")
+        if returncode != 0:
             raise OSError(
 """\
 Saving the pdf faile failed because the saving location was unwriteable.
@@ -1363,11 +2373,170 @@ https://superuser.com/questions/599442/pdf-viewer-that-handles-live-updating-of-
 """
             )
         os.remove(os.path.join(abs_destination, output_pdf + ".html"))
+        if result_cache or dependency_manifest:
+            assets.append(os.path.join(destination, output_pdf))
+        stats.end()
+
+    if result_cache:
+        with stats.stage("result cache"):
+            result_cache.put(cache_key, html_rendered, assets, local_files_read)
+    if dependency_manifest:
+        with stats.stage("dependency manifest"):
+            dependency_manifest.record(md_content_as_read, options_given, local_files_read, assets)
 
     # return the result
     return html_rendered
 
 
+class Converter:
+    """Converts markdown documents to html with a fixed set of options, which are the arguments of main() except for
+    md_origin (plus chunk_workers and batch_size, see convert_documents()). Converting a document doesn't modify any
+    global state, and everything documents share (like the core converter, the OFFLINE converters' parsers and the
+    caches) can be used by several threads at once, so a single Converter can convert any number of documents, from
+    any number of threads at the same time, e.g.:
+
+        converter = gh_md_to_html.Converter(core_converter="OFFLINE", output_name="print")
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            html_contents = list(executor.map(converter.convert, ["a.md", "b.md"]))
+
+    All methods that convert documents take an optional ConversionStats, to which the time every stage of their
+    conversion took is added (see --profile).
+    """
+
+    def __init__(self, *args, chunk_workers=4, batch_size=64, **options):
+        if "stats" in options:
+            raise TypeError("stats is given to the methods that convert documents, not to Converter().")
+        inspect.signature(_conversion_steps).bind(None, *args, **options)  # <- fail early on unknown options
+        self.args = args
+        self.options = options
+        self.chunk_workers = chunk_workers
+        self.batch_size = batch_size
+
+    def _batch_limits(self) -> Limits:
+        """The Limits of converting the documents of a batch (the --timeout of every document can't limit a batch of
+        several documents, but all the other limits apply)."""
+        return Limits(self.options.get("connect_timeout"), self.options.get("read_timeout"),
+                      self.options.get("command_timeout"))
+
+    def convert(self, md_origin, stats: ConversionStats = None) -> str:
+        """Converts a single document, and returns the resulting html."""
+        return self.convert_many([md_origin], stats)[0]
+
+    def convert_many(self, md_origins, stats: ConversionStats = None) -> typing.List[str]:
+        """Converts several documents, and returns a list of the resulting html. Core converters that can convert
+        batches (see batch_core_converter()) are given the markdown of up to batch_size documents (or chunks of
+        documents) at once; other core converters convert one document after the other, with up to chunk_workers
+        chunks of a document at the same time."""
+        md_origins = list(md_origins)
+        results = list()
+        for start in range(0, len(md_origins), self.batch_size):
+            # (the documents of a batch are converted alternately, so each of them records its stats on its own:)
+            stats_per_document = [ConversionStats() if stats is not None else NO_STATS
+                                  for _ in md_origins[start:start + self.batch_size]]
+            conversions = [_conversion_steps(md_origin, *self.args, stats=document_stats, **self.options)
+                           for md_origin, document_stats in zip(md_origins[start:start + self.batch_size],
+                                                                stats_per_document)]
+            conversion_requests = [next(conversion) for conversion in conversions]
+
+            # convert the markdown of all documents at once if the core converter supports it, or one by one otherwise:
+            core_converter = conversion_requests[0][1]
+            if get_batch_interface(core_converter):
+                start_wall_time, start_cpu_time = time.perf_counter(), time.process_time()
+                html_chunks = iter(convert_batch_with_core_converter(
+                    [md_chunk for md_chunks, _, _ in conversion_requests for md_chunk in md_chunks],
+                    core_converter, self.batch_size, self._batch_limits()
+                ))
+                html_chunks_per_document = [[next(html_chunks) for _ in md_chunks]
+                                            for md_chunks, _, _ in conversion_requests]
+                # every document's share of the batch is proportional to its number of chunks:
+                number_of_chunks = sum(len(md_chunks) for md_chunks, _, _ in conversion_requests) or 1
+                for (md_chunks, _, _), document_stats in zip(conversion_requests, stats_per_document):
+                    document_stats.record("core conversion",
+                                          (time.perf_counter() - start_wall_time) * len(md_chunks) / number_of_chunks,
+                                          (time.process_time() - start_cpu_time) * len(md_chunks) / number_of_chunks)
+            else:
+                html_chunks_per_document = list()
+                for (md_chunks, _, convert_chunk), document_stats in zip(conversion_requests, stats_per_document):
+                    with document_stats.stage("core conversion"):
+                        if len(md_chunks) == 1:
+                            html_chunks_per_document.append([convert_chunk(md_chunks[0])])
+                        else:
+                            with concurrent.futures.ThreadPoolExecutor(max_workers=self.chunk_workers) as executor:
+                                html_chunks_per_document.append(list(executor.map(convert_chunk, md_chunks)))
+
+            # let every document finish its conversion:
+            for conversion, html_chunks, document_stats in zip(conversions, html_chunks_per_document,
+                                                               stats_per_document):
+                results.append(_finish_conversion(conversion, html_chunks))
+                if stats is not None:
+                    stats.add(document_stats)
+        return results
+
+    async def convert_async(self, md_origin, timeout=None, stats: ConversionStats = None) -> str:
+        """Converts a single document like convert(), but as a coroutine that doesn't block the event loop: the chunks
+        of the document (see --chunk-size) are converted concurrently with convert_with_core_converter_async(), and
+        everything else (including the download of the document's images, which happen at the same time) runs in the
+        event loop's default executor. If the conversion takes longer than timeout seconds (which defaults to the
+        timeout option), asyncio.TimeoutError is raised.
+        When the conversion is cancelled (or times out), commands used as core converters are killed right away,
+        whilst a step that is already running in the executor can't be interrupted and is left to finish in the
+        background; its result is discarded."""
+        if timeout is None and self.options.get("timeout"):
+            timeout = float(self.options["timeout"])
+        if timeout is not None:
+            return await asyncio.wait_for(self._convert_async(md_origin, stats), timeout)
+        return await self._convert_async(md_origin, stats)
+
+    async def _convert_async(self, md_origin, stats: ConversionStats = None) -> str:
+        loop = _get_running_loop()
+        limits = Limits(command_timeout=self.options.get("command_timeout"))
+        conversion = _conversion_steps(md_origin, *self.args, stats=stats, **self.options)
+        try:
+            md_chunks, core_converter, convert_chunk = await loop.run_in_executor(None, next, conversion)
+            (stats or NO_STATS).begin("core conversion")
+            if get_batch_interface(core_converter):
+                html_chunks = await loop.run_in_executor(None, convert_batch_with_core_converter, md_chunks,
+                                                         core_converter, self.batch_size, self._batch_limits())
+            else:
+                chunk_workers = asyncio.Semaphore(self.chunk_workers)
+
+                async def convert_chunk_async(md_chunk):
+                    async with chunk_workers:
+                        return await convert_with_core_converter_async(md_chunk, core_converter, convert_chunk, limits)
+                html_chunks = await asyncio.gather(*(convert_chunk_async(md_chunk) for md_chunk in md_chunks))
+            (stats or NO_STATS).end()
+            return await loop.run_in_executor(None, _finish_conversion, conversion, list(html_chunks))
+        finally:
+            try:
+                conversion.close()
+            except ValueError:
+                pass  # <- a step of the conversion is still running in the executor.
+
+
+def _finish_conversion(conversion, html_chunks: typing.List[str]) -> str:
+    """Sends the converted html chunks to a conversion started with _conversion_steps(), and returns its result."""
+    try:
+        conversion.send(html_chunks)
+    except StopIteration as finished_conversion:
+        return finished_conversion.value
+    raise RuntimeError("The conversion didn't finish after its html was sent to it.")
+
+
+def main(md_origin, *args, stats: ConversionStats = None, **options):
+    return Converter(*args, **options).convert(md_origin, stats)
+
+
+def convert_documents(md_origins, *args, stats: ConversionStats = None, **options) -> typing.List[str]:
+    """Converts several markdown documents with the same options (see main() and Converter), and returns a list of the
+    resulting html."""
+    return Converter(*args, **options).convert_many(md_origins, stats)
+
+
+async def convert_async(md_origin, *args, timeout=None, stats: ConversionStats = None, **options) -> str:
+    """Converts a markdown document like main(), as a coroutine (see Converter.convert_async())."""
+    return await Converter(*args, **options).convert_async(md_origin, timeout, stats)
+
+
 # Setting the doc string for the main function:
 
 
@@ -1382,6 +2551,7 @@ Use this function like the command line interface:
 def _test():
     import doctest
     doctest.testmod()
+    doctest.testmod(converter_registry)
 
 
 # Function to parse command line arguments and pass them to the main function:
@@ -1404,8 +2574,8 @@ def cmd_to_main():
             setattr(namespace, self.dest, " ".join(values))
 
 
-    parser.add_argument('md_origin', metavar='MD-origin',
-                        help='Where to find the markdown file that should be converted to html')
+    parser.add_argument('md_origin', metavar='MD-origin', nargs="+",
+                        help='Where to find the markdown file(s) that should be converted to html')
 
     parser.add_argument('-t', '--origin-type', choices=["file", "repo", "web", "string"], default="file",
                         help=textwrap.dedent("""\
@@ -1439,6 +2609,11 @@ def cmd_to_main():
     "images"-folder within the destination folder.
     Leave this option empty to completely disable image caching/downloading and leave all image links unmodified.""")
 
+    parser.add_argument('--local-images', default="true", help="""
+    If set to false, images that would be read from the disk (instead of being downloaded) are left unmodified, which
+    is meant for converting markdown one doesn't trust, since it could otherwise embed any image on one's disk. Only
+    relevant if images are downloaded (see --image-paths). Defaults to true.""")
+
     parser.add_argument('-c', '--css-paths', nargs="?", help="""
     Where to store the css needed for the html (as a path relative to the website root). Defaults to the
     "<WEBSITE_ROOT>/github-markdown-css"-folder.
@@ -1461,6 +2636,32 @@ def cmd_to_main():
     parser.add_argument('-m', '--math', default="true", help="""
     If set to True, which is the default, LaTeX-formulas using $formula$-notation will be rendered.""")
 
+    parser.add_argument('--formula-renderer', default="auto", choices=["auto", "latex", "online", "mathml"], help="""
+    How to render formulas. The options are:
+    * auto: The default. Renders formulas to svg using LaTeX and dvisvgm if they are installed, and using an online
+      service otherwise.
+    * latex: Renders formulas to svg using LaTeX and dvisvgm, and fails if these aren't installed.
+    * online: Renders formulas to svg using an online service.
+    * mathml: Converts formulas to MathML in-process, which browsers render natively. This is by far the fastest
+      option, needs neither LaTeX nor internet and produces smaller html, but requires the optional dependency
+      "latex2mathml" (`pip3 install gh-md-to-html[mathml_formulas]`) and ignores the other formula-related options.""")
+
+    parser.add_argument('--share-formula-glyphs', default="false", help="""
+    If set to true, the glyphs (letters, symbols etc.) used by the formulas are defined only once at the beginning of
+    the document, and each formula only references them, instead of every formula containing its own copy of every
+    glyph it uses. This can reduce the size of documents with many formulas by a lot.""")
+
+    parser.add_argument('--formula-precision', type=int, help="""
+    The number of decimal places to round the numbers in the formulas' glyph outlines to, which reduces the size of
+    documents with formulas. 2 is usually still indistinguishable from the full precision. Defaults to not rounding.""")
+
+    parser.add_argument('--save-formulas-as-files', default="false", help="""
+    If set to true, every distinct formula is saved as a svg file in --image-paths (named after a hash of its content)
+    and embedded as an image, instead of being inlined into the html. This way, browsers can cache formulas that are
+    used on several pages of a website, and pages with lots of repeated formulas get smaller. Formulas saved this way
+    are not re-colored by dark mode extensions like darkreader, and this option is ignored if --inline-images is used.
+    """)
+
     parser.add_argument('-f', '--footer', help="""
     An optional piece of html which will be included as a footer where the 'hosted with <3 by github'-footer in a gist
     usually is.
@@ -1496,7 +2697,8 @@ def cmd_to_main():
     and image downloading are applied; this defaults to using GitHub's REST API and can be
     * on Unix/ any system with a cmd: a command containing the string "{md}", where "{md}" will be replaced with an
       escaped version of the markdown file's content, and which returns the finished html. Please note that commands for
-      Unix-system won't work on Windows systems, and vice versa etc.
+      Unix-system won't work on Windows systems, and vice versa etc. Commands without "{md}" receive the markdown via
+      their stdin instead, which also works for very large documents. See also --persistent-core-converter.
     * when using gh-md-to-html in python: A callable which converts markdown to html, or a string as described above.
     * OFFLINE as a value to indicate that gh-md-to-html should imitate the output of their builtin md-to-html-converter
       using mistune. This requires the optional dependencies for "offline_conversion" to be satisfied, by using
@@ -1504,8 +2706,92 @@ def cmd_to_main():
     * OFFLINE+ behaves identical to OFFLINE, but it doesn't remove potentially harmful content like javascript and css
       like the GitHub REST API usually does. DO NOT USE THIS FEATURE unless you need a way to convert secure
       manually-checked markdown files without having all your inline js stripped away!
+    * cmarkgfm to convert using cmark-gfm, the C implementation of GitHub flavored markdown that GitHub itself uses.
+      This is by far the fastest core converter, and requires `pip3 install gh-md-to-html[cmarkgfm]`.
+    * markdown-it to convert using markdown-it-py, which requires `pip3 install gh-md-to-html[markdown_it]`.
+    * the name of any other converter registered with `converter_registry.register_core_converter()` when using
+      gh-md-to-html in python.
     """)
 
+    parser.add_argument('--persistent-core-converter', default="false", help="""
+    Only relevant if --core-converter is a command. If set to true, the command is started only once and then converts
+    all documents (and chunks of documents, see --chunk-size) that are converted by this process, instead of running it
+    once per document. For this, it needs to read one line of json per document from its stdin, like
+    {"markdown": "..."}, and answer each of them with a line of json on its stdout, like {"html": "..."} (or
+    {"error": "..."} if the conversion fails). The command is restarted if it crashes. Defaults to false.""")
+
+    parser.add_argument('--chunk-size', type=int, help="""
+    Splits documents with more than this many characters into chunks of roughly this size, which are converted by the
+    core converter concurrently and then joined back together. This makes converting very large documents a lot faster
+    (especially with GitHub's REST API), and since GitHub's responses are cached per chunk, only chunks that changed
+    since the last conversion need to be sent to GitHub again. Documents are only split between top-level blocks
+    (never within code blocks, lists, tables, block quotes or html blocks), and documents with footnotes aren't split
+    at all. Defaults to not splitting documents.""")
+
+    parser.add_argument('--incremental', default="false", help="""
+    Splits documents into their top-level blocks (or into chunks of --chunk-size characters, if it is given), and
+    remembers the html every block was converted to, so converting a document again after a small change only
+    converts the blocks that changed. This is only useful if the same process converts documents more than once (like
+    --watch does), and meant for the OFFLINE core converters, since every block is converted on its own (and would be
+    sent to GitHub separately by the default one). Blocks with formulas or raw html are converted every time.""")
+
+    parser.add_argument('--chunk-workers', type=int, default=4, help="""
+    How many chunks to convert at the same time when using --chunk-size. Defaults to 4.""")
+
+    parser.add_argument('--batch-size', type=int, default=64, help="""
+    Only relevant for core converters that convert lists of documents at once (see `batch_core_converter()` in the
+    python interface). How many documents (or chunks of documents, see --chunk-size) to pass to them at once when
+    converting several MD-origins. Defaults to 64.""")
+
+    parser.add_argument('--timeout', type=float, help="""
+    The longest time, in seconds, converting a single MD-origin may take (including downloading it and its images,
+    rendering its formulas and saving it as a pdf). Defaults to no limit.""")
+
+    parser.add_argument('--connect-timeout', type=float, help="""
+    How many seconds to wait for a web server (e.g. one serving an image or the MD-origin) to accept a connection.
+    Defaults to 10.""")
+
+    parser.add_argument('--read-timeout', type=float, help="""
+    How many seconds to wait for a web server to respond after connecting to it. Defaults to 60.""")
+
+    parser.add_argument('--command-timeout', type=float, help="""
+    How many seconds every command that is run (LaTeX and dvisvgm to render formulas, core converters given as
+    commands, and wkhtmltopdf) may take before it is killed, together with all processes it started. Defaults to
+    300.""")
+
+    parser.add_argument('--result-cache', nargs="?", const=result_cache.DEFAULT_CACHE_DIR, help="""
+    Caches the html every MD-origin is converted to in the given directory (or in ~/.cache/gh-md-to-html/results if
+    none is given), so converting the same markdown with the same options again returns the cached html right away
+    (as long as all images, css files etc. it needs still exist, and none of the local images and --extra-css files it
+    was converted from changed). Documents converted with a core converter that is a python callable are only cached
+    if it is a function defined at the top level of its module, or has a result_cache_id attribute. Can also be
+    enabled by setting the environment variable GH_MD_TO_HTML_RESULT_CACHE to a directory.""")
+
+    parser.add_argument('--no-cache', action="store_true", help="""
+    Converts every MD-origin even if its result is cached, and doesn't cache the results (overriding --result-cache and
+    GH_MD_TO_HTML_RESULT_CACHE).""")
+
+    parser.add_argument('--build', nargs="?", const=dependencies.DEFAULT_MANIFEST_DIR, help="""
+    Build mode: records which local files (the MD-origin, its local images and the --extra-css file), options and
+    outputs the conversion of every MD-origin depends on in a manifest in the given directory (or in
+    .gh-md-to-html-build if none is given), and skips converting MD-origins whose html file is up to date because none
+    of these changed since the last conversion and all outputs still exist, like make does. Has no effect if the html is
+    printed rather than saved.""")
+
+    parser.add_argument('--watch', action="store_true", help="""
+    Converts the MD-origins (which need to be files), and then keeps running and converts them again whenever they or
+    the local files they depend on (their local images and the --extra-css file) change, reporting how long every
+    conversion took. Uses build mode (see --build), in a temporary directory unless --build is given.""")
+
+    parser.add_argument('--profile', nargs="?", const="", help="""
+    Prints how much wall time, CPU time and memory every stage of the conversion (reading the MD-origins, the pre-pass
+    that finds formulas, emojis and headings, the table of contents, the core conversion, rendering formulas, fetching,
+    hashing and compressing images, fixing links, saving the css, html and pdf etc.) took, added up over all
+    MD-origins, to stderr once they are converted. If a file name is given, a cProfile profile of the entire run is
+    saved to it as well, which can be looked at with pstats or tools like snakeviz. Tracing the memory makes stages
+    that allocate a lot (like hashing images) noticeably slower than they are without --profile. The memory is only
+    measured on python 3.9 or newer.""")
+
     parser.add_argument('-e', '--compress-images', help="""
     Reduces load time of the generated html by saving all images referenced by the given markdown file as jpeg. This
     argument takes a piece of json data containing the following information; if it is not used, no compression is done:
@@ -1518,12 +2804,35 @@ def cmd_to_main():
       "[500, 800, 1200, 1500, 1800, 2000]". 
     * quality: a value from 0 to 100 describing at which quality the images should be saved (this is done after they are
       scaled down, if they are scaled down at all). Defaults to 90.
+    * placeholder: Embed a tiny blurred version of every image into the html as its background, so something is shown
+      whilst the actual image loads. Takes the placeholder's size in pixels or True, which serves as a shortcut for 16
+      (like 1 does). Defaults to False.
     If a specific size is specified for a specific image in the html, the image is always converted to the right size.
     If this argument is left empty, no compression is done at all. If this argument is set to True, all default values
     are used. If it is set to json data and values are omitted, the defaults are also used. If a dict is passed instead
     of json data (when using the tool as a python module), the dict is used as the result of the json data.
     """)
 
+    parser.add_argument('--inline-images', help="""
+    Embeds images into the generated html as base64-encoded data-URIs instead of referencing the files in
+    --image-paths, which saves the browser one request per image. Takes the maximum file size in bytes (after
+    compression, if --compress-images is used) of images to embed, or "all" to embed every image regardless of its size.
+    Images are still cached in --image-paths, and identical images are only encoded once.
+    If this option is used, the css is always embedded into the html as well (like with an empty -c), so using "all"
+    produces a single self-contained html file.""")
+
+    parser.add_argument('--optimize-image-loading', default="false", help="""
+    If set to true, every image gets `decoding="async"`, and every image except for the first few ones (see
+    --eager-images) gets `loading="lazy"`, so images further down the page are only loaded once they are about to be
+    scrolled into view. Images cached by gh-md-to-html additionally get `width` and `height` attributes with the size
+    they are displayed at (the size of the compressed version, if --compress-images is used), which avoids layout
+    shifts whilst they load. Images that already have a width or height specified in the markdown are left as they
+    are.""")
+
+    parser.add_argument('--eager-images', type=int, default=3, help="""
+    Only relevant with --optimize-image-loading. The number of images at the start of the document that are assumed
+    to be visible on the first screen, and are therefore not lazy-loaded. Defaults to 3.""")
+
     parser.add_argument('-a', '--toc', type=bool, default=False, help="""
     Enables the use of `[[_TOC_]]`, `{:toc}` and `[toc]` at the beginning of an otherwise empty line to create a
     table of content for the document. These syntax are supported by different markdown flavors, the most prominent
@@ -1550,6 +2859,12 @@ def cmd_to_main():
     * Note: In cases where an emoji shortcode isn't valid, a warning is risen;
       in case you want this to raise an error instead, you can catch the warning and do so manually yourself.""")
 
+    parser.add_argument('--emoji-sprite-sheet', default="false", help="""
+    Only relevant with --emoji-support 2. If set to true, all distinct custom emojis of the document are packed into a
+    single image (a sprite sheet) that is stored in --image-paths, and each custom emoji is displayed as the
+    corresponding section of it, so browsers only need to load one image for all of them. This is worth it for documents
+    that use lots of custom emojis. SVG and GIF emojis are not put into the sprite sheet.""")
+
     parser.add_argument('-b', '--box-width', help="""
     The text of the rendered file is always displayed in a box, like GitHub READMEs and issues are.
     By default, this box fills the entire screen (max-width: 100%%),
@@ -1615,16 +2930,46 @@ def cmd_to_main():
 
     # pass these inputs to the main-function, and raise an explanation should an error occur:
     try:
-        result = main(**vars(parser.parse_args()))
-        # print the result if we are in print-mode:
-        if parser.parse_args().output_name == "print":
-            sys.stdout.write(result)
+        arguments = vars(parser.parse_args())
+        profile = arguments.pop("profile")
+        if arguments.pop("watch"):
+            watch.watch(arguments.pop("md_origin"), **arguments)
+            return
+        if profile is not None:
+            import cProfile
+            import tracemalloc
+            stats = ConversionStats()
+            profiler = cProfile.Profile() if profile else None
+            tracemalloc.start()
+            start_wall_time, start_cpu_time = time.perf_counter(), time.process_time()
+            if profiler:
+                profiler.enable()
+            try:
+                results = convert_documents(arguments.pop("md_origin"), stats=stats, **arguments)
+            finally:
+                if profiler:
+                    profiler.disable()
+                    profiler.dump_stats(profile)
+                wall_time, cpu_time = time.perf_counter() - start_wall_time, time.process_time() - start_cpu_time
+                tracemalloc.stop()
+                print(stats, file=sys.stderr)
+                print("total: %.3f s wall time, %.3f s cpu time" % (wall_time, cpu_time)
+                      + ("; cProfile profile saved to " + profile if profiler else ""), file=sys.stderr)
+        else:
+            results = convert_documents(arguments.pop("md_origin"), **arguments)
+        # print the results if we are in print-mode:
+        if arguments["output_name"] == "print":
+            for result in results:
+                sys.stdout.write(result)
     except FileNotFoundError:
         traceback.print_exc()
         print("\nAn Error occurred because a file required for the conversion could not be found.\n\
 This is probably your input file, but it might also be an image from your disk referenced in your .md, or you might\n\
 have deleted autogenerated files during the conversion process.")
         exit(1)
+    except StageTimeoutError as e:
+        print("\nAn Error occurred because a stage of the conversion took too long:\n" + str(e), file=sys.stderr)
+        exit(1)
     except requests.exceptions.ConnectionError:
         traceback.print_exc()
         print("\nAn Error occurred because a web page could not be accessed. This is probably because you either have\n\
@@ -0,0 +1,65 @@
+"""This file contains the block cache of incremental conversion (--incremental), which remembers the html that every
+top-level block of markdown (or chunk of blocks, see --chunk-size) was converted to, so converting a document again
+after a small change (e.g. in a live preview) only needs to convert the blocks that changed.
+
+It is kept in memory, so it is only useful in processes that convert the same documents again and again, like watch
+mode, the conversion server or a Converter used by a preview. Blocks that contain formulas or raw html are never
+cached when converting with OFFLINE or OFFLINE+, since their html depends on the rest of the document (e.g. the numbers
+of the formulas and their shared glyphs)."""
+
+import hashlib
+import threading
+import collections
+
+MAX_SIZE = 64 * 1024 ** 2  # <- how many characters of html to keep at most
+
+
+class BlockCache:
+    """A least-recently-used cache of converted blocks, which can safely be shared between threads."""
+
+    def __init__(self, max_size=MAX_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self._blocks = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(md_block: str, *conversion_options):
+        """Returns the key of the given block, converted with the given (hashable) options, or None if they can't be
+        used as part of a key."""
+        try:
+            hash(conversion_options)
+        except TypeError:
+            return None
+        return (hashlib.sha1(md_block.encode("utf-8")).digest(),) + conversion_options
+
+    def get(self, key):
+        if key is None:
+            return None
+        with self._lock:
+            html_block = self._blocks.get(key)
+            if html_block is not None:
+                self._blocks.move_to_end(key)
+            return html_block
+
+    def put(self, key, html_block: str):
+        if key is None or len(html_block) > self.max_size:
+            return
+        with self._lock:
+            if key in self._blocks:
+                return
+            self._blocks[key] = html_block
+            self.size += len(html_block)
+            while self.size > self.max_size:
+                _, evicted_html_block = self._blocks.popitem(last=False)
+                self.size -= len(evicted_html_block)
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+            self.size = 0
+
+
+# The cache conversions use unless they are given another one:
+
+default_block_cache = BlockCache()
@@ -0,0 +1,113 @@
+"""This file contains the registry of named core converters that run within gh-md-to-html's own process, so they can be
+selected with --core-converter by their name (like OFFLINE), and the converters that are registered by default.
+
+Their dependencies are optional; a converter only fails if it is used without them being installed."""
+
+import re
+import html
+import threading
+import typing
+from .helpers import heading_name_to_id_value
+
+CORE_CONVERTERS = dict()
+
+
+def register_core_converter(name: str, converter: typing.Callable[[str], str] = None):
+    """Registers a function that converts markdown to html under the given name, so it can be used as a core converter
+    by passing the name to --core-converter. Can also be used as a decorator by omitting converter."""
+    if converter is None:
+        return lambda converter_to_register: register_core_converter(name, converter_to_register)
+    CORE_CONVERTERS[name] = converter
+    return converter
+
+
+def get_core_converter(name: str):
+    """Returns the converter registered under the given name, or None if there is none."""
+    return CORE_CONVERTERS.get(name)
+
+
+# Helpers:
+
+HEADING_PATTERN = re.compile(r"<h([1-6])>(.*?)</h\1>", re.DOTALL)
+
+
+def add_heading_anchors(html_content: str) -> str:
+    """Adds anchors to plain headings, like GitHub's REST API does, so headings can be linked to (e.g. from tables of
+    contents). Only headings without attributes are given one, so headings written as raw html with attributes (like
+    <h2 id="...">) are left as they are."""
+    def heading_with_anchor(match):
+        tag = "h" + match.group(1)
+        id_from_title = heading_name_to_id_value(match.group(2))
+        return (
+            "<" + tag + ">\n<a aria-hidden=\"true\" class=\"anchor\" href=\"#" + id_from_title + "\" id=\""
+            + id_from_title + "\"><span aria-hidden=\"true\" class=\"octicon octicon-link\"></span></a>"
+            + match.group(2) + "</" + tag + ">"
+        )
+    return HEADING_PATTERN.sub(heading_with_anchor, html_content)
+
+
+# The protocols links and images may not use, since they can run code (like in OFFLINE, see core_converter.py):
+HARMFUL_PROTOCOLS = ("javascript:", "vbscript:", "data:")
+
+TAG_PATTERN = re.compile(r"<[a-zA-Z][^>]*>")
+URL_ATTRIBUTE_PATTERN = re.compile(r"""(\s(?:href|src)\s*=\s*)(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""", re.IGNORECASE)
+
+
+def remove_harmful_links(html_content: str) -> str:
+    """Replaces every href and src (in the html generated from markdown as well as in raw html) that uses one of the
+    HARMFUL_PROTOCOLS with "#harmful-link", like OFFLINE does.
+
+    >>> remove_harmful_links('<a href="javascript:alert(1)">x</a> <img alt="i" src=\\'DATA:image/png;base64,xx\\'/>')
+    '<a href="#harmful-link">x</a> <img alt="i" src=\\'#harmful-link\\'/>'
+    >>> remove_harmful_links('<a href=" &#106;ava\\tscript:x">x</a> <a href=vbscript:x>y</a> <a href="https://a">z</a>')
+    '<a href="#harmful-link">x</a> <a href=#harmful-link>y</a> <a href="https://a">z</a>'
+    >>> remove_harmful_links("<p>Text like href='javascript:x' is left as it is.</p>")
+    "<p>Text like href='javascript:x' is left as it is.</p>"
+    """
+    def safe_attribute(match):
+        url = next(group for group in match.groups()[1:] if group is not None)
+        # (browsers decode character references and ignore whitespace and control characters in the protocol)
+        if not re.sub(r"[\x00-\x20]", "", html.unescape(url)).lower().startswith(HARMFUL_PROTOCOLS):
+            return match.group(0)
+        quote = '"' if match.group(2) is not None else "'" if match.group(3) is not None else ""
+        return match.group(1) + quote + "#harmful-link" + quote
+
+    return TAG_PATTERN.sub(lambda tag: URL_ATTRIBUTE_PATTERN.sub(safe_attribute, tag.group(0)), html_content)
+
+
+# The converters registered by default:
+
+@register_core_converter("cmarkgfm")
+def cmarkgfm_converter(md: str) -> str:
+    """Uses the C implementation of GitHub flavored markdown that GitHub itself uses, through its python binding."""
+    try:
+        import cmarkgfm
+        from cmarkgfm.cmark import Options
+    except ImportError:
+        raise ImportError("The core converter cmarkgfm requires the 'cmarkgfm' package!\n"
+                          + "\ttry running: pip3 install cmarkgfm")
+    # GitHub allows html (minus some dangerous tags, which the tagfilter extension takes care of, and links that can
+    # run code):
+    return add_heading_anchors(remove_harmful_links(
+        cmarkgfm.github_flavored_markdown_to_html(md, options=Options.CMARK_OPT_UNSAFE)))
+
+
+_markdown_it_instance = None
+_markdown_it_lock = threading.Lock()
+
+
+@register_core_converter("markdown-it")
+def markdown_it_converter(md: str) -> str:
+    """Uses markdown-it-py, a pure python implementation of CommonMark with GitHub's extensions."""
+    global _markdown_it_instance
+    with _markdown_it_lock:
+        if _markdown_it_instance is None:
+            try:
+                from markdown_it import MarkdownIt
+            except ImportError:
+                raise ImportError("The core converter markdown-it requires the 'markdown-it-py' package!\n"
+                                  + "\ttry running: pip3 install markdown-it-py linkify-it-py")
+            _markdown_it_instance = MarkdownIt("gfm-like")
+            if _markdown_it_instance.linkify is None:  # <- linkify-it-py is missing, so urls can't be linked.
+                _markdown_it_instance = MarkdownIt("gfm-like", {"linkify": False})
+    return add_heading_anchors(remove_harmful_links(_markdown_it_instance.render(md)))
@@ -0,0 +1,170 @@
+"""This file contains the helpers to run shell commands as core converters, including persistent core converters.
+
+A persistent core converter is a command that is started once and then converts any number of documents, which saves
+starting a new process (and, e.g., a new interpreter) for every document. It communicates using newline-delimited
+json: for every document, it receives a line `{"markdown": "..."}` on its stdin, and answers with a line
+`{"html": "..."}` (or `{"error": "..."}` if it can't convert the document) on its stdout. Anything it writes to stderr
+is passed through. If it crashes, it is restarted and the document is sent to it again; if it takes longer than its
+timeout to answer, it is killed (together with everything it started) and the conversion fails."""
+
+import atexit
+import json
+import shutil
+import subprocess
+import sys
+import threading
+from . import limits
+
+
+def how_to_run_commands() -> str:
+    """Returns which shell to run commands with on this platform, "cmd.exe" or "bash"."""
+    if sys.platform.startswith('win'):
+        return "cmd.exe"
+    elif shutil.which("bash") is not None:
+        return "bash"
+    raise Exception("You tried to use --core-converter (-o) with a custom command, but you are neither on"
+                    "Windows (cmd.exe), nor does your platform support bash.")
+
+
+def command_to_popen_arguments(command: str, how_to_run_this: str) -> dict:
+    """Returns the arguments for subprocess.Popen to run the given command with the given shell."""
+    if how_to_run_this == "cmd.exe":
+        return {"args": command, "shell": True}
+    return {"args": [shutil.which("bash"), "-c", command], "shell": False}
+
+
+class CoProcessConverter:
+    """Converts markdown to html using a persistent core converter (see above). Instances are callable with a markdown
+    string, like any other core converter, and can safely be shared between threads; every thread that converts at
+    the same time gets a process of its own, and idle processes are re-used."""
+
+    def __init__(self, command: str, max_restarts=2, timeout=limits.COMMAND_TIMEOUT):
+        self.command = command
+        self.max_restarts = max_restarts
+        self.timeout = timeout
+        self._idle_processes = list()
+        self._all_processes = list()
+        self._lock = threading.Lock()
+
+    def _start_process(self):
+        process = subprocess.Popen(
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            bufsize=0,
+            **command_to_popen_arguments(self.command, how_to_run_commands()),
+            **limits.NEW_PROCESS_GROUP_ARGUMENTS
+        )
+        with self._lock:
+            self._all_processes.append(process)
+        return process
+
+    def _stop_process(self, process):
+        with self._lock:
+            if process in self._all_processes:
+                self._all_processes.remove(process)
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            limits.kill_process_group(process)
+            process.wait()
+
+    def _request(self, process, markdown: str) -> dict:
+        """Sends markdown to the process and returns its answer, or None if the process died. Kills the process if it
+        doesn't answer within the timeout."""
+        timed_out = threading.Event()
+
+        def kill_process():
+            timed_out.set()
+            limits.kill_process_group(process)
+
+        killer = threading.Timer(self.timeout, kill_process) if self.timeout else None
+        if killer is not None:
+            killer.daemon = True
+            killer.start()
+        try:
+            process.stdin.write(json.dumps({"markdown": markdown}).encode("utf-8") + b"\n")
+            process.stdin.flush()
+            answer = process.stdout.readline()
+        except (BrokenPipeError, ConnectionResetError):
+            answer = None
+        finally:
+            if killer is not None:
+                killer.cancel()
+        if timed_out.is_set() and not answer:
+            self._stop_process(process)
+            raise limits.StageTimeoutError("converting with the persistent core converter", self.timeout,
+                                           "--command-timeout")
+        if not answer:
+            return None
+        try:
+            answer_object = json.loads(answer.decode("utf-8"))
+        except ValueError:
+            answer_object = None
+        if not isinstance(answer_object, dict) or ("html" not in answer_object and "error" not in answer_object):
+            self._stop_process(process)  # <- (its answers can't be relied on anymore)
+            raise Exception("The persistent core converter answered with something that isn't a line of json like "
+                            + '{"html": "..."} or {"error": "..."}:\n\n' + answer.decode("utf-8", "replace"))
+        return answer_object
+
+    def __call__(self, markdown: str) -> str:
+        with self._lock:
+            process = self._idle_processes.pop() if self._idle_processes else None
+        if process is not None and process.poll() is not None:
+            self._stop_process(process)  # <- (it died whilst it was idle)
+            process = None
+        if process is None:
+            process = self._start_process()
+
+        for restart in range(self.max_restarts + 1):
+            answer = self._request(process, markdown)
+            if answer is not None:
+                break
+            # the process crashed, so we replace it with a new one:
+            self._stop_process(process)
+            if restart == self.max_restarts:
+                raise Exception("The persistent core converter crashed (with exit code " + str(process.returncode)
+                                + ") " + str(self.max_restarts + 1) + " times in a row while converting the same "
+                                + "document, using your command:\n\n" + self.command)
+            process = self._start_process()
+
+        with self._lock:
+            self._idle_processes.append(process)
+        if "error" in answer:
+            raise Exception(answer["error"])
+        return answer["html"]
+
+    def close(self):
+        """Stops all processes."""
+        with self._lock:
+            processes = list(self._all_processes)
+            self._idle_processes.clear()
+        for process in processes:
+            self._stop_process(process)
+
+
+# One converter per command, so the processes are re-used across documents:
+
+_converters = dict()
+_converters_lock = threading.Lock()
+
+
+def get_coprocess_converter(command: str, timeout=limits.COMMAND_TIMEOUT) -> CoProcessConverter:
+    """Returns the persistent converter for the given command (and timeout), creating it when it is needed for the
+    first time."""
+    with _converters_lock:
+        if (command, timeout) not in _converters:
+            _converters[(command, timeout)] = CoProcessConverter(command, timeout=timeout)
+        return _converters[(command, timeout)]
+
+
+@atexit.register
+def close_all_coprocess_converters():
+    with _converters_lock:
+        converters = list(_converters.values())
+        _converters.clear()
+    for converter in converters:
+        converter.close()
@@ -2,6 +2,11 @@
 from pygments import highlight
 from pygments.lexers import get_lexer_by_name
 from pygments.formatters import html as pygments_html
+from pygments.util import ClassNotFound
+import collections
+import functools
+import hashlib
+import threading
 import re
 import bs4
 import html
@@ -22,55 +27,108 @@ from mistune.scanner import escape_html
 from mistune.block_parser import BlockParser
 
 
-# This is False, and True enables some things I personally find endearing to have in a converter:
-INTERNAL_USE = False
+# Syntax highlighting (looking up lexers is expensive, so lexers, the formatter and highlighted code blocks are cached):
 
+# How many highlighted code blocks to keep in memory (shared between all documents converted by this process); set this
+# to 0 to disable the cache:
+HIGHLIGHT_CACHE_SIZE = 1024
+
+HTML_FORMATTER = pygments_html.HtmlFormatter()
+
+_highlight_cache = collections.OrderedDict()
+_highlight_cache_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=256)  # <- (bounded, since the languages come from the markdown, which may be untrusted)
+def get_lexer(language: str):
+    """Returns the pygments lexer for the given language, or None if pygments doesn't know the language."""
+    try:
+        return get_lexer_by_name(language, stripall=True)
+    except ClassNotFound:
+        return None
+
+
+def highlight_code(code: str, language: str):
+    """Returns the given code as highlighted html, or None if pygments doesn't know the language."""
+    lexer = get_lexer(language)
+    if lexer is None:
+        return None
+    if not HIGHLIGHT_CACHE_SIZE:
+        return highlight(code, lexer, HTML_FORMATTER)
+
+    key = (language, hashlib.sha256(code.encode("utf-8")).digest())
+    with _highlight_cache_lock:
+        if key in _highlight_cache:
+            _highlight_cache.move_to_end(key)
+            return _highlight_cache[key]
+    highlighted = highlight(code, lexer, HTML_FORMATTER)
+    with _highlight_cache_lock:
+        _highlight_cache[key] = highlighted
+        while len(_highlight_cache) > HIGHLIGHT_CACHE_SIZE:
+            _highlight_cache.popitem(last=False)
+    return highlighted
+
+
+# GitHub flavored renderer (mainly for syntax highlighting and adding links around images); it emits the final ids and
+# internal links (prefixed with "user-content-" like GitHub does), so they don't need to be fixed afterwards:
+
+def user_content_url(url: str) -> str:
+    if url.startswith("#") and not url.startswith("#user-content-"):
+        return "#user-content-" + url[1:]
+    return url
 
-# GitHub flavored renderer (mainly for syntax highlighting and adding links around images):
 
 class GitHubFlavoredHighlightRenderer(mistune.HTMLRenderer):
     HARMFUL_PROTOCOLS = {
         'javascript:',
         'vbscript:',
         'data:',
-    } if not INTERNAL_USE else set()
+    }
 
-    def __init__(self, escape=False, allow_harmful_protocols=None):
+    def __init__(self, escape=False, allow_harmful_protocols=None, make_images_links=True, internal_use=False):
         super().__init__()
         self._escape = escape
-        self._allow_harmful_protocols = allow_harmful_protocols
+        self._allow_harmful_protocols = True if internal_use else allow_harmful_protocols
+        self.make_images_links = make_images_links
+        self.internal_use = internal_use
 
     def block_code(self, code, language=None):
-        if language:
-            lexer = get_lexer_by_name(language, stripall=True)
-            formatter = pygments_html.HtmlFormatter()
-            highlighted = highlight(code, lexer, formatter)
-            return highlighted
+        if language and language.split():
+            highlighted = highlight_code(code, language.split()[0].lower())
+            if highlighted is not None:
+                return highlighted
         return '<pre><code>' + mistune.escape(code) + '</code></pre>'
 
-    def heading(self, text, level):
+    def heading(self, text, level, raw_text=None, state=None):
         tag = 'h' + str(level)
-        id_from_title = heading_name_to_id_value(text)
+        id_source = text
+        if raw_text is not None and state and (state.get("render_formula") or state.get("render_emoji")):
+            # formulas and emojis are part of the id as they are written (like in links to headings in tables of
+            # contents), not as what they are rendered to:
+            id_source = markdown.inline(raw_text, dict(state, render_formula=None, render_emoji=None))
+        id_from_title = "user-content-" + heading_name_to_id_value(id_source)
         full_element = (
-                "<" + tag  # + " id=\"user-content-" + id_from_title + "\""
+                "<" + tag + " id=\"" + id_from_title + "\""
                 + ">\n<a aria-hidden=\"true\" class=\"anchor\" href=\"" + "#" + id_from_title
-                + "\" id=\"" + id_from_title + "\">"
+                + "\" id=\"" + id_from_title + "\" name=\"" + id_from_title + "\">"
                 + "<span aria-hidden=\"true\" class=\"octicon octicon-link\"></span></a>" + text + "</" + tag + ">\n"
         )
         return full_element
 
     def image(self, src, alt="", title=None):
-        return (
-                    '<a href="' + self._safe_url(src) + '" rel="nofollow">'
+        img = (
                     '<img alt="' + alt + '"'
                     + ((' title="' + escape_html(title) + '"') if title else "")
                     + ' data-canonical-src="' + self._safe_url(src) + '"'
                     + ' src="' + self._safe_url(src) + '"'
                     + ' style="max-width:100%;"/>'
-                    + '</a>'
         )
+        if not self.make_images_links:
+            return img
+        return '<a href="' + user_content_url(self._safe_url(src)) + '" rel="nofollow">' + img + '</a>'
 
     def link(self, link, text=None, title=None):
+        link = user_content_url(link)
         if text is None:
             text = link
         elif text.startswith("<a "):
@@ -78,7 +136,7 @@ class GitHubFlavoredHighlightRenderer(mistune.HTMLRenderer):
             _, right_side = not_left_side.split('"', 1)
             return left_side + ' href="' + link + '"' + right_side
 
-        s = '<a href="' + self._safe_url(link) + ('" rel="nofollow"' if not INTERNAL_USE else '"')
+        s = '<a href="' + self._safe_url(link) + ('" rel="nofollow"' if not self.internal_use else '"')
         if title:
             s += ' title="' + escape_html(title) + '"'
         return s + '>' + (text or link) + '</a>'
@@ -93,15 +151,104 @@ class GitHubFlavoredHighlightRenderer(mistune.HTMLRenderer):
         return "<p>" + text + "</p>\n"
 
 
-# build a markdown renderer/parser instance for our purpose:
-markdown = mistune.create_markdown(
-    renderer=GitHubFlavoredHighlightRenderer(),
-    plugins=['strikethrough', 'url'] + (["footnotes"] if INTERNAL_USE else []) + ["table"]
-)
-
-# apply modification to ensure that tables within lists work properly:
-try:
-    markdown.block.list_rules += ['table', 'nptable']
-except:
-    raise Exception("If you see this exception, it means mistune (a dependency) broke something in an update.\n"
-                    + "Please report the issue in GitHub, and I'll look into it.")
+# Formulas and emoji shortcodes (recognized while parsing, and rendered by functions passed to convert()):
+
+FORMULA_PATTERN = r'\$((?:\\.|[^\\$\n])+?)\$'
+STD_EMOJI_PATTERN = re.compile(r'[-_A-Za-z0-9]+')
+EXT_EMOJI_CHARS = r"-._~/?#\[\]@!$&'()*+,;=A-Za-z0-9"  # <- no :
+EMOJI_PATTERN = (r'(?<!\S):[' + EXT_EMOJI_CHARS + r'](?:[' + EXT_EMOJI_CHARS + r']|:(?=[' + EXT_EMOJI_CHARS
+                 + r':]))*:(?!\S)')
+
+
+def parse_formula(inline, m, state):
+    if not state.get("render_formula"):
+        return 'text', m.group(0)
+    state["contains_html_from_elsewhere"] = True  # <- svg formulas contain ids.
+    return 'inline_html', state["render_formula"](m.group(1))
+
+
+def parse_emoji(inline, m, state):
+    shortcode = m.group(0)
+    if not state.get("render_emoji") \
+            or not (state.get("support_custom_emojis") or STD_EMOJI_PATTERN.fullmatch(shortcode[1:-1])):
+        return 'text', shortcode
+    return 'inline_html', state["render_emoji"](shortcode)
+
+
+def plugin_formulas_and_emojis(md):
+    md.inline.register_rule('formula', FORMULA_PATTERN, parse_formula)
+    md.inline.register_rule('emoji', EMOJI_PATTERN, parse_emoji)
+    index = md.inline.rules.index('codespan')
+    md.inline.rules[index + 1:index + 1] = ['formula', 'emoji']
+
+
+# Remember whether a document contains html that wasn't created by the renderer (and might thus contain ids and
+# internal links that aren't prefixed with "user-content-" yet):
+
+def remember_html_from_elsewhere(parse_method):
+    def parse_and_remember(m, state):
+        state["contains_html_from_elsewhere"] = True
+        return parse_method(m, state)
+    return parse_and_remember
+
+
+# build markdown renderer/parser instances for our purpose (internal_use is False for OFFLINE, and True for OFFLINE+,
+# which enables some things I personally find endearing to have in a converter):
+
+def create_markdown(make_images_links=True, internal_use=False):
+    md = mistune.create_markdown(
+        renderer=GitHubFlavoredHighlightRenderer(make_images_links=make_images_links, internal_use=internal_use),
+        plugins=['strikethrough', 'url'] + (["footnotes"] if internal_use else [])
+        + ["table", plugin_formulas_and_emojis]
+    )
+
+    # pass the unrendered text of headings to the renderer, so it can derive their ids from it:
+    md.block.tokenize_heading = lambda text, level, state: {
+        'type': 'heading', 'text': text, 'params': (level, text, state)
+    }
+
+    md.inline.parse_inline_html = remember_html_from_elsewhere(md.inline.parse_inline_html)
+    md.block.parse_block_html = remember_html_from_elsewhere(md.block.parse_block_html)
+
+    # apply modification to ensure that tables within lists work properly:
+    try:
+        md.block.list_rules += ['table', 'nptable']
+    except:
+        raise Exception("If you see this exception, it means mistune (a dependency) broke something in an update.\n"
+                        + "Please report the issue in GitHub, and I'll look into it.")
+
+    return md
+
+
+# The instances are never modified after they are created, so they can be shared between threads (everything that
+# changes during a conversion is kept in its state):
+
+markdown = create_markdown()
+markdown_without_image_links = create_markdown(make_images_links=False)
+MARKDOWN_INSTANCES = {
+    (False, True): markdown,
+    (False, False): markdown_without_image_links,
+    (True, True): create_markdown(internal_use=True),
+    (True, False): create_markdown(make_images_links=False, internal_use=True),
+}
+
+
+def convert(md: str, render_formula=None, render_emoji=None, support_custom_emojis=False, make_images_links=True,
+            state=None, internal_use=False) -> str:
+    """Converts md to html, like OFFLINE+ does if internal_use is True and like OFFLINE does otherwise. If given,
+    render_formula is called with the LaTeX code of every formula (between two $), and render_emoji with every emoji
+    shortcode (including the colons), and both return the html to put in their place.
+    Shortcodes of custom emojis (see --emoji-support) are only recognized if support_custom_emojis is True.
+    If a state dict is given, state["contains_html_from_elsewhere"] is True afterwards if the html contains raw html,
+    formulas or footnotes, whose ids and internal links still need to be prefixed with "user-content-"."""
+    if state is None:
+        state = dict()
+    state.update({
+        "render_formula": render_formula,
+        "render_emoji": render_emoji,
+        "support_custom_emojis": support_custom_emojis,
+    })
+    html_content = MARKDOWN_INSTANCES[(internal_use, make_images_links)].parse(md, state)
+    if state.get("footnotes"):
+        state["contains_html_from_elsewhere"] = True
+    return html_content
@@ -0,0 +1,95 @@
+"""This file contains the dependency manifests of build mode (--build), which skips converting documents whose outputs
+are up to date, like make does.
+
+Every conversion in build mode records a manifest of what its outputs depend on: the markdown, the local files it
+reads (the markdown file, local images including custom emojis, and the --extra-css file), the options it was converted
+with and the version of gh-md-to-html, together with the files it produced or references (the html and pdf files,
+saved images, css and formulas). The next conversion of the same document into the same html file is skipped if none of
+these changed and all of the outputs still exist, so editing one image only causes the documents that reference it to
+be converted again.
+
+Local files are compared by their modification time and size first, and by their digest if these changed, so touching
+a file without changing it doesn't cause a rebuild either."""
+
+import os
+import json
+import hashlib
+import threading
+
+from .result_cache import (get_tool_version, options_affecting_the_result, UncacheableOptionError, describe_files,
+                           file_is_unchanged)
+
+# Where to keep the manifests if build mode is enabled without giving a directory:
+DEFAULT_MANIFEST_DIR = ".gh-md-to-html-build"
+
+
+def read_manifests(manifest_dir=None) -> list:
+    """Returns all manifests in the given directory (or the default one)."""
+    manifest_dir = manifest_dir or DEFAULT_MANIFEST_DIR
+    manifests = list()
+    for file_name in sorted(os.listdir(manifest_dir)) if os.path.isdir(manifest_dir) else []:
+        if file_name.endswith(".json"):
+            try:
+                with open(os.path.join(manifest_dir, file_name), "r", encoding="utf-8") as manifest_file:
+                    manifests.append(json.load(manifest_file))
+            except (OSError, ValueError):
+                pass
+    return manifests
+
+
+class DependencyManifest:
+    """The manifest of the conversion that produces the html file at output_path, kept in manifest_dir."""
+
+    def __init__(self, manifest_dir: str, output_path: str):
+        self.output_path = os.path.abspath(output_path)
+        self.path = os.path.join(
+            manifest_dir or DEFAULT_MANIFEST_DIR,
+            hashlib.sha256(self.output_path.encode("utf-8")).hexdigest()[:32] + ".json"
+        )
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as manifest_file:
+                return json.load(manifest_file)
+        except (OSError, ValueError):
+            return None
+
+    def is_up_to_date(self, md_content: str, options: dict) -> bool:
+        """Returns whether converting the given markdown with the given options would produce the outputs recorded in
+        the manifest, and all of them still exist."""
+        manifest = self._read()
+        try:
+            options = options_affecting_the_result(options)
+        except UncacheableOptionError:
+            return False  # <- (e.g. a lambda as the core converter, which may do something else every time)
+        return bool(
+            manifest
+            and manifest["tool_version"] == get_tool_version()
+            and manifest["markdown_digest"] == hashlib.sha256(md_content.encode("utf-8")).hexdigest()
+            and manifest["options"] == options
+            and all(file_is_unchanged(path, description) for path, description in manifest["inputs"].items())
+            and all(os.path.exists(path) for path in manifest["outputs"])
+        )
+
+    def record(self, md_content: str, options: dict, inputs, outputs):
+        """Saves the manifest of a conversion of the given markdown with the given options, which read the given local
+        files and produced (or references) the given files. Manifests of conversions whose options can't be compared
+        across processes (see is_up_to_date()) are recorded too, since watch mode needs to know their inputs, but are
+        never up to date."""
+        try:
+            options = options_affecting_the_result(options)
+        except UncacheableOptionError:
+            options = {"md_origin": options.get("md_origin"), "working_directory": options.get("working_directory"),
+                       "uncacheable": True}  # <- (matches no options)
+        manifest = {
+            "tool_version": get_tool_version(),
+            "markdown_digest": hashlib.sha256(md_content.encode("utf-8")).hexdigest(),
+            "options": options,
+            "inputs": describe_files(inputs),  # <- (files that are gone since they were read are left out)
+            "outputs": sorted(set(os.path.abspath(path) for path in outputs)),
+        }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temporary_path = self.path + "." + str(os.getpid()) + "-" + str(threading.get_ident()) + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file, indent=1)
+        os.replace(temporary_path, self.path)  # <- atomic, so other processes never read half-written manifests
@@ -0,0 +1,247 @@
+"""This file contains the client for GitHub's markdown REST API, which is the default core converter.
+
+It re-uses its connections, authenticates itself with a token from the environment (if there is one), spreads its
+requests out once the rate limit's quota is nearly used up, waits for the rate limit to reset instead of failing if it
+is exceeded (and backs off if a secondary rate limit is hit), retries failed requests and caches the html it receives,
+so converting a lot of documents (or the same documents over and over again) doesn't fail halfway through."""
+
+import os
+import time
+import random
+import hashlib
+import threading
+import requests
+from .limits import CONNECT_TIMEOUT, READ_TIMEOUT, StageTimeoutError
+
+# Where to find the API; this can be set to something else, e.g. a GitHub Enterprise instance or a local stub server:
+GITHUB_API_URL = os.environ.get("GH_MD_TO_HTML_GITHUB_API_URL", "https://api.github.com")
+
+# Where to cache the html returned by the API; set GH_MD_TO_HTML_API_CACHE to an empty string to disable the cache:
+DEFAULT_CACHE_DIR = os.environ.get("GH_MD_TO_HTML_API_CACHE", os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "gh-md-to-html", "github-api"
+))
+
+# HTTP status codes after which a request is worth retrying:
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Once less than this fraction of the rate limit's quota is left, the remaining requests are spread out evenly until it
+# resets, instead of using them up at once and then waiting for the reset:
+RATE_LIMIT_SPREAD_FRACTION = 0.1
+
+
+class GitHubMarkdownAPIConverter:
+    """Converts markdown to html using GitHub's markdown REST API. Instances are callable with a markdown string, like
+    any other core converter, and can safely be shared between threads. timeout is the (connect, read) timeout of
+    every request, in seconds, unless the converter is called with the Limits of a conversion, which then limit every
+    request and every wait for the rate limit or before retrying."""
+
+    def __init__(self, api_url=None, token=None, cache_dir=None, max_retries=5, backoff_factor=1.0,
+                 max_backoff=60.0, pool_size=10, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                 secondary_rate_limit_backoff=60.0):
+        self.api_url = (api_url or GITHUB_API_URL).rstrip("/")
+        if token is None:
+            token = os.environ.get("GITHUB_TOKEN") or os.environ.get("GH_TOKEN")
+        self.cache_dir = DEFAULT_CACHE_DIR if cache_dir is None else cache_dir
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.secondary_rate_limit_backoff = secondary_rate_limit_backoff
+
+        # one session for all requests, so connections are pooled:
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Content-Type": "text/plain", "charset": "utf-8"})
+        if token:
+            self.session.headers["Authorization"] = "token " + token
+
+        # what we last heard about the rate limit:
+        self._rate_limit_lock = threading.Lock()
+        self._rate_limit_remaining = None
+        self._rate_limit_reset = None
+        self._rate_limit_limit = None
+        self._next_request_time = 0.0  # <- when the next request may be sent, whilst requests are spread out
+
+    # Caching:
+
+    def _cache_path(self, markdown: str):
+        if not self.cache_dir:
+            return None
+        digest = hashlib.sha256((self.api_url + "\n" + markdown).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + ".html")
+
+    def _read_from_cache(self, markdown: str):
+        cache_path = self._cache_path(markdown)
+        if cache_path and os.path.isfile(cache_path):
+            try:
+                with open(cache_path, "r", encoding="utf-8") as cache_file:
+                    return cache_file.read()
+            except OSError:
+                pass
+        return None
+
+    def _write_to_cache(self, markdown: str, html_content: str):
+        cache_path = self._cache_path(markdown)
+        if not cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            temporary_path = cache_path + "." + str(os.getpid()) + "-" + str(threading.get_ident()) + ".tmp"
+            with open(temporary_path, "w", encoding="utf-8") as cache_file:
+                cache_file.write(html_content)
+            os.replace(temporary_path, cache_path)  # <- atomic, so other processes never read half-written files
+        except OSError:
+            pass  # <- e.g. a read-only home directory; caching is merely an optimization.
+
+    # Rate limiting & retrying:
+
+    def _remember_rate_limit(self, response):
+        try:
+            remaining = int(response.headers["X-RateLimit-Remaining"])
+            reset = float(response.headers["X-RateLimit-Reset"])
+        except (KeyError, ValueError):
+            return
+        try:
+            limit = int(response.headers["X-RateLimit-Limit"])
+        except (KeyError, ValueError):
+            limit = None
+        with self._rate_limit_lock:
+            self._rate_limit_remaining = remaining
+            self._rate_limit_reset = reset
+            self._rate_limit_limit = limit
+
+    @staticmethod
+    def _sleep(seconds: float, limits, stage: str):
+        """Sleeps for the given number of seconds, or raises StageTimeoutError right away if this would exceed the
+        deadline of the given Limits (if any)."""
+        time_left = limits.time_left(stage) if limits else None
+        if time_left is not None and time_left < seconds:
+            raise StageTimeoutError(stage, limits.timeout, "--timeout")
+        time.sleep(seconds)
+
+    def _wait_for_rate_limit(self, limits=None):
+        """Sleeps until it is this request's turn if the quota is nearly used up (so the remaining requests are spread
+        out evenly until the rate limit resets), and then until the rate limit resets if we used up our quota."""
+        with self._rate_limit_lock:
+            if self._rate_limit_remaining is None:
+                return
+            now = time.time()
+            seconds_to_reset = self._rate_limit_reset - now + 1
+            seconds_to_wait = 0
+            if 0 < self._rate_limit_remaining < RATE_LIMIT_SPREAD_FRACTION * (self._rate_limit_limit or 0) \
+                    and seconds_to_reset > 0:
+                send_at = max(now, self._next_request_time)
+                self._next_request_time = send_at + seconds_to_reset / self._rate_limit_remaining
+                seconds_to_wait = send_at - now
+        if seconds_to_wait > 0:
+            self._sleep(seconds_to_wait, limits, "waiting to spread out requests to GitHub's markdown API")
+        with self._rate_limit_lock:  # <- (the answers to other requests may have used up the quota in the meantime)
+            if self._rate_limit_remaining > 0:
+                return
+            seconds_to_wait = self._rate_limit_reset - time.time() + 1
+        if seconds_to_wait > 0:
+            self._sleep(seconds_to_wait, limits, "waiting for GitHub's rate limit to reset")
+
+    def _backoff(self, attempt: int, response=None, limits=None):
+        """Sleeps before the next attempt, respecting the Retry-After header if the API sent one, and for at least
+        secondary_rate_limit_backoff seconds (doubling with every attempt) after hitting a secondary rate limit without
+        one, as GitHub asks."""
+        if response is not None and "Retry-After" in response.headers:
+            try:
+                seconds_to_wait = float(response.headers["Retry-After"])
+            except ValueError:
+                pass
+            else:
+                self._sleep(seconds_to_wait, limits, "waiting to retry a request to GitHub's markdown API")
+                return
+        if response is not None and self._is_secondary_rate_limit_response(response):
+            self._sleep(self.secondary_rate_limit_backoff * 2 ** attempt, limits,
+                        "waiting for GitHub's secondary rate limit")
+            return
+        self._sleep(random.uniform(0, min(self.max_backoff, self.backoff_factor * 2 ** attempt)), limits,
+                    "waiting to retry a request to GitHub's markdown API")
+
+    def _timeouts(self, limits=None):
+        """Returns the (connect, read) timeout of the next request, and the options that set them."""
+        if limits is None:
+            return self.timeout, ("GitHubMarkdownAPIConverter's timeout",) * 2
+        connect_timeout, connect_limit = limits.limit(limits.connect_timeout, "--connect-timeout",
+                                                      "connecting to GitHub's markdown API")
+        read_timeout, read_limit = limits.limit(limits.read_timeout, "--read-timeout",
+                                                "converting with GitHub's markdown API")
+        return (connect_timeout, read_timeout), (connect_limit, read_limit)
+
+    @staticmethod
+    def _is_rate_limit_response(response):
+        return response.status_code in (403, 429) and response.headers.get("X-RateLimit-Remaining") == "0"
+
+    @staticmethod
+    def _is_secondary_rate_limit_response(response):
+        # (secondary rate limits, e.g. for too many concurrent requests, don't use up the quota, and are only told apart
+        # from other 403s by a Retry-After header or by their message)
+        if response.status_code not in (403, 429):
+            return False
+        message = response.text.lower()
+        return "Retry-After" in response.headers or "rate limit" in message or "abuse" in message
+
+    # Converting:
+
+    def __call__(self, markdown: str, limits=None) -> str:
+        """Converts the given markdown, within the given Limits (if any)."""
+        cached_html = self._read_from_cache(markdown)
+        if cached_html is not None:
+            return cached_html
+
+        response = None
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_rate_limit(limits)
+            timeout, timeout_limits = self._timeouts(limits)
+            try:
+                response = self.session.post(self.api_url + "/markdown/raw", data=markdown.encode("utf-8"),
+                                             timeout=timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                # (the deadline may have passed during the request, in which case retrying is pointless:)
+                deadline_passed = bool(limits and limits.deadline and limits.deadline <= time.monotonic())
+                if (attempt == self.max_retries or deadline_passed) \
+                        and isinstance(e, requests.exceptions.ConnectTimeout):
+                    raise StageTimeoutError("connecting to GitHub's markdown API", timeout[0], timeout_limits[0])
+                if (attempt == self.max_retries or deadline_passed) \
+                        and isinstance(e, requests.exceptions.ReadTimeout):
+                    raise StageTimeoutError("converting with GitHub's markdown API", timeout[1], timeout_limits[1])
+                if attempt == self.max_retries:
+                    raise
+                self._backoff(attempt, limits=limits)
+                continue
+            self._remember_rate_limit(response)
+            if response.status_code == 200:
+                html_content = str(response.content, encoding="utf-8")
+                self._write_to_cache(markdown, html_content)
+                return html_content
+            if attempt == self.max_retries:
+                break
+            if self._is_rate_limit_response(response) and "X-RateLimit-Reset" in response.headers:
+                continue  # <- _wait_for_rate_limit waits until the quota resets.
+            if response.status_code not in RETRY_STATUS_CODES and not self._is_rate_limit_response(response) \
+                    and not self._is_secondary_rate_limit_response(response):
+                break
+            self._backoff(attempt, response, limits)
+
+        raise Exception("GitHub's markdown API responded with status code " + str(response.status_code) + ":\n"
+                        + response.text)
+
+
+# The instance used by default:
+
+default_converter = None
+_default_converter_lock = threading.Lock()
+
+
+def get_default_converter() -> GitHubMarkdownAPIConverter:
+    """Returns the converter that is used if no other is specified, creating it when it is needed for the first time."""
+    global default_converter
+    with _default_converter_lock:
+        if default_converter is None:
+            default_converter = GitHubMarkdownAPIConverter()
+        return default_converter
@@ -15,6 +15,7 @@ import shlex
 import re
 from tempfile import TemporaryDirectory
 from ctypes.util import find_library
+from .limits import Limits
 
 default_template = r"""
 \documentclass[{{ fontsize }}pt,preview]{standalone}
@@ -60,7 +61,7 @@ if not hasattr(os.environ, 'LIBGS') and not find_library('gs'):
         # print('Warning: libgs not found')
 
 
-def latex2svg(code, params=default_params, working_directory=None):
+def latex2svg(code, params=default_params, working_directory=None, limits=None):
     """Convert LaTeX to SVG using dvisvgm.
     Parameters
     ----------
@@ -70,6 +71,9 @@ def latex2svg(code, params=default_params, working_directory=None):
         Conversion parameters.
     working_directory : str or None
         Working directory for external commands and place for temporary files.
+    limits : Limits or None
+        The limits to run the external commands within (the default ones if
+        None).
     Returns
     -------
     dict
@@ -81,7 +85,9 @@ def latex2svg(code, params=default_params, working_directory=None):
     """
     if working_directory is None:
         with TemporaryDirectory() as tmpdir:
-            return latex2svg(code, params, working_directory=tmpdir)
+            return latex2svg(code, params, working_directory=tmpdir, limits=limits)
+    if limits is None:
+        limits = Limits()
 
     fontsize = params['fontsize']
     document = (params['template']
@@ -94,13 +100,11 @@ def latex2svg(code, params=default_params, working_directory=None):
 
     # Run LaTeX and create DVI file
     try:
-        ret = subprocess.run(shlex.split(params['latex_cmd']+' code.tex'),
-                             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                             cwd=working_directory)
-        try:
-            ret.check_returncode()
-        except subprocess.CalledProcessError:
-            raise RuntimeError("LaTeX failed with error:", str(ret.stderr, encoding="UTF-8"),
+        returncode, _, stderr = limits.run(shlex.split(params['latex_cmd']+' code.tex'),
+                                           "rendering formula $" + code + "$ with LaTeX",
+                                           cwd=working_directory)
+        if returncode != 0:
+            raise RuntimeError("LaTeX failed with error:", str(stderr, encoding="UTF-8"),
                                "\nThis happened whilst rendering formula $" + code + "$.")
     except FileNotFoundError:
         raise RuntimeError('latex not found')
@@ -112,13 +116,11 @@ def latex2svg(code, params=default_params, working_directory=None):
 
     # Convert DVI to SVG
     try:
-        ret = subprocess.run(shlex.split(params['dvisvgm_cmd']+' code.dvi'),
-                             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                             cwd=working_directory, env=env)
-        try:
-            ret.check_returncode()
-        except subprocess.CalledProcessError:
-            raise RuntimeError("dvisvgm failed with error:", str(ret.stderr, encoding="UTF-8"),
+        returncode, _, stderr = limits.run(shlex.split(params['dvisvgm_cmd']+' code.dvi'),
+                                           "rendering formula $" + code + "$ with dvisvgm",
+                                           cwd=working_directory, env=env)
+        if returncode != 0:
+            raise RuntimeError("dvisvgm failed with error:", str(stderr, encoding="UTF-8"),
                                "\nThis happened whilst rendering formula $" + code + "$.")
 
     except FileNotFoundError:
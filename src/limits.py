@@ -0,0 +1,132 @@
+"""This file contains the limits on how long gh-md-to-html waits for the things it needs (web servers, commands and entire
+documents), the helpers that enforce them, and the exception that is raised when one of them is exceeded."""
+
+import subprocess
+import sys
+import os
+import signal
+import time
+import threading
+import requests
+
+# The default limits, in seconds:
+CONNECT_TIMEOUT = 10  # <- for connecting to a web server
+READ_TIMEOUT = 60  # <- for a web server's response (after connecting to it)
+COMMAND_TIMEOUT = 300  # <- for every command that is run (LaTeX, dvisvgm, core converter commands and wkhtmltopdf)
+
+
+class StageTimeoutError(TimeoutError):
+    """Raised when a stage of a conversion takes longer than it may. stage describes what took too long (like
+    "downloading the image https://..."), and limit is the option that sets the limit that was exceeded."""
+
+    def __init__(self, stage: str, seconds: float, limit: str):
+        super().__init__(stage[0].upper() + stage[1:] + " took longer than " + format(seconds, ".3g")
+                         + " seconds (see " + limit + ").")
+        self.stage = stage
+        self.seconds = seconds
+        self.limit = limit
+
+
+# Commands are started in a process group of their own, so they can be stopped together with everything they started:
+
+NEW_PROCESS_GROUP_ARGUMENTS = (
+    {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP} if sys.platform.startswith('win')
+    else {"start_new_session": True}
+)
+
+
+def kill_process_group(process):
+    """Kills the given process (started with NEW_PROCESS_GROUP_ARGUMENTS), and all processes it started."""
+    if process.returncode is not None:
+        return
+    try:
+        if sys.platform.startswith('win'):
+            process.kill()
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class Limits:
+    """The limits of a single conversion: connect_timeout and read_timeout for every request, command_timeout for every
+    command, and timeout for the entire document (None meaning no limit). The time left until the document's deadline
+    further limits every request and command, and StageTimeoutError is raised as soon as it passed."""
+
+    def __init__(self, connect_timeout=None, read_timeout=None, command_timeout=None, timeout=None):
+        self.connect_timeout = CONNECT_TIMEOUT if connect_timeout is None else float(connect_timeout)
+        self.read_timeout = READ_TIMEOUT if read_timeout is None else float(read_timeout)
+        self.command_timeout = COMMAND_TIMEOUT if command_timeout is None else float(command_timeout)
+        self.timeout = float(timeout) if timeout else None
+        self.deadline = time.monotonic() + self.timeout if self.timeout else None
+
+    def time_left(self, stage: str):
+        """Returns the seconds left until the document's deadline (or None if there is none), and raises
+        StageTimeoutError for the given stage if it passed."""
+        if self.deadline is None:
+            return None
+        time_left = self.deadline - time.monotonic()
+        if time_left <= 0:
+            raise StageTimeoutError(stage, self.timeout, "--timeout")
+        return time_left
+
+    def limit(self, seconds: float, option: str, stage: str):
+        """Returns how long the given stage may take (limited to seconds by the given option), and which option sets
+        this limit."""
+        time_left = self.time_left(stage)
+        if time_left is not None and time_left < seconds:
+            return time_left, "--timeout"
+        return seconds, option
+
+    def get(self, url: str, stage: str, session=None) -> requests.Response:
+        """Requests url (using session, if given), within the limits."""
+        connect_timeout, connect_limit = self.limit(self.connect_timeout, "--connect-timeout", stage)
+        read_timeout, read_limit = self.limit(self.read_timeout, "--read-timeout", stage)
+        try:
+            return (session or requests).get(url, timeout=(connect_timeout, read_timeout))
+        except requests.exceptions.ConnectTimeout:
+            raise StageTimeoutError(stage, connect_timeout, connect_limit)
+        except requests.exceptions.ReadTimeout:
+            raise StageTimeoutError(stage, read_timeout, read_limit)
+
+    def call(self, function, stage: str, *args, **kwargs):
+        """Calls function with the given arguments and returns its result. If the document has a deadline, function
+        runs in a thread of its own, and StageTimeoutError is raised for the given stage as soon as the deadline
+        passes (leaving function to finish in the background, since threads can't be interrupted)."""
+        time_left = self.time_left(stage)
+        if time_left is None:
+            return function(*args, **kwargs)
+        outcome = dict()
+
+        def call_function():
+            try:
+                outcome["result"] = function(*args, **kwargs)
+            except BaseException as e:
+                outcome["exception"] = e
+
+        thread = threading.Thread(target=call_function, daemon=True)
+        thread.start()
+        thread.join(time_left)
+        if thread.is_alive():
+            raise StageTimeoutError(stage, self.timeout, "--timeout")
+        if "exception" in outcome:
+            raise outcome["exception"]
+        return outcome["result"]
+
+    def run(self, args, stage: str, input: bytes = None, **popen_arguments):
+        """Runs a command within the limits (killing it and everything it started if it exceeds them), and returns its
+        exit code, stdout and stderr."""
+        command_timeout, command_limit = self.limit(self.command_timeout, "--command-timeout", stage)
+        popen_arguments.setdefault("stderr", subprocess.PIPE)
+        process = subprocess.Popen(args, stdin=(subprocess.PIPE if input is not None else None),
+                                   stdout=subprocess.PIPE, **popen_arguments, **NEW_PROCESS_GROUP_ARGUMENTS)
+        try:
+            stdout, stderr = process.communicate(input, timeout=command_timeout)
+        except subprocess.TimeoutExpired:
+            kill_process_group(process)
+            process.communicate()
+            raise StageTimeoutError(stage, command_timeout, command_limit)
+        except BaseException:
+            kill_process_group(process)
+            raise
+        return process.returncode, stdout, stderr
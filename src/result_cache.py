@@ -0,0 +1,236 @@
+"""This file contains the result cache, which remembers the html a document was converted to, so converting the same
+document with the same options again (e.g. when rebuilding a website of which only a few pages changed) doesn't need to
+convert it at all.
+
+Every entry is keyed by the digest of the markdown, the options it was converted with (except those that don't
+influence the result, like timeouts) and the version of gh-md-to-html, and stores the final html together with the
+files the conversion produced or references (images, css, formulas saved as files, the html and pdf files) and the
+local files it read (local images, custom emojis and the --extra-css file). An entry is only used if all of the former
+still exist and none of the latter changed. Documents converted with a core converter that can't be told apart from
+others across processes (like a lambda or a functools.partial) aren't cached, unless the core converter has a
+result_cache_id attribute that names it.
+
+Entries that haven't been used for max_age seconds are evicted, as are the least recently used ones as soon as all
+entries together take up more than max_size bytes."""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+
+# Where to cache results if the cache is enabled without giving a directory:
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "gh-md-to-html", "results"
+)
+
+MAX_SIZE = 512 * 1024 ** 2  # <- in bytes
+MAX_AGE = 30 * 24 * 60 * 60  # <- in seconds
+EVICTION_INTERVAL = 60  # <- how many seconds to wait at least between looking for entries to evict
+
+# Options that only influence how long a conversion takes, but not its result:
+OPTIONS_NOT_AFFECTING_THE_RESULT = (
+    "timeout", "connect_timeout", "read_timeout", "command_timeout", "persistent_core_converter", "result_cache",
+    "no_cache", "build",
+)
+
+_tool_version = None
+
+
+def get_tool_version() -> str:
+    """Returns a digest of gh-md-to-html's own files, which changes whenever any of them (and thereby possibly the
+    result of a conversion) changes, including in between releases."""
+    global _tool_version
+    if _tool_version is None:
+        module_path = os.path.dirname(os.path.abspath(__file__))
+        digest = hashlib.sha256()
+        for file_name in sorted(os.listdir(module_path)):
+            if file_name.endswith((".py", ".html", ".css", ".svg")):
+                with open(os.path.join(module_path, file_name), "rb") as module_file:
+                    digest.update(file_name.encode("utf-8") + b"\0" + module_file.read() + b"\0")
+        _tool_version = digest.hexdigest()
+    return _tool_version
+
+
+class UncacheableOptionError(ValueError):
+    """Raised for options whose value can't be represented in a way that is the same in every process, and different
+    for every other value (like a lambda as the core converter)."""
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 ** 2), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def describe_file(path: str) -> dict:
+    """Returns what is remembered about a local file to find out whether it changed later."""
+    stat = os.stat(path)
+    return {"mtime": stat.st_mtime_ns, "size": stat.st_size, "digest": file_digest(path)}
+
+
+def describe_files(paths) -> dict:
+    """Maps the absolute path of every given file to its description (leaving out files that are gone)."""
+    descriptions = dict()
+    for path in sorted(set(paths)):
+        try:
+            descriptions[os.path.abspath(path)] = describe_file(path)
+        except OSError:
+            pass
+    return descriptions
+
+
+def file_is_unchanged(path: str, description: dict) -> bool:
+    """Compares a file to its description, by its modification time and size first, and by its digest if these
+    changed (so touching a file without changing it doesn't count as a change)."""
+    try:
+        stat = os.stat(path)
+        if stat.st_mtime_ns == description["mtime"] and stat.st_size == description["size"]:
+            return True
+        return stat.st_size == description["size"] and file_digest(path) == description["digest"]
+    except OSError:
+        return False
+
+
+def normalize_option(value):
+    """Returns a representation of an option's value that is the same in every process (unlike the repr of, e.g., a
+    function). Functions are represented by their name, so only functions that can be found by it (at the top level
+    of their module) can be represented, as well as callables with a result_cache_id attribute; UncacheableOptionError
+    is raised for all others."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [normalize_option(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): normalize_option(item) for key, item in value.items()}
+    if callable(value):
+        if getattr(value, "result_cache_id", None) is not None:
+            return "result_cache_id:" + str(value.result_cache_id)
+        module = sys.modules.get(getattr(value, "__module__", None) or "")
+        qualified_name = getattr(value, "__qualname__", None)
+        if module is None or not qualified_name or getattr(module, qualified_name, None) is not value:
+            raise UncacheableOptionError(repr(value) + " can't be told apart from other callables across processes; "
+                                         + "give it a result_cache_id attribute to cache its results.")
+        return value.__module__ + "." + qualified_name
+    return getattr(value, "__module__", "") + "." + getattr(value, "__qualname__", type(value).__qualname__)
+
+
+def options_affecting_the_result(options: dict) -> dict:
+    """Returns the given options without the ones that don't influence the result, in a form that can be stored as
+    json and compared across processes."""
+    return {name: normalize_option(value) for name, value in options.items()
+            if name not in OPTIONS_NOT_AFFECTING_THE_RESULT}
+
+
+class ResultCache:
+    """A directory of cached conversion results (see above). Instances can safely be shared between threads, and
+    several processes can use the same directory at the same time."""
+
+    def __init__(self, cache_dir=None, max_size=MAX_SIZE, max_age=MAX_AGE):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_size = max_size
+        self.max_age = max_age
+        self._last_eviction = 0
+        self._eviction_lock = threading.Lock()
+
+    def key(self, md_content: str, options: dict):
+        """Returns the key of the document with the given markdown, converted with the given options, or None if its
+        result can't be cached (see normalize_option())."""
+        try:
+            options = options_affecting_the_result(options)
+        except UncacheableOptionError:
+            return None
+        return hashlib.sha256("\n".join((
+            get_tool_version(), json.dumps(options, sort_keys=True), md_content
+        )).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def get(self, key: str):
+        """Returns the cached html for the given key, or None if there is none, any of its files is missing or any of
+        the local files it was converted from changed."""
+        if key is None:
+            return None
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                return None
+            with open(path, "r", encoding="utf-8") as entry_file:
+                entry = json.load(entry_file)
+        except (OSError, ValueError):
+            return None
+        if not all(os.path.exists(asset) for asset in entry["assets"]):
+            return None
+        if not all(file_is_unchanged(path, description) for path, description in entry["inputs"].items()):
+            return None
+        try:
+            os.utime(path)  # <- marks the entry as recently used
+        except OSError:
+            pass
+        return entry["html"]
+
+    def put(self, key: str, html_content: str, assets, inputs=()):
+        """Caches the given html for the given key, together with the paths of the files it needs and of the local
+        files it was converted from."""
+        if key is None:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary_path = path + "." + str(os.getpid()) + "-" + str(threading.get_ident()) + ".tmp"
+            with open(temporary_path, "w", encoding="utf-8") as entry_file:
+                json.dump({"html": html_content, "assets": sorted(set(assets)), "inputs": describe_files(inputs)},
+                          entry_file)
+            os.replace(temporary_path, path)  # <- atomic, so other processes never read half-written entries
+        except OSError:
+            return  # <- e.g. a read-only home directory; caching is merely an optimization.
+        if time.time() - self._last_eviction > EVICTION_INTERVAL:
+            self.evict()
+
+    def evict(self):
+        """Removes the entries that are too old, and then the least recently used ones until the cache is small
+        enough."""
+        if not self._eviction_lock.acquire(blocking=False):
+            return  # <- another thread is already doing it.
+        try:
+            self._last_eviction = time.time()
+            entries = list()
+            for directory_path, _, file_names in os.walk(self.cache_dir):
+                for file_name in file_names:
+                    try:
+                        stat = os.stat(os.path.join(directory_path, file_name))
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, os.path.join(directory_path, file_name)))
+            entries.sort()
+            total_size = sum(size for _, size, _ in entries)
+            for last_used, size, path in entries:
+                if self._last_eviction - last_used <= self.max_age and total_size <= self.max_size:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total_size -= size
+        finally:
+            self._eviction_lock.release()
+
+
+# One cache per directory, so it is only looked through for evictions once in a while:
+
+_caches = dict()
+_caches_lock = threading.Lock()
+
+
+def get_result_cache(cache_dir=None) -> ResultCache:
+    """Returns the cache in the given directory (or the default one), creating it when it is needed for the first
+    time."""
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    with _caches_lock:
+        if cache_dir not in _caches:
+            _caches[cache_dir] = ResultCache(cache_dir)
+        return _caches[cache_dir]
@@ -0,0 +1,288 @@
+"""This file contains gh-md-to-html's conversion server, which keeps converting documents in a long-running process (or
+several pre-forked ones), so every conversion doesn't need to pay for importing gh-md-to-html, probing LaTeX, loading
+the css and warming up the caches again.
+
+It listens on localhost or on a unix socket, and understands the following requests:
+* POST /convert with a json object like {"markdown": "...", "options": {...}}, where options are arguments of main()
+  (only the ones in REQUEST_OPTIONS; the others are set when starting the server). It answers with a json object like
+  {"html": "...", "assets": [...]}, where assets are the local files (images, css etc.) the html references, or with
+  {"error": "..."} if the request or the conversion failed.
+* GET /health, which answers with {"status": "ok"} as long as the server is running.
+Requests can't make the server read images from its disk (only images from the web are downloaded), and requests with
+a body of more than --max-request-size bytes are refused with status 413.
+
+Sending SIGHUP to the server reloads it gracefully: the options are re-read from the config file, and (with pre-forked
+workers) new workers replace the old ones, which finish the requests they are handling before they exit.
+
+Usage: gh-md-to-html-server [--host HOST] [--port PORT] [--unix-socket PATH] [--workers N] [--config FILE]
+                            [--max-request-size BYTES]"""
+
+import argparse
+import functools
+import http.server
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+import traceback
+
+from . import Converter, converter_registry, find_assets_in_html
+
+# The options every request may set for itself; anything else (like where to save files, or commands to run as core
+# converters) can only be set by whoever starts the server:
+REQUEST_OPTIONS = (
+    "math", "formula_renderer", "share_formula_glyphs", "formula_precision", "toc", "dont_make_images_links",
+    "emoji_support", "box_width", "soft_wrap_in_code_boxes", "optimize_image_loading", "eager_images", "footer",
+    "chunk_size", "core_converter",
+)
+
+# What the server does unless its config file says otherwise (it never saves the html, and only saves images and css if
+# it is told where to):
+DEFAULT_OPTIONS = {
+    "image_paths": "",
+    "css_paths": "",
+}
+
+# The largest request body (in bytes) the server accepts unless told otherwise:
+MAX_REQUEST_SIZE = 16 * 1024 * 1024
+
+WARM_UP_DOCUMENT = "# Warm-up\n\nSome *text* with `code`.\n\n```python\nprint('code')\n```\n\n| a | b |\n|---|---|\n"
+
+
+class ConversionServer:
+    """Converts the documents sent to it with a warm Converter per set of request options, and serves them via HTTP on
+    the given address, or on a unix socket if unix_socket is given."""
+
+    def __init__(self, host="127.0.0.1", port=8000, unix_socket=None, config_file=None, quiet=False,
+                 max_request_size=MAX_REQUEST_SIZE):
+        self.address = unix_socket if unix_socket else (host, port)
+        self.unix_socket = unix_socket
+        self.config_file = config_file
+        self.quiet = quiet
+        self.max_request_size = max_request_size
+        self.options = None
+        self.load_config()
+
+    # Converting:
+
+    def load_config(self):
+        """(Re-)reads the options from the config file, and forgets all converters created with the old ones."""
+        options = dict(DEFAULT_OPTIONS)
+        if self.config_file:
+            with open(self.config_file, "r", encoding="utf-8") as config_file:
+                options.update(json.load(config_file))
+        # (the markdown comes from whoever sends the request, so it may only reference images from the web, and must
+        # never make the server ask for confirmation on its stdin)
+        options.update({"origin_type": "string", "output_name": "print", "local_images": False})
+        Converter(**options)  # <- fails if the config contains options main() doesn't know.
+        self.options = options
+        self.get_converter = functools.lru_cache(maxsize=64)(self._make_converter)
+
+    def _make_converter(self, request_options_as_json: str) -> Converter:
+        return Converter(**dict(self.options, **json.loads(request_options_as_json)))
+
+    def convert(self, markdown: str, request_options: dict) -> str:
+        forbidden_options = set(request_options) - set(REQUEST_OPTIONS)
+        if forbidden_options:
+            raise ValueError("These options can't be set per request: " + ", ".join(sorted(forbidden_options)))
+        core_converter = request_options.get("core_converter")
+        if core_converter is not None and core_converter not in ("OFFLINE", "OFFLINE+") \
+                and not converter_registry.get_core_converter(core_converter):
+            raise ValueError("Requests can only choose OFFLINE, OFFLINE+ or a registered converter as core converter.")
+        return self.get_converter(json.dumps(request_options, sort_keys=True)).convert(markdown)
+
+    def warm_up(self):
+        """Converts a small document once, so the first request doesn't need to load everything (unless doing so
+        would require the internet or running commands, which is left to the first request)."""
+        core_converter = self.options.get("core_converter")
+        if type(core_converter) is str and (core_converter in ("OFFLINE", "OFFLINE+")
+                                            or converter_registry.get_core_converter(core_converter)):
+            self.convert(WARM_UP_DOCUMENT, dict())
+
+    # Serving:
+
+    def make_http_server(self):
+        handler = type("Handler", (ConversionRequestHandler,), {"conversion_server": self})
+        if self.unix_socket:
+            if os.path.exists(self.unix_socket):
+                os.remove(self.unix_socket)
+            return ThreadingUnixHTTPServer(self.unix_socket, handler)
+        return ThreadingHTTPServer(self.address, handler)
+
+    def serve(self, workers=0):
+        """Serves until SIGTERM or SIGINT is received. With workers > 0, that many worker processes are forked to
+        handle requests; otherwise, this process handles them itself."""
+        self.warm_up()
+        http_server = self.make_http_server()
+        if not self.quiet:
+            print("gh-md-to-html server listening on",
+                  self.unix_socket if self.unix_socket else "http://%s:%d" % self.address, file=sys.stderr)
+        try:
+            if workers > 0:
+                self._serve_with_workers(http_server, workers)
+            else:
+                if hasattr(signal, "SIGHUP"):
+                    signal.signal(signal.SIGHUP, lambda *_: self.load_config())
+                signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=http_server.shutdown).start())
+                try:
+                    http_server.serve_forever()
+                except KeyboardInterrupt:
+                    pass
+        finally:
+            http_server.server_close()
+            if self.unix_socket and os.path.exists(self.unix_socket):
+                os.remove(self.unix_socket)
+
+    def _start_worker(self, http_server) -> int:
+        pid = os.fork()
+        if pid:
+            return pid
+        # in the worker:
+        exit_code = 0
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)  # <- the parent stops us when it is interrupted.
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=http_server.shutdown).start())
+            http_server.serve_forever()
+            http_server.server_close()  # <- waits for the requests that are still being handled.
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def _serve_with_workers(self, http_server, workers):
+        if not hasattr(os, "fork"):
+            raise Exception("Pre-forked workers aren't supported on this platform; use --workers 0 instead.")
+        received_signals = list()
+        for signal_number in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signal_number, lambda signal_number, _: received_signals.append(signal_number))
+
+        current_workers = set(self._start_worker(http_server) for _ in range(workers))
+        retiring_workers = set()
+        stopping = False
+        while current_workers or retiring_workers:
+            while received_signals:
+                signal_number = received_signals.pop(0)
+                if signal_number == signal.SIGHUP and not stopping:
+                    # replace all workers with ones that use the new config, and let the old ones finish their work:
+                    self.load_config()
+                    self.warm_up()
+                    retiring_workers |= current_workers
+                    current_workers = set(self._start_worker(http_server) for _ in range(workers))
+                    for pid in retiring_workers:
+                        os.kill(pid, signal.SIGTERM)
+                elif signal_number in (signal.SIGTERM, signal.SIGINT) and not stopping:
+                    stopping = True
+                    retiring_workers |= current_workers
+                    current_workers = set()
+                    for pid in retiring_workers:
+                        os.kill(pid, signal.SIGTERM)
+
+            # clean up workers that exited, and replace the ones that crashed:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                time.sleep(0.2)
+            elif pid in retiring_workers:
+                retiring_workers.remove(pid)
+            elif pid in current_workers:
+                current_workers.remove(pid)
+                if not stopping:
+                    current_workers.add(self._start_worker(http_server))
+
+
+# (the threads handling requests aren't daemon threads, so the server waits for them to finish when it is closed)
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = False
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = False
+
+
+class ConversionRequestHandler(http.server.BaseHTTPRequestHandler):
+    conversion_server = None  # <- set by ConversionServer.make_http_server.
+    server_version = "gh-md-to-html"
+
+    def send_json(self, status: int, content: dict):
+        body = json.dumps(content).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, {"status": "ok"})
+        else:
+            self.send_json(404, {"error": "Not found."})
+
+    def do_POST(self):
+        if self.path != "/convert":
+            self.send_json(404, {"error": "Not found."})
+            return
+        try:
+            content_length = int(self.headers.get("Content-Length", 0))
+            if content_length < 0:
+                raise ValueError("Content-Length can't be negative.")
+        except ValueError as e:
+            self.close_connection = True
+            self.send_json(400, {"error": "Invalid request: " + str(e)})
+            return
+        if content_length > self.conversion_server.max_request_size:
+            self.close_connection = True  # <- (the body isn't read)
+            self.send_json(413, {"error": "The request is larger than %d bytes." % self.conversion_server.max_request_size})
+            return
+        try:
+            request = json.loads(self.rfile.read(content_length).decode("utf-8"))
+            markdown, request_options = request["markdown"], request.get("options", dict())
+            if type(markdown) is not str or type(request_options) is not dict:
+                raise TypeError("markdown needs to be a string, and options an object.")
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {"error": "Invalid request: " + str(e)})
+            return
+        try:
+            html_content = self.conversion_server.convert(markdown, request_options)
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self.send_json(500, {"error": str(e)})
+            return
+        self.send_json(200, {"html": html_content, "assets": find_assets_in_html(html_content)})
+
+    def address_string(self):
+        return self.client_address[0] if self.client_address else "unix socket"
+
+    def log_message(self, *args):
+        if not self.conversion_server.quiet:
+            super().log_message(*args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1", help="The address to listen on. Defaults to 127.0.0.1.")
+    parser.add_argument("--port", type=int, default=8000, help="The port to listen on. Defaults to 8000.")
+    parser.add_argument("--unix-socket", help="Listen on a unix socket at this path instead of a port.")
+    parser.add_argument("--workers", type=int, default=0, help="""
+    How many worker processes to fork for handling requests. Defaults to 0, which handles them in this process.""")
+    parser.add_argument("--config", help="""
+    A json file with the options (arguments of main(), like "core_converter" or "image_paths") to convert with.""")
+    parser.add_argument("--max-request-size", type=int, default=MAX_REQUEST_SIZE, help="""
+    The largest request body (in bytes) to accept; larger requests are answered with status 413. Defaults to %d."""
+                        % MAX_REQUEST_SIZE)
+    parser.add_argument("--quiet", action="store_true", help="Don't log requests.")
+    args = parser.parse_args()
+
+    ConversionServer(args.host, args.port, args.unix_socket, args.config, args.quiet,
+                     args.max_request_size).serve(args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
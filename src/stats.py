@@ -0,0 +1,122 @@
+"""This file contains the statistics a conversion can record about itself (see --profile): for every stage of the
+conversion (reading the markdown, converting it, rendering formulas, fetching, hashing and compressing images, fixing
+links, saving the html etc.), how much wall time and CPU time it took, and (if tracemalloc is tracing, as it is with
+--profile) how much memory python had allocated at most whilst it ran. The memory can only be measured per stage on
+python 3.9 or newer (which can reset tracemalloc's peak), so it is left out on older versions.
+
+Stages can contain other stages (like "images" contains "images > fetching"), whose time is part of the time of the
+stage containing them. Stages that happen more than once (like hashing every image) are added up."""
+
+import time
+import contextlib
+import tracemalloc
+
+# whether the peak memory of every stage can be measured (tracemalloc.reset_peak() is new in python 3.9):
+CAN_MEASURE_PEAK_MEMORY = hasattr(tracemalloc, "reset_peak")
+
+
+class StageStats:
+    def __init__(self):
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.peak_memory = None  # <- in bytes, or None if tracemalloc wasn't tracing
+        self.count = 0
+
+    def add(self, other: "StageStats"):
+        self.wall_time += other.wall_time
+        self.cpu_time += other.cpu_time
+        if other.peak_memory is not None:
+            self.peak_memory = max(self.peak_memory or 0, other.peak_memory)
+        self.count += other.count
+
+
+class ConversionStats:
+    """The statistics of one or more conversions. stages maps the name of every stage to its StageStats, in the order
+    in which the stages first began. The CPU time is that of the entire process, so it includes other threads' work
+    (like downloading images, or converting chunks of the document concurrently)."""
+
+    def __init__(self):
+        self.stages = dict()
+        # [full name, wall time and cpu time at its beginning, peak memory of the stages within it] of running stages:
+        self._running_stages = list()
+
+    def begin(self, name: str):
+        """Begins the stage with the given name, within the stage that is currently running, if any."""
+        if CAN_MEASURE_PEAK_MEMORY and tracemalloc.is_tracing():
+            if self._running_stages:
+                self._running_stages[-1][3] = max(self._running_stages[-1][3], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        full_name = (self._running_stages[-1][0] + " > " + name) if self._running_stages else name
+        self.stages.setdefault(full_name, StageStats())  # <- (so stages are listed before the stages within them)
+        self._running_stages.append([full_name, time.perf_counter(), time.process_time(), 0])
+
+    def end(self):
+        """Ends the stage that is currently running."""
+        full_name, start_wall_time, start_cpu_time, peak_memory_of_contained_stages = self._running_stages.pop()
+        stage_stats = StageStats()
+        stage_stats.wall_time = time.perf_counter() - start_wall_time
+        stage_stats.cpu_time = time.process_time() - start_cpu_time
+        stage_stats.count = 1
+        if CAN_MEASURE_PEAK_MEMORY and tracemalloc.is_tracing():
+            stage_stats.peak_memory = max(peak_memory_of_contained_stages, tracemalloc.get_traced_memory()[1])
+            if self._running_stages:
+                self._running_stages[-1][3] = max(self._running_stages[-1][3], stage_stats.peak_memory)
+        self.stages.setdefault(full_name, StageStats()).add(stage_stats)
+
+    def record(self, name: str, wall_time: float, cpu_time: float, peak_memory=None):
+        """Records a stage that was measured elsewhere (like the share of one document in the core conversion of a
+        batch of documents), within the stage that is currently running, if any."""
+        stage_stats = StageStats()
+        stage_stats.wall_time, stage_stats.cpu_time, stage_stats.peak_memory = wall_time, cpu_time, peak_memory
+        stage_stats.count = 1
+        full_name = (self._running_stages[-1][0] + " > " + name) if self._running_stages else name
+        self.stages.setdefault(full_name, StageStats()).add(stage_stats)
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """Records the code within this context manager as the stage with the given name (see begin())."""
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def add(self, other: "ConversionStats"):
+        """Adds the statistics of another conversion to these."""
+        for name, stage_stats in other.stages.items():
+            self.stages.setdefault(name, StageStats()).add(stage_stats)
+
+    def format(self) -> str:
+        """Returns a table of all stages."""
+        lines = ["{:<36}{:>8}{:>12}{:>12}{:>12}".format("stage", "count", "wall (s)", "cpu (s)", "peak (MiB)")]
+        for name, stage_stats in self.stages.items():
+            depth = name.count(" > ")
+            lines.append("{:<36}{:>8}{:>12.3f}{:>12.3f}{:>12}".format(
+                ("  " * depth + name.split(" > ")[-1])[:35], stage_stats.count, stage_stats.wall_time,
+                stage_stats.cpu_time,
+                "%.1f" % (stage_stats.peak_memory / 1024 ** 2) if stage_stats.peak_memory is not None else "-"
+            ))
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.format()
+
+
+# What conversions record their statistics in if they don't need to (which records nothing):
+
+class _NoStats:
+    def begin(self, name: str):
+        pass
+
+    def end(self):
+        pass
+
+    def record(self, name: str, wall_time: float, cpu_time: float, peak_memory=None):
+        pass
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        yield  # <- (contextlib.nullcontext() is new in python 3.7)
+
+
+NO_STATS = _NoStats()
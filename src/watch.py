@@ -0,0 +1,122 @@
+"""This file contains watch mode (--watch), which keeps converting markdown files whenever they (or the local files they
+depend on) change, in a single long-running process whose caches stay warm between conversions.
+
+It converts in build mode (see dependencies.py), and uses the manifests build mode records to know which local files
+(the markdown file, its local images and custom emojis, and the --extra-css file) every document depends on. These are
+polled for changes; once a burst of changes (like an editor saving several files) is over, only the documents that
+depend on a changed file are converted again."""
+
+import os
+import sys
+import time
+import tempfile
+import traceback
+
+from . import dependencies
+
+POLL_INTERVAL = 0.3  # <- how often to look for changes, in seconds
+DEBOUNCE = 0.2  # <- how long no more changes must happen before converting, in seconds
+
+
+def get_modification_times(paths) -> dict:
+    modification_times = dict()
+    for path in paths:
+        try:
+            modification_times[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            modification_times[path] = None
+    return modification_times
+
+
+class Watcher:
+    """Converts the given markdown files with a Converter (created with the given options), and then again whenever
+    they or the local files they depend on change, until it is interrupted."""
+
+    def __init__(self, md_origins, *args, poll_interval=POLL_INTERVAL, debounce=DEBOUNCE, output=sys.stdout,
+                 **options):
+        from . import Converter
+        if options.get("origin_type", "file") != "file":
+            raise Exception("--watch can only watch md-origins that are files.")
+        if options.get("output_name") == "print":
+            raise Exception("--watch needs to save the html files, so it can't be used with --output-name print.")
+        if not options.get("build"):
+            self._temporary_directory = tempfile.TemporaryDirectory(prefix="gh-md-to-html-watch-")
+            options["build"] = self._temporary_directory.name
+        self.manifest_dir = options["build"]
+        self.md_origins = list(md_origins)
+        self.converter = Converter(*args, **options)
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.output = output
+        self.extra_css = options.get("extra_css")
+
+    def dependencies_of_documents(self) -> dict:
+        """Maps every md-origin to the local files it depends on (as far as is known from the manifests)."""
+        known_dependencies = {md_origin: {os.path.abspath(md_origin)} for md_origin in self.md_origins}
+        if self.extra_css:
+            for md_origin in self.md_origins:
+                known_dependencies[md_origin].add(os.path.abspath(self.extra_css))
+        for manifest in dependencies.read_manifests(self.manifest_dir):
+            md_origin = manifest["options"].get("md_origin")
+            if md_origin in known_dependencies and manifest["options"].get("working_directory") == os.getcwd():
+                known_dependencies[md_origin].update(manifest["inputs"])
+        return known_dependencies
+
+    def convert(self, md_origins):
+        """Converts the given md-origins one after the other, reporting how long each took (or why it failed)."""
+        for md_origin in md_origins:
+            start = time.perf_counter()
+            try:
+                self.converter.convert(md_origin)
+            except Exception:
+                traceback.print_exc()
+                print(time.strftime("[%H:%M:%S]"), "converting", md_origin, "failed.", file=self.output)
+                continue
+            print(time.strftime("[%H:%M:%S]"), "converted", md_origin, "in",
+                  "%.3f" % (time.perf_counter() - start), "seconds.", file=self.output, flush=True)
+
+    def wait_for_changes(self, watched_files: dict) -> set:
+        """Waits until some of the watched files change and then stay unchanged for a moment, and returns the changed
+        ones."""
+        changed_files = set()
+        while True:
+            time.sleep(self.poll_interval if not changed_files else self.debounce)
+            modification_times = get_modification_times(watched_files)
+            newly_changed_files = set(path for path in watched_files if modification_times[path] != watched_files[path])
+            if not newly_changed_files and changed_files:
+                return changed_files
+            changed_files |= newly_changed_files
+            watched_files.update(modification_times)
+
+    def watch(self):
+        start = time.perf_counter()
+        # (the modification times are always taken before converting, so files saved during a conversion aren't missed)
+        known_modification_times = get_modification_times(set().union(*self.dependencies_of_documents().values()))
+        self.convert(self.md_origins)  # <- (documents that are up to date since the last build are skipped)
+        print(time.strftime("[%H:%M:%S]"), "converted", len(self.md_origins), "documents in",
+              "%.3f" % (time.perf_counter() - start), "seconds; watching for changes...", file=self.output, flush=True)
+        try:
+            while True:
+                dependencies_of_documents = self.dependencies_of_documents()
+                # files that are only known to be dependencies since the last conversion are compared to their current
+                # state:
+                watched_files = get_modification_times(set().union(*dependencies_of_documents.values()))
+                watched_files.update((path, modification_time) for path, modification_time
+                                     in known_modification_times.items() if path in watched_files)
+                changed_files = self.wait_for_changes(watched_files)
+                known_modification_times = dict(watched_files)  # <- (wait_for_changes() updated them)
+                start = time.perf_counter()
+                affected_documents = [md_origin for md_origin, dependencies_of_document
+                                      in dependencies_of_documents.items() if dependencies_of_document & changed_files]
+                self.convert(affected_documents)
+                if len(affected_documents) > 1:
+                    print(time.strftime("[%H:%M:%S]"), "rebuilt", len(affected_documents), "documents in",
+                          "%.3f" % (time.perf_counter() - start), "seconds.", file=self.output, flush=True)
+        except KeyboardInterrupt:
+            pass
+
+
+def watch(md_origins, *args, **options):
+    """Converts the given markdown files like convert_documents() does, and then keeps converting them whenever they or
+    the local files they depend on change, until interrupted (see Watcher)."""
+    Watcher(md_origins, *args, **options).watch()